@@ -1,6 +1,409 @@
 # ai_engine.py - Centralny moduł AI (Gemini 2.5 Flash)
+import os
+import re
 import json
-from typing import Dict, Any, Optional
+import time
+import hashlib
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
+from disk_cache import DiskCache
+from rate_limiter import rate_limiter, backoff_delay, parse_retry_after
+from ai_schemas import validate_response, schema_subset
+from content_extractor import estimate_tokens, truncate_to_tokens
+from config import (
+    CACHE_DIR, AI_CACHE_ENABLED, AI_CACHE_TTL, AI_CACHE_MAX_ENTRIES, AI_TOKEN_BUDGETS,
+    GEMINI_CLIENT_IDLE_TIMEOUT, GEMINI_CLIENT_MAX,
+    GEMINI_REQUESTS_PER_MINUTE, GEMINI_BURST, GEMINI_MAX_QUEUE_WAIT,
+    GEMINI_MAX_RETRIES, GEMINI_BACKOFF_BASE, GEMINI_BACKOFF_MAX
+)
+
+# Cache odpowiedzi AI adresowany treścią: ta sama strona + ten sam prompt = bez wywołania Gemini
+ai_cache = DiskCache(
+    os.path.join(CACHE_DIR, 'ai_responses.sqlite'),
+    ttl=AI_CACHE_TTL,
+    max_entries=AI_CACHE_MAX_ENTRIES
+)
+
+class GeminiClientPool:
+    """
+    Współdzielone klienty genai.Client, jeden na klucz API.
+
+    Klient trzyma pulę połączeń HTTP - kolejne etapy AI (treść, struktura serwisu,
+    analiza holistyczna, plan działań) i kolejne audyty używają ciepłych połączeń
+    zamiast za każdym razem zestawiać TLS od nowa.
+
+    - thread-safe (etapy pipeline działają równolegle w wątkach)
+    - klienty nieużywane dłużej niż idle_timeout są zamykane
+    - max_clients: LRU, gdy w procesie jest wiele kluczy użytkowników
+    """
+
+    def __init__(self, idle_timeout=GEMINI_CLIENT_IDLE_TIMEOUT, max_clients=GEMINI_CLIENT_MAX):
+        self.idle_timeout = idle_timeout
+        self.max_clients = max_clients
+        self._clients = OrderedDict()  # sha256(klucz) -> {'client', 'last_used'}
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str):
+        """
+        Klient dla klucza API (tworzony przy pierwszym użyciu)
+
+        Raises:
+            ImportError: google-genai nie jest zainstalowane
+        """
+        from google import genai
+
+        # Hash zamiast klucza - słownik nie przechowuje kluczy użytkowników wprost
+        pool_key = hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()
+        now = time.time()
+        with self._lock:
+            self._evict_idle(now)
+
+            entry = self._clients.get(pool_key)
+            if entry is None:
+                entry = {'client': genai.Client(api_key=api_key), 'last_used': now}
+                self._clients[pool_key] = entry
+                while len(self._clients) > self.max_clients:
+                    # Bez close() - klient może być jeszcze używany przez trwający etap;
+                    # połączenia zamknie GC, gdy zniknie ostatnia referencja
+                    self._clients.popitem(last=False)
+                print(f"[AI] Gemini client created (pool: {len(self._clients)})")
+
+            entry['last_used'] = now
+            self._clients.move_to_end(pool_key)
+            return entry['client']
+
+    def _evict_idle(self, now):
+        """Zamknij klienty nieużywane dłużej niż idle_timeout (wywoływane pod lockiem)"""
+        idle = [key for key, entry in self._clients.items() if now - entry['last_used'] > self.idle_timeout]
+        for key in idle:
+            self._close(self._clients.pop(key)['client'])
+
+    @staticmethod
+    def _close(client):
+        close = getattr(client, 'close', None)  # Client.close() jest dostępne w nowszych google-genai
+        if close:
+            try:
+                close()
+            except Exception as e:
+                print(f"[AI] Warning: closing Gemini client failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            while self._clients:
+                _, entry = self._clients.popitem()
+                self._close(entry['client'])
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
+
+
+# Klienty Gemini współdzielone przez wszystkie audyty w procesie
+gemini_clients = GeminiClientPool()
+
+# Kody HTTP, po których zapytanie do Gemini ponawiamy (przeciążenie / limit)
+RETRYABLE_STATUS_CODES = (429, 503)
+
+
+def _retryable_status(error) -> Optional[int]:
+    """Kod 429/503 z wyjątku google-genai (APIError.code) lub None, jeśli błąd nie jest przejściowy"""
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    if code in RETRYABLE_STATUS_CODES:
+        return code
+
+    message = str(error)
+    if '429' in message or 'RESOURCE_EXHAUSTED' in message:
+        return 429
+    if '503' in message or 'UNAVAILABLE' in message:
+        return 503
+    return None
+
+
+def _retry_after(error) -> Optional[float]:
+    """Nagłówek Retry-After (sekundy) z odpowiedzi błędu, jeśli jest dostępny"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    return parse_retry_after(headers.get('Retry-After'))
+
+
+# Odbiorca sekcji odpowiedzi AI gotowych w trakcie streamingu (ustawiany per audyt)
+_section_listener = contextvars.ContextVar('ai_section_listener', default=None)
+
+
+@contextmanager
+def report_partial_sections(listener):
+    """
+    Streamuj odpowiedzi AI w tym kontekście i zgłaszaj ich gotowe sekcje
+
+    Args:
+        listener: function(stage, section, value) - wywoływana dla każdego pola najwyższego
+                  poziomu odpowiedzi JSON (np. 'template_insights'), gdy tylko jest kompletne
+
+    Dotyczy wywołań z stream_label (analyze_url / analyze_content / analyze_multiple_urls / analyze_text i wrappery *_json).
+    Pipeline uruchamia etapy w kontekście wywołującego, więc listener działa też w etapach.
+    """
+    token = _section_listener.set(listener)
+    try:
+        yield
+    finally:
+        _section_listener.reset(token)
+
+
+class IncrementalJSONParser:
+    """
+    Przyrostowy parser odpowiedzi będącej obiektem JSON.
+
+    feed() przyjmuje kolejne fragmenty tekstu i zwraca pola najwyższego poziomu,
+    których wartość właśnie się zakończyła - bez czekania na całą odpowiedź.
+    Tekst przed pierwszym '{' (np. ```json) jest pomijany.
+
+    Użycie:
+        parser = IncrementalJSONParser()
+        for chunk in stream:
+            for key, value in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.sections = {}  # pola już odczytane
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = None
+        self._closed = False
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """Dodaj fragment odpowiedzi. Returns: [(pole, wartość), ...] zakończone w tym fragmencie"""
+        self.buffer += text
+        completed = []
+        buffer = self.buffer
+        i = self._pos
+        while i < len(buffer) and not self._closed:
+            char = buffer[i]
+            if self._depth == 0:
+                # Przed obiektem głównym - szukamy '{'
+                if char == '{':
+                    self._depth = 1
+                    self._member_start = i + 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    completed += self._member(buffer[self._member_start:i])
+                    self._closed = True
+            elif char == ',' and self._depth == 1:
+                completed += self._member(buffer[self._member_start:i])
+                self._member_start = i + 1
+            i += 1
+        self._pos = i
+        return completed
+
+    def _member(self, fragment: str) -> List[Tuple[str, Any]]:
+        """'"klucz": wartość' -> [(klucz, wartość)] (pusta lista dla niepoprawnego fragmentu)"""
+        if not fragment.strip():
+            return []
+        try:
+            member = json.loads('{' + fragment + '}')
+        except json.JSONDecodeError:
+            return []
+        self.sections.update(member)
+        return list(member.items())
+
+
+class PartialJSON:
+    """
+    Wynik tolerancyjnego dekodowania (parse_partial_json)
+
+    Attributes:
+        value: Odczytana wartość (dict/list) lub None, jeśli w tekście nie ma JSON
+        complete: True jeśli wartość główna została domknięta
+        incomplete: Pola najwyższego poziomu, których wartość została ucięta
+                    (zawierają tylko kompletne elementy)
+    """
+
+    def __init__(self, value, complete, incomplete):
+        self.value = value
+        self.complete = complete
+        self.incomplete = incomplete
+
+    def missing_fields(self, required: List[str]) -> List[str]:
+        """Wymagane pola, których brak lub których wartość jest ucięta"""
+        value = self.value if isinstance(self.value, dict) else {}
+        return [field for field in required if field not in value or field in self.incomplete]
+
+
+class _Truncated(Exception):
+    """Tekst skończył się (lub jest uszkodzony) w trakcie wartości; partial = jej kompletna część"""
+
+    def __init__(self, partial=None):
+        super().__init__()
+        self.partial = partial
+
+
+_NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?')
+_LITERALS = {'true': True, 'false': False, 'null': None}
+
+
+class _PartialDecoder:
+    """Parser rekurencyjny odzyskujący z uciętego JSON wszystkie kompletne pola i elementy"""
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+        self.incomplete = set()
+
+    def _skip_whitespace(self):
+        while self.pos < len(self.text) and self.text[self.pos] in ' \t\r\n':
+            self.pos += 1
+
+    def value(self, depth=0):
+        self._skip_whitespace()
+        if self.pos >= len(self.text):
+            raise _Truncated()
+
+        char = self.text[self.pos]
+        if char == '{':
+            return self._object(depth)
+        if char == '[':
+            return self._array(depth)
+        if char == '"':
+            return self._string()
+        return self._scalar()
+
+    def _object(self, depth):
+        result = {}
+        self.pos += 1
+        while True:
+            self._skip_whitespace()
+            if self.pos >= len(self.text):
+                raise _Truncated(result)
+            char = self.text[self.pos]
+            if char == '}':
+                self.pos += 1
+                return result
+            if char == ',':  # Toleruje zbędne przecinki (np. trailing comma)
+                self.pos += 1
+                continue
+            if char != '"':
+                raise _Truncated(result)
+
+            try:
+                key = self._string()
+                self._skip_whitespace()
+                if self.pos >= len(self.text) or self.text[self.pos] != ':':
+                    raise _Truncated()
+                self.pos += 1
+            except _Truncated:
+                raise _Truncated(result)
+
+            try:
+                result[key] = self.value(depth + 1)
+            except _Truncated as truncated:
+                # Ucięta lista/obiekt zostaje z kompletnymi elementami, ucięty skalar jest pomijany
+                if isinstance(truncated.partial, (dict, list)):
+                    result[key] = truncated.partial
+                    if depth == 0:
+                        self.incomplete.add(key)
+                elif depth == 0:
+                    self.incomplete.add(key)
+                raise _Truncated(result)
+
+    def _array(self, depth):
+        result = []
+        self.pos += 1
+        while True:
+            self._skip_whitespace()
+            if self.pos >= len(self.text):
+                raise _Truncated(result)
+            char = self.text[self.pos]
+            if char == ']':
+                self.pos += 1
+                return result
+            if char == ',':
+                self.pos += 1
+                continue
+            try:
+                result.append(self.value(depth + 1))
+            except _Truncated:
+                # Niekompletny element (np. połowa rekomendacji) jest pomijany
+                raise _Truncated(result)
+
+    def _string(self):
+        try:
+            value, self.pos = json.decoder.scanstring(self.text, self.pos + 1, False)
+        except json.JSONDecodeError:
+            raise _Truncated()
+        return value
+
+    def _scalar(self):
+        match = _NUMBER.match(self.text, self.pos)
+        if match:
+            # Liczba dochodząca do końca tekstu mogła zostać ucięta
+            if match.end() >= len(self.text):
+                raise _Truncated()
+            self.pos = match.end()
+            number = match.group()
+            return float(number) if any(c in number for c in '.eE') else int(number)
+
+        for literal, value in _LITERALS.items():
+            if self.text.startswith(literal, self.pos):
+                self.pos += len(literal)
+                return value
+        raise _Truncated()
+
+
+def parse_partial_json(text: str) -> PartialJSON:
+    """
+    Tolerancyjne dekodowanie odpowiedzi AI
+
+    - pomija tekst i bloki ```json przed wartością oraz wszystko po niej
+    - toleruje zbędne przecinki i znaki sterujące w stringach
+    - z uciętej odpowiedzi odzyskuje wszystkie kompletne pola i elementy list;
+      pola najwyższego poziomu ucięte w trakcie trafiają do PartialJSON.incomplete
+
+    Returns:
+        PartialJSON
+    """
+    text = text or ''
+    starts = [index for index in (text.find('{'), text.find('[')) if index != -1]
+    if not starts:
+        return PartialJSON(None, False, set())
+
+    decoder = _PartialDecoder(text)
+    decoder.pos = min(starts)
+    try:
+        return PartialJSON(decoder.value(), True, decoder.incomplete)
+    except _Truncated as truncated:
+        return PartialJSON(truncated.partial, False, decoder.incomplete)
+
+
+def _notify_sections(listener, stage: str, sections: List[Tuple[str, Any]], emitted: Optional[set] = None):
+    """Zgłoś gotowe sekcje; z emitted pomija sekcje już zgłoszone (np. przez stream przed retry)"""
+    for section, value in sections:
+        if emitted is not None:
+            if section in emitted:
+                continue
+            emitted.add(section)
+        try:
+            listener(stage, section, value)
+        except Exception as e:
+            print(f"[AI] Warning: section listener failed: {e}")
+
 
 class AIAnalyzer:
     """Centralna klasa do analizy AI używając Gemini 2.5 Flash"""
@@ -17,17 +420,17 @@ class AIAnalyzer:
         self.model = model
         self.client = None
         self.tools = [{"url_context": {}}]  # URL Context enabled!
+        self.last_cache_key = None  # Klucz cache ostatniej odpowiedzi (dla discard_last_response)
 
         # Initialize client
         self._initialize_client()
 
     def _initialize_client(self):
-        """Initialize Gemini client"""
+        """Initialize Gemini client (shared per API key - see GeminiClientPool)"""
         try:
-            from google import genai
             from google.genai.types import GenerateContentConfig
 
-            self.client = genai.Client(api_key=self.api_key)
+            self.client = gemini_clients.get(self.api_key)
             self.GenerateContentConfig = GenerateContentConfig
             print("[OK] Gemini AI Engine initialized successfully")
         except ImportError:
@@ -42,7 +445,118 @@ class AIAnalyzer:
         """Check if AI is available"""
         return self.client is not None and self.api_key != "YOUR_GEMINI_API_KEY_HERE"
 
-    def analyze_url(self, url: str, prompt: str, use_url_context: bool = True) -> str:
+    def _cache_key(self, kind: str, prompt: str, payload: Any, config_params: Dict[str, Any]) -> str:
+        """Klucz cache: hash (rodzaj wywołania, model, konfiguracja, prompt, treść/hash treści)"""
+        material = json.dumps([kind, self.model, config_params, prompt, payload], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _generate(self, contents: str, config_params: Dict[str, Any], cache_key: Optional[str] = None,
+                  stream_label: Optional[str] = None) -> str:
+        """
+        generate_content z cache odpowiedzi
+
+        Args:
+            contents: Pełny prompt
+            config_params: Parametry GenerateContentConfig
+            cache_key: Klucz cache (None = nie cache'uj, np. URL Context bez hash treści)
+            stream_label: Nazwa etapu - jeśli w kontekście jest listener (report_partial_sections),
+                          odpowiedź jest streamowana, a gotowe sekcje JSON zgłaszane na bieżąco
+
+        Returns:
+            AI response text (wyjątki API propagowane do wywołującego)
+        """
+        listener = _section_listener.get() if stream_label else None
+
+        use_cache = AI_CACHE_ENABLED and cache_key is not None
+        self.last_cache_key = cache_key if use_cache else None
+        if use_cache:
+            cached = ai_cache.get(cache_key)
+            if cached is not None:
+                print(f"[AI CACHE] Hit {cache_key[:12]}")
+                if listener:
+                    _notify_sections(listener, stream_label, IncrementalJSONParser().feed(cached))
+                return cached
+
+        if listener:
+            # Po 429/503 stream zaczyna się od nowa - sekcje zgłoszone przed retry nie są wysyłane ponownie
+            emitted = set()
+            text = self._call_with_rate_limit(
+                lambda: self._stream_content(contents, config_params, stream_label, listener, emitted)
+            )
+        else:
+            text = self._call_with_rate_limit(lambda: self.client.models.generate_content(
+                model=self.model,
+                contents=contents,
+                config=self.GenerateContentConfig(**config_params)
+            )).text
+
+        # Pusta odpowiedź (np. zablokowana) nie trafia do cache
+        if use_cache and text:
+            ai_cache.set(cache_key, text)
+
+        return text
+
+    def _stream_content(self, contents: str, config_params: Dict[str, Any], stage: str, listener,
+                        emitted: Optional[set] = None) -> str:
+        """
+        generate_content_stream: zgłasza sekcje JSON w miarę ich nadejścia, zwraca pełny tekst
+
+        emitted: nazwy sekcji już zgłoszonych w tym wywołaniu _generate (wspólne dla ponowień)
+        """
+        parser = IncrementalJSONParser()
+        chunks = []
+        for chunk in self.client.models.generate_content_stream(
+            model=self.model,
+            contents=contents,
+            config=self.GenerateContentConfig(**config_params)
+        ):
+            text = chunk.text or ''
+            if text:
+                chunks.append(text)
+                _notify_sections(listener, stage, parser.feed(text), emitted)
+        return ''.join(chunks)
+
+    def _call_with_rate_limit(self, request):
+        """
+        Wywołanie API Gemini w ramach limitu zapytań klucza
+
+        - token z kubełka per klucz API (wspólny dla workerów, patrz rate_limiter.py)
+        - 429/503: exponential backoff z jitterem; kubełek jest wstrzymywany,
+          więc inne audyty z tym kluczem też odczekają zamiast dokładać 429
+
+        Raises:
+            RateLimitTimeout: brak wolnego tokenu w GEMINI_MAX_QUEUE_WAIT sekund
+            Wyjątki API po wyczerpaniu ponowień
+        """
+        bucket = f"gemini:{hashlib.sha256((self.api_key or '').encode('utf-8')).hexdigest()[:16]}"
+        for attempt in range(GEMINI_MAX_RETRIES + 1):
+            rate_limiter.acquire(
+                bucket,
+                rate=GEMINI_REQUESTS_PER_MINUTE / 60,
+                capacity=GEMINI_BURST,
+                max_wait=GEMINI_MAX_QUEUE_WAIT,
+                label='Gemini'
+            )
+            try:
+                return request()
+            except Exception as e:
+                status = _retryable_status(e)
+                if status is None or attempt == GEMINI_MAX_RETRIES:
+                    raise
+
+                delay = backoff_delay(attempt, GEMINI_BACKOFF_BASE, GEMINI_BACKOFF_MAX, _retry_after(e))
+                print(f"[AI] Gemini {status}, retry {attempt + 1}/{GEMINI_MAX_RETRIES} in {delay:.1f}s")
+                rate_limiter.pause(bucket, delay)
+
+    def discard_last_response(self):
+        """Usuń ostatnią odpowiedź z cache (np. gdy okazała się niepoprawnym JSON)"""
+        if self.last_cache_key:
+            ai_cache.delete(self.last_cache_key)
+            self.last_cache_key = None
+
+    def analyze_url(self, url: str, prompt: str, use_url_context: bool = True,
+                    content_hash: Optional[str] = None, stream_label: Optional[str] = None,
+                    response_schema: Optional[Dict[str, Any]] = None) -> str:
         """
         Analyze URL with full page context using Gemini URL Context
 
@@ -50,6 +564,12 @@ class AIAnalyzer:
             url: URL to analyze (can be single URL or multiple URLs separated by commas)
             prompt: Analysis prompt
             use_url_context: Enable URL context tool (default: True)
+            content_hash: Hash of the page content (ParsedDocument.content_hash) - with URL
+                          Context the response is cached only when this is given, so a
+                          changed page is never answered from cache
+            stream_label: Stage name for streamed partial sections (see report_partial_sections)
+            response_schema: Response schema (ai_schemas.py) - sent as structured output
+                             only without URL Context (Gemini does not allow both)
 
         Returns:
             AI response text
@@ -71,26 +591,76 @@ class AIAnalyzer:
             else:
                 # Only use response_mime_type if NOT using tools
                 config_params['response_mime_type'] = "application/json"
+                if response_schema:
+                    config_params['response_schema'] = response_schema
 
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=f"{prompt}\n\nURL to analyze: {url}",
-                config=self.GenerateContentConfig(**config_params)
-            )
+            cache_key = None
+            if content_hash or not use_url_context:
+                cache_key = self._cache_key('url', prompt, [url, content_hash], config_params)
+
+            return self._generate(f"{prompt}\n\nURL to analyze: {url}", config_params, cache_key, stream_label)
+        except Exception as e:
+            error_msg = str(e)
+            print(f"[ERROR] AI Error: {error_msg}")
+            return json.dumps({"error": error_msg})
+
+    def analyze_content(self, url: str, prompt: str, page_content: str, stream_label: Optional[str] = None,
+                        response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Analyze page content already fetched by the audit, sent inline (no URL Context)
+
+        Gemini does not download the page again: one remote fetch less per AI stage,
+        the model sees exactly the HTML the other analyzers saw, and sites blocking
+        Google's fetcher still work. Without tools the response can use structured output.
+
+        Args:
+            url: Analyzed URL (for the prompt)
+            prompt: Analysis prompt
+            page_content: Compacted page content (content_extractor.compact_page)
+            stream_label: Stage name for streamed partial sections (see report_partial_sections)
+            response_schema: Response schema (ai_schemas.py) for structured output
+
+        Returns:
+            AI response text
+        """
+        if not self.is_available():
+            return json.dumps({"error": "AI not available - check API key"})
+
+        try:
+            config_params = {
+                'temperature': 0.7,
+                'response_mime_type': "application/json"
+            }
+            if response_schema:
+                config_params['response_schema'] = response_schema
+
+            # Treść jest w zapytaniu - odpowiedź zawsze można cache'ować
+            content_digest = hashlib.sha256(page_content.encode('utf-8')).hexdigest()
+            cache_key = self._cache_key('content', prompt, [url, content_digest], config_params)
+
+            full_prompt = f"""{prompt}
 
-            return response.text
+URL analyzed: {url}
+
+**PAGE CONTENT** (already fetched by the audit tool - do not fetch the URL; main content only,
+navigation and site template boilerplate removed):
+{page_content}"""
+            return self._generate(full_prompt, config_params, cache_key, stream_label)
         except Exception as e:
             error_msg = str(e)
             print(f"[ERROR] AI Error: {error_msg}")
             return json.dumps({"error": error_msg})
 
-    def analyze_multiple_urls(self, urls: list, prompt: str) -> str:
+    def analyze_multiple_urls(self, urls: list, prompt: str, content_hashes: Optional[List[str]] = None,
+                              stream_label: Optional[str] = None) -> str:
         """
         Analyze multiple URLs together using URL Context (for holistic analysis)
 
         Args:
             urls: List of URLs to analyze together
             prompt: Analysis prompt
+            content_hashes: Content hash of each URL (same order) - enables response cache
+            stream_label: Stage name for streamed partial sections (see report_partial_sections)
 
         Returns:
             AI response text
@@ -117,19 +687,19 @@ class AIAnalyzer:
 Fetch and analyze ALL these URLs together. Look for patterns across pages.
 """
 
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=full_prompt,
-                config=self.GenerateContentConfig(**config_params)
-            )
+            cache_key = None
+            if content_hashes and len(content_hashes) == len(urls) and all(content_hashes):
+                cache_key = self._cache_key('multiple_urls', prompt, list(zip(urls, content_hashes)), config_params)
 
-            return response.text
+            return self._generate(full_prompt, config_params, cache_key, stream_label)
         except Exception as e:
             error_msg = str(e)
             print(f"[ERROR] AI Error analyzing multiple URLs: {error_msg}")
             return json.dumps({"error": error_msg})
 
-    def analyze_text(self, text: str, prompt: str, json_output: bool = True) -> str:
+    def analyze_text(self, text: str, prompt: str, json_output: bool = True,
+                     stream_label: Optional[str] = None, response_schema: Optional[Dict[str, Any]] = None,
+                     max_tokens: Optional[int] = None) -> str:
         """
         Analyze text without URL context
 
@@ -137,6 +707,9 @@ Fetch and analyze ALL these URLs together. Look for patterns across pages.
             text: Text to analyze
             prompt: Analysis prompt
             json_output: Request JSON formatted response
+            stream_label: Stage name for streamed partial sections (see report_partial_sections)
+            response_schema: Response schema (ai_schemas.py) for structured output (json_output only)
+            max_tokens: Token budget for text (default: AI_TOKEN_BUDGETS['text'])
 
         Returns:
             AI response text
@@ -146,17 +719,20 @@ Fetch and analyze ALL these URLs together. Look for patterns across pages.
 
         try:
             mime_type = "application/json" if json_output else "text/plain"
+            config_params = {
+                'temperature': 0.7,
+                'response_mime_type': mime_type
+            }
+            if json_output and response_schema:
+                config_params['response_schema'] = response_schema
 
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=f"{prompt}\n\nText to analyze:\n{text[:10000]}",  # Limit text to 10k chars
-                config=self.GenerateContentConfig(
-                    temperature=0.7,
-                    response_mime_type=mime_type
-                )
-            )
+            budget = max_tokens or AI_TOKEN_BUDGETS['text']
+            if estimate_tokens(text) > budget:
+                print(f"[AI] Text over budget (~{estimate_tokens(text)} > {budget} tokens) - truncating")
+                text = truncate_to_tokens(text, budget)
+            cache_key = self._cache_key('text', prompt, hashlib.sha256(text.encode('utf-8')).hexdigest(), config_params)
 
-            return response.text
+            return self._generate(f"{prompt}\n\nText to analyze:\n{text}", config_params, cache_key, stream_label)
         except Exception as e:
             error_msg = str(e)
             print(f"[ERROR] AI Error: {error_msg}")
@@ -166,57 +742,155 @@ Fetch and analyze ALL these URLs together. Look for patterns across pages.
         """
         Parse JSON response from AI
 
+        Deprecated: tylko dla analyzers/*_old.py - nowy kod używa analyze_url_json /
+        analyze_text_json (walidacja schematem i dopytanie o brakujące pola).
+
         Args:
             response: AI response text
 
         Returns:
             Parsed JSON dict or error dict
         """
-        try:
-            # Remove markdown code blocks if present
-            if response.startswith("```json"):
-                response = response.replace("```json", "").replace("```", "").strip()
-            elif response.startswith("```"):
-                response = response.replace("```", "").strip()
-
-            return json.loads(response)
-        except json.JSONDecodeError as e:
-            print(f"[ERROR] JSON Parse Error: {e}")
-            print(f"Response: {response[:200]}...")
-            return {"error": "Invalid JSON response", "raw": response}
-
-    def analyze_with_retry(self, url: str, prompt: str, max_retries: int = 2) -> Dict[str, Any]:
+        parsed = parse_partial_json(response)
+        if parsed.complete:
+            return parsed.value
+
+        print(f"[ERROR] JSON Parse Error: {'truncated' if parsed.value is not None else 'no JSON'} response")
+        print(f"Response: {(response or '')[:200]}...")
+        return {"error": "Invalid JSON response", "raw": response}
+
+    def analyze_url_json(self, url: str, prompt: str, required_fields: Optional[List[str]] = None,
+                         use_url_context: bool = True, content_hash: Optional[str] = None,
+                         stream_label: Optional[str] = None, response_schema: Optional[Dict[str, Any]] = None,
+                         page_content: Optional[str] = None) -> Dict[str, Any]:
         """
-        Analyze with retry logic for better reliability
+        analyze_url / analyze_content + walidacja odpowiedzi JSON i dopytanie o brakujące pola
 
         Args:
-            url: URL to analyze
-            prompt: Analysis prompt
-            max_retries: Maximum retry attempts
+            required_fields: Pola, bez których wynik jest bezużyteczny
+                             (None = pola 'required' schematu)
+            response_schema: Schemat odpowiedzi (ai_schemas.py)
+            page_content: Treść strony pobrana przez audyt (content_extractor.inline_page_content) -
+                          wysyłana w zapytaniu zamiast URL Context; None = analyze_url
+            (pozostałe jak w analyze_url)
 
         Returns:
-            Parsed JSON response
+            dict: pola odpowiedzi lub {'error': str, 'missing_fields': [...], 'raw': str}
         """
-        for attempt in range(max_retries + 1):
-            try:
-                response = self.analyze_url(url, prompt)
-                parsed = self.parse_json_response(response)
+        def request(request_prompt, schema, label):
+            if page_content is not None:
+                return self.analyze_content(url, request_prompt, page_content, label, schema)
+            return self.analyze_url(url, request_prompt, use_url_context, content_hash, label, schema)
 
-                if "error" not in parsed:
-                    return parsed
+        return self._request_json(request, prompt, required_fields, response_schema, stream_label)
 
-                if attempt < max_retries:
-                    print(f"[WARN] Retry {attempt + 1}/{max_retries}...")
-                    continue
+    def analyze_multiple_urls_json(self, urls: List[str], prompt: str, required_fields: Optional[List[str]] = None,
+                                   content_hashes: Optional[List[str]] = None, stream_label: Optional[str] = None,
+                                   response_schema: Optional[Dict[str, Any]] = None,
+                                   page_content: Optional[str] = None) -> Dict[str, Any]:
+        """
+        analyze_multiple_urls / analyze_content + walidacja odpowiedzi JSON (jak analyze_url_json)
 
-                return parsed
-            except Exception as e:
-                if attempt < max_retries:
-                    print(f"⚠️ Retry {attempt + 1}/{max_retries} after error: {e}")
-                    continue
-                return {"error": str(e)}
+        Args:
+            urls: Analizowane URLe (pierwszy = strona główna)
+            page_content: Treść wszystkich stron pobrana przez audyt - wysyłana w zapytaniu;
+                          None = URL Context ze wszystkimi URLami (analyze_multiple_urls)
+            (pozostałe jak w analyze_multiple_urls / analyze_url_json)
+        """
+        def request(request_prompt, schema, label):
+            if page_content is not None:
+                pages_prompt = f"{request_prompt}\n\nADDITIONAL PAGES TO ANALYZE: {', '.join(urls[1:])}"
+                return self.analyze_content(urls[0], pages_prompt, page_content, label, schema)
+            # Schemat nie może być wysłany razem z URL Context - odpowiedź jest tylko walidowana
+            return self.analyze_multiple_urls(urls, request_prompt, content_hashes, label)
+
+        return self._request_json(request, prompt, required_fields, response_schema, stream_label)
+
+    def analyze_text_json(self, text: str, prompt: str, required_fields: Optional[List[str]] = None,
+                          stream_label: Optional[str] = None, response_schema: Optional[Dict[str, Any]] = None,
+                          max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """analyze_text + walidacja odpowiedzi JSON i dopytanie o brakujące pola (jak analyze_url_json)"""
+        def request(request_prompt, schema, label):
+            return self.analyze_text(text, request_prompt, True, label, schema, max_tokens)
+
+        return self._request_json(request, prompt, required_fields, response_schema, stream_label)
+
+    def _request_json(self, request, prompt: str, required_fields: Optional[List[str]],
+                      response_schema: Optional[Dict[str, Any]], stream_label: Optional[str]) -> Dict[str, Any]:
+        """
+        Zapytanie o odpowiedź JSON z walidacją
 
-        return {"error": "Max retries exceeded"}
+        - odpowiedź jest sprawdzana schematem (validate_response) - niepoprawne pola są usuwane
+        - z uciętej odpowiedzi zachowywane są wszystkie kompletne pola
+        - o brakujące / ucięte pola wymagane pytamy jednym dodatkowym, krótszym
+          zapytaniem (_complete_missing_fields) zamiast powtarzać całą analizę
+
+        Args:
+            request: function(prompt, response_schema, stream_label) -> tekst odpowiedzi
+        """
+        if required_fields is None:
+            required_fields = (response_schema or {}).get('required', [])
+
+        response = request(prompt, response_schema, stream_label)
+        parsed = parse_partial_json(response)
+        data = parsed.value if isinstance(parsed.value, dict) else {}
+
+        # Błąd API / brak AI (analyze_url zwraca wtedy {"error": ...})
+        if set(data) == {'error'}:
+            return {'error': data['error'], 'missing_fields': list(required_fields), 'raw': response}
+
+        if response_schema:
+            data, errors = validate_response(data, response_schema)
+            if errors:
+                print(f"[AI] Schema validation: {len(errors)} issue(s), e.g. {errors[0]}")
+
+        missing = [field for field in required_fields if field not in data or field in parsed.incomplete]
+        if parsed.complete and not missing:
+            return data
+
+        # Niepełna odpowiedź nie może wrócić z cache
+        self.discard_last_response()
+        if missing:
+            data = self._complete_missing_fields(request, prompt, data, missing, response_schema)
+            missing = [field for field in required_fields if field not in data]
+        if missing:
+            return {
+                'error': f"AI response missing required fields: {', '.join(missing)}",
+                'missing_fields': missing,
+                'raw': response
+            }
+        return data
+
+    def _complete_missing_fields(self, request, prompt: str, partial: Dict[str, Any], missing: List[str],
+                                 response_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Dopytaj tylko o brakujące lub ucięte pola odpowiedzi
+
+        Returns:
+            dict: partial uzupełniony o odzyskane pola (ucięte wartości, których nie udało się
+                  uzupełnić, zostają w wersji z kompletnymi elementami)
+        """
+        print(f"[AI] Follow-up request for missing fields: {', '.join(missing)}")
+        follow_up_prompt = f"""{prompt}
+
+**FOLLOW-UP:** A previous answer to this task was cut off. Return ONLY a JSON object
+with these fields: {', '.join(missing)}. Do not repeat any other fields."""
+
+        schema = schema_subset(response_schema, missing) if response_schema else None
+        response = request(follow_up_prompt, schema, None)
+        recovered = parse_partial_json(response)
+        if not recovered.complete:
+            self.discard_last_response()
+
+        values = recovered.value if isinstance(recovered.value, dict) else {}
+        if schema:
+            values, _ = validate_response(values, schema)
+
+        merged = dict(partial)
+        for field in missing:
+            if field in values and field not in recovered.incomplete:
+                merged[field] = values[field]
+        return merged
 
 
 # Factory function for easy initialization
@@ -245,37 +919,80 @@ def create_ai_analyzer(api_key: str, model: str = "gemini-2.5-flash") -> Optiona
 class AIEngine:
     """Backward compatibility wrapper for AIAnalyzer"""
 
-    def __init__(self):
-        from config import GEMINI_API_KEY, GEMINI_MODEL
-        self.analyzer = create_ai_analyzer(GEMINI_API_KEY, GEMINI_MODEL)
+    def __init__(self, credentials=None):
+        """
+        Args:
+            credentials: Credentials with the audit's Gemini key (None = key from config)
+        """
+        from config import GEMINI_MODEL
+        from credentials import resolve_credentials
+        self.analyzer = create_ai_analyzer(resolve_credentials(credentials).gemini_api_key, GEMINI_MODEL)
 
     def is_available(self):
         return self.analyzer is not None and self.analyzer.is_available()
 
-    def analyze_url(self, url: str, prompt: str, use_url_context: bool = True):
+    def analyze_url(self, url: str, prompt: str, use_url_context: bool = True, content_hash: Optional[str] = None,
+                    stream_label: Optional[str] = None, response_schema: Optional[Dict[str, Any]] = None):
         if not self.analyzer:
             return json.dumps({"error": "AI not available"})
-        return self.analyzer.analyze_url(url, prompt, use_url_context)
+        return self.analyzer.analyze_url(url, prompt, use_url_context, content_hash, stream_label, response_schema)
 
-    def analyze_multiple_urls(self, urls: list, prompt: str):
+    def analyze_content(self, url: str, prompt: str, page_content: str, stream_label: Optional[str] = None,
+                        response_schema: Optional[Dict[str, Any]] = None):
         if not self.analyzer:
             return json.dumps({"error": "AI not available"})
-        return self.analyzer.analyze_multiple_urls(urls, prompt)
+        return self.analyzer.analyze_content(url, prompt, page_content, stream_label, response_schema)
 
-    def analyze_text(self, text: str, prompt: str, json_output: bool = True):
+    def analyze_multiple_urls(self, urls: list, prompt: str, content_hashes: Optional[List[str]] = None,
+                              stream_label: Optional[str] = None):
         if not self.analyzer:
             return json.dumps({"error": "AI not available"})
-        return self.analyzer.analyze_text(text, prompt, json_output)
+        return self.analyzer.analyze_multiple_urls(urls, prompt, content_hashes, stream_label)
+
+    def analyze_text(self, text: str, prompt: str, json_output: bool = True, stream_label: Optional[str] = None,
+                     response_schema: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None):
+        if not self.analyzer:
+            return json.dumps({"error": "AI not available"})
+        return self.analyzer.analyze_text(text, prompt, json_output, stream_label, response_schema, max_tokens)
+
+    def discard_last_response(self):
+        if self.analyzer:
+            self.analyzer.discard_last_response()
 
     def parse_json_response(self, response: str):
         if not self.analyzer:
             return {"error": "AI not available"}
         return self.analyzer.parse_json_response(response)
 
+    def analyze_url_json(self, url: str, prompt: str, required_fields: Optional[List[str]] = None,
+                         use_url_context: bool = True, content_hash: Optional[str] = None,
+                         stream_label: Optional[str] = None, response_schema: Optional[Dict[str, Any]] = None,
+                         page_content: Optional[str] = None):
+        if not self.analyzer:
+            return {"error": "AI not available", "missing_fields": list(required_fields or [])}
+        return self.analyzer.analyze_url_json(url, prompt, required_fields, use_url_context, content_hash,
+                                              stream_label, response_schema, page_content)
+
+    def analyze_multiple_urls_json(self, urls: List[str], prompt: str, required_fields: Optional[List[str]] = None,
+                                   content_hashes: Optional[List[str]] = None, stream_label: Optional[str] = None,
+                                   response_schema: Optional[Dict[str, Any]] = None,
+                                   page_content: Optional[str] = None):
+        if not self.analyzer:
+            return {"error": "AI not available", "missing_fields": list(required_fields or [])}
+        return self.analyzer.analyze_multiple_urls_json(urls, prompt, required_fields, content_hashes,
+                                                        stream_label, response_schema, page_content)
+
+    def analyze_text_json(self, text: str, prompt: str, required_fields: Optional[List[str]] = None,
+                          stream_label: Optional[str] = None, response_schema: Optional[Dict[str, Any]] = None,
+                          max_tokens: Optional[int] = None):
+        if not self.analyzer:
+            return {"error": "AI not available", "missing_fields": list(required_fields or [])}
+        return self.analyzer.analyze_text_json(text, prompt, required_fields, stream_label, response_schema,
+                                               max_tokens)
+
 
 # Test function
 if __name__ == "__main__":
-    import os
     from config import GEMINI_API_KEY
 
     print("Testing AI Engine...")
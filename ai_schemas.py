@@ -0,0 +1,434 @@
+# ai_schemas.py - Schematy odpowiedzi etapów AI (structured output Gemini + walidacja lokalna)
+#
+# Format: podzbiór OpenAPI akceptowany przez GenerateContentConfig(response_schema=...).
+# Gemini nie przyjmuje response_schema razem z narzędziami (URL Context) - wtedy schemat
+# służy tylko do walidacji lokalnej (validate_response) i dopytania o brakujące pola.
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _object(properties: Dict[str, Any], required: Optional[List[str]] = None) -> Dict[str, Any]:
+    schema = {
+        'type': 'OBJECT',
+        'properties': properties,
+        # Kolejność generowania = kolejność w szablonie (ważne dla streamowanych sekcji)
+        'property_ordering': list(properties)
+    }
+    if required:
+        schema['required'] = required
+    return schema
+
+
+def _array(items: Dict[str, Any]) -> Dict[str, Any]:
+    return {'type': 'ARRAY', 'items': items}
+
+
+def _string(*enum: str) -> Dict[str, Any]:
+    if enum:
+        return {'type': 'STRING', 'enum': list(enum)}
+    return {'type': 'STRING'}
+
+
+def _score() -> Dict[str, Any]:
+    return {'type': 'INTEGER', 'minimum': 0, 'maximum': 100}
+
+
+def _boolean() -> Dict[str, Any]:
+    return {'type': 'BOOLEAN'}
+
+
+def _strings() -> Dict[str, Any]:
+    return _array(_string())
+
+
+# ========================================
+# analyzers/ai_content.py
+# ========================================
+
+CONTENT_ANALYSIS_SCHEMA = _object({
+    'detected_language': _string(),
+    'content_quality_score': _score(),
+    'page_type': _string('homepage', 'product', 'article', 'service', 'landing', 'other'),
+    'search_intent': _object({
+        'primary_intent': _string('informational', 'transactional', 'navigational', 'commercial'),
+        'intent_match_score': _score(),
+        'user_questions_answered': _strings(),
+        'missing_user_questions': _strings(),
+        'explanation': _string()
+    }),
+    'eeat_analysis': _object({
+        'experience_score': _score(),
+        'experience_signals': _strings(),
+        'expertise_score': _score(),
+        'expertise_signals': _strings(),
+        'authoritativeness_score': _score(),
+        'authority_signals': _strings(),
+        'trustworthiness_score': _score(),
+        'trust_signals': _strings(),
+        'overall_eeat_score': _score(),
+        'biggest_eeat_weakness': _string(),
+        'quick_eeat_wins': _strings()
+    }),
+    'content_depth': _object({
+        'depth_score': _score(),
+        'depth_level': _string('surface', 'intermediate', 'comprehensive', 'expert'),
+        'word_count_assessment': _string('too short', 'adequate', 'comprehensive', 'too long'),
+        'topics_covered': _strings(),
+        'topics_missing': _strings(),
+        'content_structure_quality': _string('poor', 'fair', 'good', 'excellent'),
+        'readability_assessment': _string('too complex', 'just right', 'too simple'),
+        'media_usage': _string('needs images/videos', 'adequate', 'excellent'),
+        'competitive_positioning': _string()
+    }),
+    'keyword_optimization': _object({
+        'naturalness_score': _score(),
+        'keyword_stuffing_detected': _boolean(),
+        'primary_keywords_found': _strings(),
+        'semantic_keywords_found': _strings(),
+        'keyword_opportunities': _strings(),
+        'keyword_placement_quality': _string('poor', 'fair', 'good', 'excellent'),
+        'lsi_keywords_present': _boolean()
+    }),
+    'conversion_optimization': _object({
+        'cta_presence': _string('none', 'weak', 'clear', 'strong'),
+        'cta_examples': _strings(),
+        'conversion_blockers': _strings(),
+        'trust_elements': _strings(),
+        'urgency_scarcity': _string('none', 'present', 'overused'),
+        'friction_points': _strings()
+    }),
+    'business_value_assessment': _object({
+        'target_audience_clarity': _score(),
+        'value_proposition_clarity': _score(),
+        'differentiation_strength': _score(),
+        'monetization_potential': _string('low', 'medium', 'high'),
+        'user_journey_stage': _string('awareness', 'consideration', 'decision'),
+        'business_goal_alignment': _string('poor', 'fair', 'good', 'excellent')
+    }),
+    'critical_issues': _array(_object({
+        'severity': _string('critical', 'high', 'medium', 'low'),
+        'issue': _string(),
+        'impact': _string(),
+        'evidence': _string(),
+        'fix': _string(),
+        'time_to_fix': _string('15min', '1h', '4h', '1day', '1week'),
+        'expected_improvement': _string()
+    }, required=['issue'])),
+    'quick_wins': _array(_object({
+        'action': _string(),
+        'why': _string(),
+        'how': _string(),
+        'time_needed': _string(),
+        'expected_impact': _string()
+    }, required=['action'])),
+    'competitive_insights': _object({
+        'content_uniqueness': _score(),
+        'likely_competitors': _strings(),
+        'competitive_advantages': _strings(),
+        'competitive_weaknesses': _strings(),
+        'differentiation_opportunities': _strings()
+    }),
+    'overall_summary': _string(),
+    'primary_recommendation': _string(),
+    'estimated_ranking_potential': _string('low', 'medium', 'high', 'very high')
+}, required=[
+    'content_quality_score', 'page_type', 'search_intent', 'eeat_analysis', 'content_depth',
+    'keyword_optimization', 'conversion_optimization', 'business_value_assessment',
+    'critical_issues', 'quick_wins', 'competitive_insights', 'overall_summary', 'primary_recommendation'
+])
+
+
+# ========================================
+# analyzers/ai_site_structure.py (STAGE 1)
+# ========================================
+
+SITE_STRUCTURE_SCHEMA = _object({
+    'site_type': _string('e-commerce', 'service', 'blog', 'corporate', 'portfolio', 'news', 'education', 'other'),
+    'site_type_confidence': _score(),
+    'site_characteristics': _object({
+        'primary_purpose': _string(),
+        'target_audience': _string(),
+        'monetization_model': _string(),
+        'content_focus': _string()
+    }),
+    'selected_pages': _array(_object({
+        'url': _string(),
+        'page_type': _string('category', 'product', 'service', 'about', 'blog_post', 'landing', 'contact', 'other'),
+        'selection_reason': _string(),
+        'expected_insights': _string()
+    }, required=['url']))
+}, required=['site_type', 'site_type_confidence', 'site_characteristics', 'selected_pages'])
+
+
+# ========================================
+# analyzers/ai_multi_page.py (STAGE 2)
+# ========================================
+
+_PRIORITY = ('CRITICAL', 'HIGH', 'MEDIUM', 'LOW')
+
+HOLISTIC_ANALYSIS_SCHEMA = _object({
+    'holistic_score': _score(),
+    'executive_summary': _string(),
+    'template_insights': _array(_object({
+        'template_name': _string(),
+        'page_type': _string(),
+        'pages_affected': _string(),
+        'critical_issues': _strings(),
+        'seo_impact': _string('HIGH', 'MEDIUM', 'LOW'),
+        'business_impact': _string(),
+        'fix_difficulty': _string('EASY', 'MEDIUM', 'HARD'),
+        'recommended_fix': _string(),
+        'expected_improvement': _string()
+    }, required=['template_name'])),
+    'content_patterns': _object({
+        'strengths': _strings(),
+        'weaknesses': _strings(),
+        'consistency_score': _score(),
+        'brand_voice_clarity': _score(),
+        'eeat_signals': _object({
+            'experience': _score(),
+            'expertise': _score(),
+            'authoritativeness': _score(),
+            'trustworthiness': _score(),
+            'evidence': _strings()
+        })
+    }),
+    'site_strategy': _object({
+        'primary_business_goal': _string(),
+        'target_audience_clarity': _score(),
+        'value_proposition_strength': _score(),
+        'competitive_positioning': _string(),
+        'content_strategy_assessment': _string(),
+        'missing_critical_pages': _strings()
+    }),
+    'conversion_funnel': _object({
+        'funnel_stages_present': _strings(),
+        'funnel_gaps': _strings(),
+        'cta_consistency': _score(),
+        'cta_effectiveness': _string(),
+        'friction_points': _strings(),
+        'quick_conversion_wins': _array(_object({
+            'improvement': _string(),
+            'pages_affected': _string(),
+            'expected_lift': _string(),
+            'implementation_time': _string()
+        }, required=['improvement']))
+    }),
+    'scalable_recommendations': _array(_object({
+        'category': _string('TEMPLATE', 'CONTENT', 'TECHNICAL', 'UX'),
+        'priority': _string(*_PRIORITY),
+        'recommendation': _string(),
+        'scope': _string(),
+        'business_impact': _string(),
+        'implementation_steps': _strings(),
+        'time_estimate': _string(),
+        'owner': _string('developer', 'marketer', 'copywriter', 'designer'),
+        'success_metric': _string()
+    }, required=['recommendation'])),
+    'cross_page_issues': _array(_object({
+        'issue': _string(),
+        'severity': _string(*_PRIORITY),
+        'pages_affected': _strings(),
+        'root_cause': _string(),
+        'recommended_solution': _string()
+    }, required=['issue'])),
+    'roadmap': _object({
+        'week_1': _strings(),
+        'month_1': _strings(),
+        'month_3': _strings(),
+        'ongoing': _strings()
+    })
+}, required=[
+    'holistic_score', 'executive_summary', 'template_insights', 'content_patterns', 'site_strategy',
+    'conversion_funnel', 'scalable_recommendations', 'cross_page_issues', 'roadmap'
+])
+
+
+# ========================================
+# analyzers/ai_action_plan.py
+# ========================================
+
+def _roadmap_item() -> Dict[str, Any]:
+    return _object({
+        'priority': {'type': 'INTEGER', 'minimum': 1, 'maximum': 10},
+        'action': _string(),
+        'category': _string('technical', 'content', 'onpage', 'indexing', 'conversion'),
+        'description': _string(),
+        'success_criteria': _string(),
+        'estimated_impact': _string(),
+        'dependencies': _strings(),
+        'owner': _string('developer', 'marketer', 'seo', 'copywriter')
+    }, required=['action'])
+
+
+ACTION_PLAN_SCHEMA = _object({
+    'overall_strategy': _object({
+        'primary_focus': _string(),
+        'estimated_time_to_improvement': _string(),
+        'difficulty_level': _string('beginner', 'intermediate', 'advanced'),
+        'required_resources': _strings()
+    }),
+    'quick_wins': _array(_object({
+        'title': _string(),
+        'description': _string(),
+        'estimated_time': _string(),
+        'expected_impact': _string(),
+        'business_impact': _string(),
+        'difficulty': _string('easy', 'medium', 'hard'),
+        'tools_needed': _strings(),
+        'implementation_steps': _strings()
+    }, required=['title'])),
+    'roadmap_30_days': _array(_roadmap_item()),
+    'roadmap_60_days': _array(_roadmap_item()),
+    'roadmap_90_days': _array(_roadmap_item()),
+    'estimated_score_progression': _object({
+        'current': _score(),
+        'after_30_days': _score(),
+        'after_60_days': _score(),
+        'after_90_days': _score(),
+        'assumptions': _string()
+    }),
+    'recommended_tools': _array(_object({
+        'tool_name': _string(),
+        'purpose': _string(),
+        'cost': _string('free', 'paid', 'freemium'),
+        'priority': _string('essential', 'recommended', 'optional')
+    }, required=['tool_name'])),
+    'content_strategy': _object({
+        'recommended_content_types': _strings(),
+        'keyword_opportunities': _strings(),
+        'content_gaps': _strings(),
+        'competitive_angle': _string()
+    }),
+    'risk_assessment': _object({
+        'low_hanging_fruit': _strings(),
+        'potential_pitfalls': _strings(),
+        'resource_constraints': _strings(),
+        'competitive_threats': _strings()
+    }),
+    'executive_summary': _string(),
+    'success_metrics': _array(_object({
+        'metric': _string(),
+        'current': _string(),
+        'target_30d': _string(),
+        'target_90d': _string()
+    }, required=['metric']))
+}, required=[
+    'overall_strategy', 'quick_wins', 'roadmap_30_days', 'roadmap_60_days', 'roadmap_90_days',
+    'estimated_score_progression', 'recommended_tools', 'content_strategy', 'executive_summary'
+])
+
+
+# ========================================
+# Walidacja lokalna
+# ========================================
+
+class _Invalid(Exception):
+    """Wartość niezgodna ze schematem (i nie da się jej bezpiecznie poprawić)"""
+
+
+def schema_subset(schema: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Schemat obiektu ograniczony do wybranych pól (np. dopytanie o brakujące pola)"""
+    properties = {field: schema['properties'][field] for field in fields if field in schema.get('properties', {})}
+    return _object(properties, required=list(properties))
+
+
+def validate_response(value: Any, schema: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Sprawdź odpowiedź AI względem schematu (obiekt najwyższego poziomu)
+
+    Drobne odstępstwa są poprawiane: liczby jako tekst, wyniki poza zakresem,
+    wielkość liter w wartościach enum. Niepoprawne pola są usuwane, niepoprawne
+    elementy list pomijane - wymagane pola, które wypadły, wychodzą w required_fields
+    wywołującego jako brakujące.
+
+    Returns:
+        tuple: (dict z poprawnymi polami, lista błędów 'ścieżka: opis')
+    """
+    errors = []
+    if not isinstance(value, dict):
+        return {}, ['$: expected object']
+
+    result = {}
+    for key, item in value.items():
+        property_schema = schema.get('properties', {}).get(key)
+        if property_schema is None:
+            result[key] = item
+            continue
+        try:
+            result[key] = _check(item, property_schema, key, errors)
+        except _Invalid as e:
+            errors.append(f"{key}: {e}")
+    return result, errors
+
+
+def _check(value: Any, schema: Dict[str, Any], path: str, errors: List[str]) -> Any:
+    kind = schema.get('type')
+
+    if kind == 'OBJECT':
+        if not isinstance(value, dict):
+            raise _Invalid('expected object')
+        result = {}
+        for key, item in value.items():
+            property_schema = schema.get('properties', {}).get(key)
+            if property_schema is None:
+                result[key] = item
+                continue
+            try:
+                result[key] = _check(item, property_schema, f"{path}.{key}", errors)
+            except _Invalid as e:
+                errors.append(f"{path}.{key}: {e}")
+        missing = [key for key in schema.get('required', []) if key not in result]
+        if missing:
+            raise _Invalid(f"missing {', '.join(missing)}")
+        return result
+
+    if kind == 'ARRAY':
+        if isinstance(value, str) and schema['items'].get('type') == 'STRING':
+            value = [value]  # np. "pages_affected": "all pages"
+        if not isinstance(value, list):
+            raise _Invalid('expected array')
+        result = []
+        for index, item in enumerate(value):
+            try:
+                result.append(_check(item, schema['items'], f"{path}[{index}]", errors))
+            except _Invalid as e:
+                errors.append(f"{path}[{index}]: {e} (item skipped)")
+        return result
+
+    if kind in ('INTEGER', 'NUMBER'):
+        if isinstance(value, bool):
+            raise _Invalid('expected number')
+        if isinstance(value, str):
+            try:
+                value = float(value.strip().rstrip('%').split('/')[0])
+            except ValueError:
+                raise _Invalid('expected number')
+        if not isinstance(value, (int, float)):
+            raise _Invalid('expected number')
+        if 'minimum' in schema:
+            value = max(schema['minimum'], value)
+        if 'maximum' in schema:
+            value = min(schema['maximum'], value)
+        return int(round(value)) if kind == 'INTEGER' else value
+
+    if kind == 'BOOLEAN':
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in ('true', 'false'):
+            return value.strip().lower() == 'true'
+        raise _Invalid('expected boolean')
+
+    if kind == 'STRING':
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if not isinstance(value, str):
+            raise _Invalid('expected string')
+        enum = schema.get('enum')
+        if enum and value not in enum:
+            normalized = {option.lower(): option for option in enum}
+            if value.strip().lower() not in normalized:
+                raise _Invalid(f"'{value[:40]}' not in {enum}")
+            value = normalized[value.strip().lower()]
+        return value
+
+    return value
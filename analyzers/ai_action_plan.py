@@ -3,10 +3,13 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from ai_engine import AIAnalyzer
-from config import GEMINI_API_KEY, ENABLE_AI_ANALYSIS
+from ai_schemas import ACTION_PLAN_SCHEMA
+from config import ENABLE_AI_ANALYSIS, AI_TOKEN_BUDGETS
+from content_extractor import estimate_tokens, truncate_to_tokens
+from credentials import resolve_credentials
 import json
 
-def generate_ai_action_plan(url, audit_results):
+def generate_ai_action_plan(url, audit_results, credentials=None):
     """
     AI-powered personalized action plan generator
 
@@ -16,6 +19,8 @@ def generate_ai_action_plan(url, audit_results):
     - Expected impact estimates
     - Quick wins identification
     - Resource requirements
+
+    credentials: Credentials with the audit's Gemini key (None = key from config)
     """
 
     results = {
@@ -32,7 +37,7 @@ def generate_ai_action_plan(url, audit_results):
 
     # Initialize AI
     try:
-        ai = AIAnalyzer(GEMINI_API_KEY)
+        ai = AIAnalyzer(resolve_credentials(credentials).gemini_api_key)
 
         if not ai.is_available():
             results['error'] = "AI not available - check API key"
@@ -58,6 +63,7 @@ def generate_ai_action_plan(url, audit_results):
         ]),
         'top_issues': audit_results.get('all_issues', [])[:10]  # Top 10
     }
+    audit_summary_json = _fit_audit_summary(audit_summary, AI_TOKEN_BUDGETS['ai_action_plan'])
 
     # Detect language from AI content insights
     detected_language = 'en'
@@ -82,8 +88,7 @@ You are a senior SEO strategist creating a BATTLE-TESTED action plan for a real
 
 CRITICAL: This plan must deliver MEASURABLE business results, not just improve numbers.
 
-AUDIT SUMMARY:
-{json.dumps(audit_summary, indent=2)}
+AUDIT SUMMARY: provided below as JSON ("Text to analyze").
 
 **CRITICAL: Your entire response must be ONLY valid JSON. No markdown formatting, no code blocks, no explanations. Start with opening brace and end with closing brace. Pure JSON only.**
 
@@ -196,9 +201,14 @@ CRITICAL INSTRUCTIONS:
 
     # Analyze with AI
     try:
-        # Use text analysis since we're passing structured data
-        response = ai.analyze_text(json.dumps(audit_summary), prompt, json_output=True)
-        analysis = ai.parse_json_response(response)
+        # Use text analysis since we're passing structured data (structured output: ACTION_PLAN_SCHEMA)
+        analysis = ai.analyze_text_json(
+            audit_summary_json, prompt,
+            required_fields=['overall_strategy', 'quick_wins', 'roadmap_30_days'],
+            stream_label='ai_action_plan',
+            response_schema=ACTION_PLAN_SCHEMA,
+            max_tokens=AI_TOKEN_BUDGETS['ai_action_plan']
+        )
 
         if 'error' in analysis:
             results['error'] = analysis['error']
@@ -233,6 +243,26 @@ CRITICAL INSTRUCTIONS:
     return results
 
 
+def _fit_audit_summary(audit_summary, max_tokens):
+    """
+    Podsumowanie audytu jako zwarty JSON w budżecie tokenów
+
+    Zamiast ucinać tekst (niepoprawny JSON) skracamy opisy problemów,
+    a potem odrzucamy problemy od końca listy (najmniej istotne).
+    """
+    summary = dict(audit_summary)
+    summary['top_issues'] = [
+        {key: truncate_to_tokens(value, 80) if isinstance(value, str) else value for key, value in issue.items()}
+        for issue in audit_summary.get('top_issues', [])
+    ]
+
+    serialized = json.dumps(summary, ensure_ascii=False, separators=(',', ':'))
+    while estimate_tokens(serialized) > max_tokens and summary['top_issues']:
+        summary['top_issues'] = summary['top_issues'][:-1]
+        serialized = json.dumps(summary, ensure_ascii=False, separators=(',', ':'))
+    return serialized
+
+
 def format_action_plan_for_display(action_plan):
     """
     Format action plan for terminal/UI display
@@ -3,28 +3,30 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from ai_engine import AIAnalyzer
-from config import GEMINI_API_KEY, ENABLE_AI_ANALYSIS
-from bs4 import BeautifulSoup
+from ai_schemas import CONTENT_ANALYSIS_SCHEMA
+from config import ENABLE_AI_ANALYSIS, AI_TOKEN_BUDGETS
+from content_extractor import inline_page_content
+from credentials import resolve_credentials
+from page_document import ensure_document
 import json
 
-def detect_page_language(html_content):
-    """Detect page language from HTML"""
+def detect_page_language(document):
+    """Detect page language from HTML (document: ParsedDocument or raw HTML)"""
     try:
-        soup = BeautifulSoup(html_content, 'html.parser')
+        document = ensure_document(document)
 
         # Check lang attribute
-        html_tag = soup.find('html')
-        if html_tag and html_tag.get('lang'):
-            lang = html_tag.get('lang')[:2].lower()
+        if document.lang:
+            lang = document.lang[:2].lower()
             return lang
 
         # Check meta content-language
-        meta_lang = soup.find('meta', attrs={'http-equiv': 'content-language'})
+        meta_lang = document.meta_http_equiv.get('content-language')
         if meta_lang and meta_lang.get('content'):
             return meta_lang.get('content')[:2].lower()
 
         # Default to detecting from content
-        text_sample = soup.get_text()[:500]
+        text_sample = document.text[:500]
 
         # Simple heuristics
         polish_indicators = ['jest', 'się', 'nie', 'czy', 'jak', 'który', 'dla']
@@ -40,9 +42,9 @@ def detect_page_language(html_content):
     except:
         return 'en'
 
-def analyze_ai_content(url, html_content):
+def analyze_ai_content(url, document, credentials=None):
     """
-    Enhanced AI-powered content quality analysis
+    Enhanced AI-powered content quality analysis (document: ParsedDocument or raw HTML)
 
     NEW FEATURES:
     - Auto language detection
@@ -50,7 +52,10 @@ def analyze_ai_content(url, html_content):
     - Competitive positioning
     - Conversion optimization hints
     - Business value assessment
+
+    credentials: Credentials with the audit's Gemini key (None = key from config)
     """
+    document = ensure_document(document, url)
 
     results = {
         'score': 0,
@@ -66,13 +71,13 @@ def analyze_ai_content(url, html_content):
         return results
 
     # Detect language
-    detected_lang = detect_page_language(html_content)
+    detected_lang = detect_page_language(document)
     results['language'] = detected_lang
     print(f"[AI] Detected language: {detected_lang}")
 
     # Initialize AI
     try:
-        ai = AIAnalyzer(GEMINI_API_KEY)
+        ai = AIAnalyzer(resolve_credentials(credentials).gemini_api_key)
 
         if not ai.is_available():
             results['insights']['ai_unavailable'] = "AI not available - check API key"
@@ -216,10 +221,18 @@ IMPORTANT:
 - Think like a business consultant, not just an SEO
 """
 
-    # Analyze with AI (with retry)
+    # Analyze with AI (schema validation + follow-up for missing fields instead of full retries)
     try:
         print(f"[AI] Analyzing content for {url}...")
-        response = ai.analyze_with_retry(url, prompt, max_retries=2)
+        page_content = inline_page_content(document, AI_TOKEN_BUDGETS['ai_content'])
+        response = ai.analyze_url_json(
+            url, prompt,
+            required_fields=['content_quality_score', 'page_type', 'critical_issues', 'quick_wins', 'overall_summary'],
+            content_hash=document.content_hash,
+            stream_label='ai_content',
+            response_schema=CONTENT_ANALYSIS_SCHEMA,
+            page_content=page_content
+        )
 
         if 'error' in response:
             results['insights']['ai_error'] = response['error']
@@ -280,7 +293,7 @@ IMPORTANT:
 
 # Test function
 if __name__ == '__main__':
-    import requests
+    from http_client import http_get
 
     test_url = input("Enter URL to test (or press Enter for example.com): ").strip()
     if not test_url:
@@ -288,7 +301,7 @@ if __name__ == '__main__':
 
     print(f"\n[TEST] Fetching {test_url}...")
     try:
-        response = requests.get(test_url, timeout=10)
+        response = http_get(test_url, timeout=10)
         html_content = response.text
 
         print("[TEST] Running AI Content Analysis...")
@@ -2,9 +2,13 @@
 # STAGE 2: Holistic Multi-Page AI Analysis
 
 from ai_engine import AIEngine
-import json
+from ai_schemas import HOLISTIC_ANALYSIS_SCHEMA
+from config import AI_INLINE_CONTENT, AI_TOKEN_BUDGETS
+from content_extractor import block_key, compact_page, find_template_blocks, format_blocks, has_main_content
+from page_document import ParsedDocument
 
-def analyze_site_holistically(homepage_url, pages_data, site_type, language='en'):
+def analyze_site_holistically(homepage_url, pages_data, site_type, language='en', homepage_content_hash=None,
+                              credentials=None, homepage_document=None):
     """
     STAGE 2: AI analyzes ALL pages together as ONE COHESIVE WEBSITE
 
@@ -23,11 +27,18 @@ def analyze_site_holistically(homepage_url, pages_data, site_type, language='en'
                 'url': str,
                 'html': str,
                 'page_type': str,
-                'selection_reason': str
+                'selection_reason': str,
+                'content_hash': str (optional),
+                'document': ParsedDocument (optional, parsed from html if missing)
             }
         ]
         site_type: Detected site type from Stage 1
         language: Detected language
+        homepage_content_hash: Homepage ParsedDocument.content_hash - together with
+                               pages' content_hash enables the AI response cache
+        credentials: Credentials with the audit's Gemini key (None = key from config)
+        homepage_document: Homepage ParsedDocument - enables sending the fetched content of all
+                           pages inline instead of URL Context (see AI_INLINE_CONTENT)
 
     Returns:
         dict: {
@@ -224,118 +235,39 @@ Be specific, actionable, and brutally honest about opportunities and problems.
 """
 
     try:
-        ai = AIEngine()
+        ai = AIEngine(credentials)
 
         # Prepare URLs for batch analysis
         urls_to_analyze = [homepage_url] + [page['url'] for page in pages_data]
 
-        # Use URL Context with multiple URLs
-        # Note: We'll pass the primary URL and include others in the prompt
-        response = ai.analyze_url(
-            url=homepage_url,
-            prompt=prompt + f"\n\nADDITIONAL PAGES TO ANALYZE: {', '.join(urls_to_analyze[1:])}",
-            use_url_context=True
+        # Odpowiedź z URL Context można wziąć z cache tylko jeśli znamy treść WSZYSTKICH stron
+        content_hashes = [homepage_content_hash] + [page.get('content_hash') for page in pages_data]
+
+        # Treść stron pobrana przez audyt w zapytaniu; bez niej URL Context ze WSZYSTKIMI wybranymi URLami
+        # Ucięta odpowiedź: kompletne pola zostają, o brakujące AI jest dopytywane osobno
+        result = ai.analyze_multiple_urls_json(
+            urls=urls_to_analyze,
+            prompt=prompt,
+            required_fields=['holistic_score', 'template_insights', 'scalable_recommendations'],
+            content_hashes=content_hashes,
+            stream_label='holistic',
+            response_schema=HOLISTIC_ANALYSIS_SCHEMA,
+            page_content=_inline_site_content(homepage_document, pages_data)
         )
 
-        # Clean and parse JSON response
-        cleaned_response = response.strip()
-
-        # Remove markdown code blocks if present
-        if cleaned_response.startswith('```json'):
-            cleaned_response = cleaned_response.replace('```json', '', 1)
-        if cleaned_response.startswith('```'):
-            cleaned_response = cleaned_response.replace('```', '', 1)
-        if cleaned_response.endswith('```'):
-            cleaned_response = cleaned_response.rsplit('```', 1)[0]
-
-        cleaned_response = cleaned_response.strip()
-
-        # Try to find JSON object in response
-        if not cleaned_response.startswith('{'):
-            start = cleaned_response.find('{')
-            end = cleaned_response.rfind('}')
-            if start != -1 and end != -1 and end > start:
-                cleaned_response = cleaned_response[start:end+1]
-
-        # Parse JSON response
-        result = json.loads(cleaned_response)
-
-        # Validate required fields
-        required_fields = ['holistic_score', 'template_insights', 'scalable_recommendations']
-        for field in required_fields:
-            if field not in result:
-                return {
-                    'success': False,
-                    'error': f'AI response missing required field: {field}'
-                }
+        if 'error' in result:
+            print(f"[ERROR] Multi-page AI response unusable: {result['error']}")
+            return {
+                'success': False,
+                'error': result['error'],
+                'raw_response': (result.get('raw') or '')[:1000]
+            }
 
         return {
             'success': True,
             **result
         }
 
-    except json.JSONDecodeError as e:
-        print(f"[ERROR] Multi-page JSON Parse Error: {str(e)}")
-        print(f"[DEBUG] Error position: line {e.lineno}, column {e.colno}")
-        print(f"[DEBUG] Response length: {len(response) if 'response' in locals() else 0} chars")
-
-        # Show context around error
-        if 'cleaned_response' in locals() and hasattr(e, 'pos') and e.pos:
-            start = max(0, e.pos - 200)
-            end = min(len(cleaned_response), e.pos + 200)
-            print(f"[DEBUG] Context around error (pos {e.pos}):")
-            print(f"...{cleaned_response[start:end]}...")
-        else:
-            print(f"[DEBUG] Raw response (first 1000 chars): {response[:1000] if 'response' in locals() else 'N/A'}")
-            print(f"[DEBUG] Cleaned response (first 1000 chars): {cleaned_response[:1000] if 'cleaned_response' in locals() else 'N/A'}")
-
-        # Save full response to temp file for debugging
-        try:
-            import tempfile
-            import os
-            with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='_ai_response.json', prefix='seo_aiditor_') as f:
-                f.write(cleaned_response if 'cleaned_response' in locals() else response)
-                debug_file = f.name
-            print(f"[DEBUG] Full response saved to: {debug_file}")
-        except Exception as save_err:
-            print(f"[DEBUG] Could not save debug file: {save_err}")
-
-        # Try to repair common JSON issues
-        if 'cleaned_response' in locals():
-            print("[DEBUG] Attempting JSON repair...")
-            repaired = cleaned_response
-
-            # Try to complete truncated JSON by adding closing braces
-            open_braces = repaired.count('{') - repaired.count('}')
-            open_brackets = repaired.count('[') - repaired.count(']')
-
-            if open_braces > 0 or open_brackets > 0:
-                print(f"[DEBUG] Detected unclosed braces: {open_braces} {{, {open_brackets} [")
-                repaired = repaired.rstrip(',\n\r\t ')  # Remove trailing commas
-                repaired += '\n' + ']' * open_brackets + '\n' + '}' * open_braces
-
-                try:
-                    result = json.loads(repaired)
-                    print("[DEBUG] JSON repair successful!")
-
-                    # Validate required fields
-                    required_fields = ['holistic_score', 'template_insights', 'scalable_recommendations']
-                    for field in required_fields:
-                        if field not in result:
-                            print(f"[WARNING] Repaired JSON missing field: {field}")
-
-                    return {
-                        'success': True,
-                        **result
-                    }
-                except json.JSONDecodeError as e2:
-                    print(f"[DEBUG] JSON repair failed: {e2}")
-
-        return {
-            'success': False,
-            'error': f'Failed to parse AI response as JSON: {str(e)}',
-            'raw_response': response[:1000] if 'response' in locals() else ''
-        }
     except Exception as e:
         print(f"[ERROR] Holistic AI analysis failed: {str(e)}")
         import traceback
@@ -346,6 +278,50 @@ Be specific, actionable, and brutally honest about opportunities and problems.
         }
 
 
+def _inline_site_content(homepage_document, pages_data):
+    """
+    Treść strony głównej i wybranych podstron do wysłania w zapytaniu (zamiast URL Context)
+
+    Bloki powtarzające się na większości stron (szablon) trafiają raz do sekcji
+    SHARED TEMPLATE zamiast do każdej strony - model widzi szablon, a budżet
+    tokenów idzie na treść poszczególnych stron.
+
+    Returns:
+        str lub None - wtedy URL Context (tryb wyłączony lub brak treści w HTML strony głównej)
+    """
+    if not AI_INLINE_CONTENT or homepage_document is None:
+        return None
+    if not has_main_content(homepage_document):
+        print("[AI] No main content in fetched homepage HTML - holistic analysis falls back to URL Context")
+        return None
+
+    pages = [('HOMEPAGE', homepage_document)] + [
+        (f"PAGE {i} ({page.get('page_type', 'unknown')})", page.get('document') or ParsedDocument(page['html'], page['url']))
+        for i, page in enumerate(pages_data, 1)
+    ]
+    documents = [document for _, document in pages]
+
+    budget = AI_TOKEN_BUDGETS['holistic']
+    template_keys = find_template_blocks(documents)
+    sections = []
+    if template_keys:
+        template_budget = budget // 10
+        budget -= template_budget
+        template_blocks, seen = [], set()
+        for document in documents:
+            for block in document.main_content:
+                key = block_key(block.text)
+                if key in template_keys and key not in seen:
+                    seen.add(key)
+                    template_blocks.append(block)
+        sections.append(f"=== SHARED TEMPLATE (repeated on most pages) ===\n{format_blocks(template_blocks, template_budget)}")
+
+    per_page = budget // len(pages)
+    for label, document in pages:
+        sections.append(f"=== {label} ===\n{compact_page(document, per_page, template_keys)}")
+    return '\n\n'.join(sections)
+
+
 # Test
 if __name__ == '__main__':
     print("[TEST] Holistic Multi-Page Analyzer")
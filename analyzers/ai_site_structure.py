@@ -2,9 +2,13 @@
 # STAGE 1: AI-Powered Site Type Detection & Intelligent Page Selection
 
 from ai_engine import AIEngine
-import json
+from ai_schemas import SITE_STRUCTURE_SCHEMA
+from config import AI_TOKEN_BUDGETS
+from content_extractor import fit_lines, inline_page_content
+from page_document import ensure_document
 
-def detect_site_type_and_select_pages(url, html_content, available_links, language='en'):
+def detect_site_type_and_select_pages(url, html_content, available_links, language='en', content_hash=None,
+                                      credentials=None):
     """
     STAGE 1: AI analyzes homepage and available links to:
     1. Detect site type (e-commerce, service, blog, corporate, portfolio)
@@ -12,9 +16,11 @@ def detect_site_type_and_select_pages(url, html_content, available_links, langua
 
     Args:
         url: Homepage URL
-        html_content: Homepage HTML
+        html_content: Homepage ParsedDocument (or raw HTML)
         available_links: List of internal links found on homepage
         language: Detected language
+        content_hash: Homepage ParsedDocument.content_hash (enables AI response cache)
+        credentials: Credentials with the audit's Gemini key (None = key from config)
 
     Returns:
         dict: {
@@ -43,10 +49,10 @@ def detect_site_type_and_select_pages(url, html_content, available_links, langua
     }
 
     lang_instruction = lang_instructions.get(language, lang_instructions['en'])
+    document = ensure_document(html_content, url)
 
-    # Format available links for AI
-    links_sample = available_links[:50] if len(available_links) > 50 else available_links
-    links_formatted = '\n'.join([f"- {link}" for link in links_sample])
+    # Format available links for AI (as many as fit the stage token budget)
+    links_formatted = '\n'.join(fit_lines([f"- {link}" for link in available_links], AI_TOKEN_BUDGETS['page_selection']))
 
     prompt = f"""{lang_instruction}
 
@@ -125,49 +131,31 @@ Your selection directly impacts the quality of the final audit.
 """
 
     try:
-        ai = AIEngine()
+        ai = AIEngine(credentials)
 
-        # Use URL Context to analyze homepage
-        response = ai.analyze_url(
+        # Homepage content fetched by the audit (URL Context only as fallback)
+        result = ai.analyze_url_json(
             url=url,
             prompt=prompt,
-            use_url_context=True
+            required_fields=['site_type', 'selected_pages'],
+            use_url_context=True,
+            content_hash=content_hash,
+            stream_label='page_selection',
+            response_schema=SITE_STRUCTURE_SCHEMA,
+            page_content=inline_page_content(document, AI_TOKEN_BUDGETS['page_selection_content'])
         )
 
-        # Clean and parse JSON response
-        # Sometimes Gemini returns markdown code blocks or extra text
-        cleaned_response = response.strip()
-
-        # Remove markdown code blocks if present
-        if cleaned_response.startswith('```json'):
-            cleaned_response = cleaned_response.replace('```json', '', 1)
-        if cleaned_response.startswith('```'):
-            cleaned_response = cleaned_response.replace('```', '', 1)
-        if cleaned_response.endswith('```'):
-            cleaned_response = cleaned_response.rsplit('```', 1)[0]
-
-        cleaned_response = cleaned_response.strip()
-
-        # Try to find JSON object in response
-        if not cleaned_response.startswith('{'):
-            # Try to find first { and last }
-            start = cleaned_response.find('{')
-            end = cleaned_response.rfind('}')
-            if start != -1 and end != -1 and end > start:
-                cleaned_response = cleaned_response[start:end+1]
-
-        # Parse JSON response
-        result = json.loads(cleaned_response)
-
-        # Validate required fields
-        if 'site_type' not in result or 'selected_pages' not in result:
+        if 'error' in result:
+            print(f"[ERROR] Site structure AI response unusable: {result['error']}")
             return {
                 'success': False,
-                'error': 'AI response missing required fields'
+                'error': result['error'],
+                'raw_response': (result.get('raw') or '')[:1000]
             }
 
         # Ensure we have pages
-        if not result['selected_pages'] or len(result['selected_pages']) == 0:
+        if not result['selected_pages']:
+            ai.discard_last_response()
             return {
                 'success': False,
                 'error': 'AI did not select any pages'
@@ -181,15 +169,6 @@ Your selection directly impacts the quality of the final audit.
             'selected_pages': result['selected_pages']
         }
 
-    except json.JSONDecodeError as e:
-        print(f"[ERROR] JSON Parse Error: {str(e)}")
-        print(f"[DEBUG] Raw response (first 500 chars): {response[:500] if 'response' in locals() else 'N/A'}")
-        print(f"[DEBUG] Cleaned response (first 500 chars): {cleaned_response[:500] if 'cleaned_response' in locals() else 'N/A'}")
-        return {
-            'success': False,
-            'error': f'Failed to parse AI response as JSON: {str(e)}',
-            'raw_response': response[:1000] if 'response' in locals() else ''
-        }
     except Exception as e:
         print(f"[ERROR] AI Site Structure Analysis failed: {str(e)}")
         import traceback
@@ -1,25 +1,24 @@
 # analyzers/content.py
-from bs4 import BeautifulSoup
 import textstat
 import re
+import sys
+import os
 from collections import Counter
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from page_document import ensure_document
 
-def analyze_content(html_content):
-    """Analiza jakości contentu"""
+def analyze_content(document):
+    """Analiza jakości contentu (document: ParsedDocument lub surowy HTML)"""
     results = {
         'score': 0,
         'checks': {},
         'issues': []
     }
 
-    soup = BeautifulSoup(html_content, 'html.parser')
+    document = ensure_document(document)
 
-    # Usuń script i style z analizy
-    for script in soup(['script', 'style', 'nav', 'footer', 'header']):
-        script.decompose()
-
-    # Wyciągnij tekst
-    text = soup.get_text(separator=' ', strip=True)
+    # Wyciągnij tekst (bez script, style, nav, footer, header)
+    text = document.content_text
     text = re.sub(r'\s+', ' ', text)  # Normalizuj białe znaki
 
     # 1. Word count
@@ -55,7 +54,7 @@ def analyze_content(html_content):
         })
 
     # 2. Text-to-HTML ratio
-    html_size = len(html_content)
+    html_size = len(document.html)
     text_size = len(text)
     ratio = (text_size / html_size * 100) if html_size > 0 else 0
 
@@ -142,8 +141,8 @@ def analyze_content(html_content):
         results['checks']['keyword_density'] = {'value': 'N/A', 'pass': True, 'score': 70}
 
     # 5. Paragraph analysis
-    paragraphs = soup.find_all('p')
-    long_paragraphs = [p for p in paragraphs if len(p.get_text().split()) > 150]
+    paragraphs = document.content_paragraphs
+    long_paragraphs = [p for p in paragraphs if len(p.split()) > 150]
 
     results['checks']['paragraphs'] = {
         'value': f'{len(paragraphs)} paragrafów',
@@ -1,30 +1,42 @@
 # analyzers/indexing.py
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
-import xml.etree.ElementTree as ET
-
-def analyze_indexing(url, html_content):
-    """Analiza crawlability i indexing"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from page_document import ensure_document
+from site_resources import SiteResources
+from sitemap_parser import MAX_URLS_PER_SITEMAP
+
+def analyze_indexing(url, document, site=None):
+    """
+    Analiza crawlability i indexing
+
+    Args:
+        url: URL strony
+        document: ParsedDocument lub surowy HTML
+        site: SiteResources audytu (robots.txt i sitemapy pobrane raz na audyt);
+              None = pobierz na potrzeby tej analizy
+    """
     results = {
         'score': 0,
         'checks': {},
         'issues': []
     }
 
-    soup = BeautifulSoup(html_content, 'html.parser')
-    base_domain = url.rstrip('/')
+    document = ensure_document(document, url)
+    if site is None:
+        site = SiteResources(url)
 
     # 1. Robots.txt
-    robots_url = urljoin(base_domain, '/robots.txt')
     try:
-        robots_response = requests.get(robots_url, timeout=5)
-        if robots_response.status_code == 200:
-            robots_content = robots_response.text
+        robots = site.robots()
+        if 'error' in robots:
+            raise Exception(robots['error'])
+        if robots['exists']:
+            robots_content = robots['content']
 
-            # Sprawdź czy nie blokuje wszystkiego
-            blocks_all = 'Disallow: /' in robots_content and 'User-agent: *' in robots_content
-            has_sitemap = 'Sitemap:' in robots_content
+            # Sprawdź czy nie blokuje wszystkiego (prawdziwe dopasowanie reguł, nie szukanie tekstu)
+            blocks_all = robots['rules'].blocks_all()
+            has_sitemap = bool(robots['rules'].sitemaps)
 
             results['checks']['robots_txt'] = {
                 'value': 'Istnieje ✓',
@@ -66,45 +78,56 @@ def analyze_indexing(url, html_content):
     except:
         results['checks']['robots_txt'] = {'value': 'Error', 'pass': False, 'score': 50}
 
-    # 2. Sitemap.xml
-    sitemap_url = urljoin(base_domain, '/sitemap.xml')
+    # 2. Sitemap.xml (z robots.txt lub /sitemap.xml; strumieniowo, z rekurencją po sitemap index)
     try:
-        sitemap_response = requests.get(sitemap_url, timeout=5)
-        if sitemap_response.status_code == 200:
-            # Spróbuj sparsować XML
-            try:
-                root = ET.fromstring(sitemap_response.content)
-                # Policz URLe
-                url_count = len(root.findall('.//{http://www.sitemaps.org/schemas/sitemap/0.9}url'))
-
-                results['checks']['sitemap'] = {
-                    'value': f'Istnieje ({url_count} URLs)',
-                    'pass': True,
-                    'score': 100
-                }
-
-                if url_count > 50000:
-                    results['issues'].append({
-                        'severity': 'important',
-                        'title': 'Sitemap zbyt duża',
-                        'impact': 6,
-                        'description': f'{url_count} URLs (max 50,000)',
-                        'fix': 'Podziel sitemap na mniejsze pliki (sitemap index)'
-                    })
-            except:
-                results['checks']['sitemap'] = {
-                    'value': 'Istnieje (niepoprawny XML)',
-                    'pass': False,
-                    'score': 50
-                }
+        sitemap = site.sitemap()
+        if sitemap['valid']:
+            url_count = sitemap['url_count']
+            value = f'Istnieje ({url_count} URLs)'
+            if sitemap['is_index']:
+                # Liczba sitemap zadeklarowanych w index(ach) - niezależna od tego, ile plików pobrano
+                value = f"Istnieje (index: {sitemap['child_sitemaps']} plików, {url_count} URLs)"
+                if not sitemap.get('complete', True):
+                    # Audyt pobieżny: policzone tylko URLe z pobranych plików sitemap index
+                    value = f"Istnieje (index: {sitemap['child_sitemaps']} plików, {url_count}+ URLs)"
+
+            results['checks']['sitemap'] = {
+                'value': value,
+                'pass': True,
+                'score': 100
+            }
+
+            for oversized in sitemap['oversized_files']:
                 results['issues'].append({
                     'severity': 'important',
-                    'title': 'Sitemap niepoprawny',
-                    'impact': 7,
-                    'description': 'Sitemap istnieje ale ma błędy składni XML',
-                    'fix': 'Napraw składnię XML w sitemap.xml'
+                    'title': 'Sitemap zbyt duża',
+                    'impact': 6,
+                    'description': f"{oversized['url']}: {oversized['urls']} URLs, {oversized['bytes'] / 1024 / 1024:.1f} MB (max {MAX_URLS_PER_SITEMAP:,} URLs / 50 MB)",
+                    'fix': 'Podziel sitemap na mniejsze pliki (sitemap index)'
                 })
-        else:
+
+            if sitemap['invalid_urls']:
+                results['issues'].append({
+                    'severity': 'recommendation',
+                    'title': f"{sitemap['invalid_urls']} niepoprawnych wpisów w sitemap",
+                    'impact': 4,
+                    'description': 'Wpisy bez <loc> lub z URL, który nie jest absolutnym adresem http(s)',
+                    'fix': 'Używaj pełnych, absolutnych URLi w <loc>'
+                })
+        elif sitemap['exists']:
+            results['checks']['sitemap'] = {
+                'value': 'Istnieje (niepoprawny XML)',
+                'pass': False,
+                'score': 50
+            }
+            results['issues'].append({
+                'severity': 'important',
+                'title': 'Sitemap niepoprawny',
+                'impact': 7,
+                'description': 'Sitemap istnieje ale ma błędy składni XML',
+                'fix': 'Napraw składnię XML w sitemap.xml'
+            })
+        elif sitemap['status_code']:
             results['checks']['sitemap'] = {
                 'value': 'Brak (404)',
                 'pass': False,
@@ -117,11 +140,13 @@ def analyze_indexing(url, html_content):
                 'description': 'Sitemap pomaga Google crawlować stronę',
                 'fix': 'Wygeneruj i opublikuj sitemap.xml'
             })
+        else:
+            results['checks']['sitemap'] = {'value': 'Error', 'pass': False, 'score': 0}
     except:
         results['checks']['sitemap'] = {'value': 'Error', 'pass': False, 'score': 0}
 
     # 3. Canonical tag
-    canonical = soup.find('link', rel='canonical')
+    canonical = document.canonical
     if canonical and canonical.get('href'):
         canonical_url = canonical.get('href')
         results['checks']['canonical'] = {
@@ -145,7 +170,7 @@ def analyze_indexing(url, html_content):
         })
 
     # 4. Meta robots
-    meta_robots = soup.find('meta', attrs={'name': 'robots'})
+    meta_robots = document.meta.get('robots')
     if meta_robots:
         content = meta_robots.get('content', '').lower()
         is_noindex = 'noindex' in content
@@ -172,8 +197,7 @@ def analyze_indexing(url, html_content):
         }
 
     # 5. Schema Markup (JSON-LD)
-    schema_scripts = soup.find_all('script', type='application/ld+json')
-    schema_count = len(schema_scripts)
+    schema_count = len(document.json_ld)
 
     results['checks']['schema_markup'] = {
         'value': f'{schema_count} schema' if schema_count > 0 else 'Brak',
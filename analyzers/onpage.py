@@ -1,15 +1,15 @@
 # analyzers/onpage.py
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import THRESHOLDS
 from utils import is_internal_link, get_domain
+from page_document import ensure_document
 
-def analyze_onpage(url, html_content):
-    """Analiza elementów on-page"""
-    soup = BeautifulSoup(html_content, 'html.parser')
+def analyze_onpage(url, document):
+    """Analiza elementów on-page (document: ParsedDocument lub surowy HTML)"""
+    document = ensure_document(document, url)
     results = {
         'score': 0,
         'checks': {},
@@ -17,9 +17,8 @@ def analyze_onpage(url, html_content):
     }
 
     # 1. Title Tag
-    title_tag = soup.find('title')
-    if title_tag:
-        title_text = title_tag.get_text().strip()
+    if document.title_tag:
+        title_text = document.title.strip()
         title_length = len(title_text)
         optimal_min, optimal_max = THRESHOLDS['title_length_optimal']
 
@@ -64,7 +63,7 @@ def analyze_onpage(url, html_content):
         })
 
     # 2. Meta Description
-    meta_desc = soup.find('meta', attrs={'name': 'description'})
+    meta_desc = document.meta.get('description')
     if meta_desc and meta_desc.get('content'):
         desc_text = meta_desc.get('content').strip()
         desc_length = len(desc_text)
@@ -97,7 +96,7 @@ def analyze_onpage(url, html_content):
         })
 
     # 3. Nagłówki H1-H6
-    h1_tags = soup.find_all('h1')
+    h1_tags = document.headings['h1']
     h1_count = len(h1_tags)
 
     if h1_count == 1:
@@ -135,11 +134,11 @@ def analyze_onpage(url, html_content):
 
     # Hierarchia H2-H6
     heading_structure = {
-        'h2': len(soup.find_all('h2')),
-        'h3': len(soup.find_all('h3')),
-        'h4': len(soup.find_all('h4')),
-        'h5': len(soup.find_all('h5')),
-        'h6': len(soup.find_all('h6'))
+        'h2': len(document.headings['h2']),
+        'h3': len(document.headings['h3']),
+        'h4': len(document.headings['h4']),
+        'h5': len(document.headings['h5']),
+        'h6': len(document.headings['h6'])
     }
 
     results['checks']['heading_structure'] = {
@@ -149,8 +148,8 @@ def analyze_onpage(url, html_content):
     }
 
     # 4. Obrazy i Alt teksty
-    images = soup.find_all('img')
-    images_with_alt = [img for img in images if img.get('alt')]
+    images = document.images
+    images_with_alt = [img for img in images if img['alt']]
     alt_percentage = (len(images_with_alt) / len(images) * 100) if images else 100
 
     results['checks']['images_alt'] = {
@@ -171,10 +170,10 @@ def analyze_onpage(url, html_content):
 
     # 5. Open Graph tags
     og_tags = {
-        'og:title': soup.find('meta', property='og:title'),
-        'og:description': soup.find('meta', property='og:description'),
-        'og:image': soup.find('meta', property='og:image'),
-        'og:type': soup.find('meta', property='og:type')
+        'og:title': document.meta_properties.get('og:title'),
+        'og:description': document.meta_properties.get('og:description'),
+        'og:image': document.meta_properties.get('og:image'),
+        'og:type': document.meta_properties.get('og:type')
     }
 
     og_present = sum(1 for tag in og_tags.values() if tag)
@@ -194,11 +193,11 @@ def analyze_onpage(url, html_content):
         })
 
     # 6. Linki
-    all_links = soup.find_all('a', href=True)
+    all_links = document.links
     base_domain = get_domain(url)
 
-    internal_links = [link for link in all_links if is_internal_link(link['href'], base_domain)]
-    external_links = [link for link in all_links if not is_internal_link(link['href'], base_domain)]
+    internal_links = [href for href in all_links if is_internal_link(href, base_domain)]
+    external_links = [href for href in all_links if not is_internal_link(href, base_domain)]
 
     results['checks']['links'] = {
         'value': f"Wew: {len(internal_links)}, Zew: {len(external_links)}",
@@ -1,13 +1,33 @@
 # analyzers/pagespeed.py
-import requests
-import time
 import sys
 import os
+import hashlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import GOOGLE_PSI_API_KEY, PSI_TIMEOUT
+from config import (
+    PSI_TIMEOUT, PSI_CATEGORIES, PSI_QUERIES_PER_SECOND, PSI_BURST, PSI_DAILY_QUOTA,
+    PSI_MAX_QUEUE_WAIT, PSI_MAX_RETRIES, PSI_BACKOFF_BASE, PSI_BACKOFF_MAX,
+    CACHE_DIR, PSI_CACHE_TTL, PSI_CACHE_MAX_ENTRIES
+)
+from credentials import resolve_credentials
+from http_client import api_get
+from disk_cache import DiskCache
+from rate_limiter import rate_limiter, backoff_delay, parse_retry_after
+from utils import normalize_url
 
-def analyze_pagespeed(url):
-    """Analiza Core Web Vitals via Google PageSpeed Insights API"""
+PSI_STRATEGIES = ('mobile', 'desktop')
+
+# Wyniki PSI (sparsowane) per URL + strategia - wspólne dla workerów gunicorna
+psi_cache = DiskCache(os.path.join(CACHE_DIR, 'pagespeed.sqlite'), ttl=PSI_CACHE_TTL, max_entries=PSI_CACHE_MAX_ENTRIES)
+
+
+class PSIQuotaExceeded(Exception):
+    """Dzienna kwota zapytań PSI dla klucza została wyczerpana"""
+
+
+def analyze_pagespeed(url, credentials=None):
+    """Analiza Core Web Vitals via Google PageSpeed Insights API (credentials: klucz PSI audytu)"""
     results = {
         'score': 0,
         'checks': {},
@@ -18,7 +38,7 @@ def analyze_pagespeed(url):
 
     # Sprawdź mobilną wersję
     try:
-        mobile_data = fetch_psi_data(url, 'mobile')
+        mobile_data = fetch_psi_data(url, 'mobile', credentials)
         results['mobile'] = parse_psi_data(mobile_data)
         results['checks']['mobile_performance'] = {
             'value': f"{results['mobile']['performance_score']}/100",
@@ -82,104 +102,121 @@ def analyze_pagespeed(url):
 
     return results
 
-def analyze_pagespeed_full(url):
+def analyze_pagespeed_full(url, credentials=None):
     """
     Full PageSpeed analysis with desktop + mobile + all Lighthouse categories
     Returns comprehensive performance data for new Performance tab
 
-    TEMPORARILY DISABLED due to API key 429 issues
+    Mobile i desktop są pobierane równolegle w ramach kwoty klucza PSI
+    (patrz _request_psi); wyniki są cache'owane per URL + strategia.
+
+    Returns:
+        dict: {'mobile': parse_psi_data_full() or None, 'desktop': ...,
+               'success': bool (co najmniej jedna strategia się udała),
+               'errors': {strategy: str} (nieudane strategie),
+               'error': str (if any strategy failed)}
     """
     results = {
         'mobile': None,
         'desktop': None,
         'success': False,
-        'error': 'PageSpeed tymczasowo wyłączony - sprawdź limity API key w Google Cloud Console (quota, billing, restrictions)'
+        'errors': {}
     }
 
-    # TEMPORARY: Disable PageSpeed entirely to fix app
-    # Root cause: API key hitting 429 even with 1 category + aggressive rate limiting
-    # User needs to check Google Cloud Console:
-    # 1. APIs & Services → Credentials → Check API key restrictions
-    # 2. APIs & Services → PageSpeed Insights API → Quotas
-    # 3. Billing → Check if billing is enabled (free tier has lower limits)
-
-    return results
-
-def fetch_psi_data(url, strategy='mobile'):
-    """Pobierz dane z PageSpeed Insights API (tylko performance - legacy)"""
-    endpoint = 'https://www.googleapis.com/pagespeedonline/v5/runPagespeed'
-
-    params = {
-        'url': url,
-        'strategy': strategy,  # mobile lub desktop
-        'category': 'performance'
-    }
+    # Etapy pipeline raportują czekanie na kwotę - wątki strategii dziedziczą kontekst audytu
+    with ThreadPoolExecutor(max_workers=len(PSI_STRATEGIES)) as executor:
+        futures = {
+            strategy: executor.submit(contextvars.copy_context().run, _pagespeed_strategy, url, strategy, credentials)
+            for strategy in PSI_STRATEGIES
+        }
 
-    # Dodaj API key tylko jeśli jest ustawiony
-    if GOOGLE_PSI_API_KEY and GOOGLE_PSI_API_KEY != "YOUR_API_KEY_HERE":
-        params['key'] = GOOGLE_PSI_API_KEY
+    for strategy, future in futures.items():
+        try:
+            results[strategy] = future.result()
+        except Exception as e:
+            print(f"  [PageSpeed] {strategy} failed: {e}")
+            results['errors'][strategy] = str(e)
 
-    # Pre-emptive delay before request (helps with rate limiting)
-    time.sleep(1)
+    # Nieudana strategia nie ukrywa danych drugiej - jej błąd jest w errors[strategy]
+    results['success'] = any(results[strategy] for strategy in PSI_STRATEGIES)
+    if results['errors']:
+        results['error'] = '; '.join(f"{strategy}: {error}" for strategy, error in results['errors'].items())
 
-    response = requests.get(endpoint, params=params, timeout=PSI_TIMEOUT)
+    return results
 
-    # Exponential backoff retry for 429 (2 attempts: 5s, then 10s)
-    retry_delays = [5, 10]
-    for attempt, delay in enumerate(retry_delays, start=1):
-        if response.status_code == 429:
-            print(f"  [PageSpeed] Rate limit hit (429), attempt {attempt}/{len(retry_delays)}, waiting {delay}s...")
-            time.sleep(delay)
-            response = requests.get(endpoint, params=params, timeout=PSI_TIMEOUT)
-        else:
-            break  # Success or other error - exit retry loop
+def _pagespeed_strategy(url, strategy, credentials=None):
+    """Sparsowane dane PSI dla jednej strategii (z cache, jeśli świeże)"""
+    cache_key = f"{strategy}:{','.join(PSI_CATEGORIES)}:{normalize_url(url)}"
+    cached = psi_cache.get(cache_key)
+    if cached is not None:
+        print(f"  [PageSpeed] Cache hit: {strategy}")
+        return cached
 
-    # Lepszy error handling
-    if response.status_code == 403:
-        raise Exception("403 Forbidden - Sprawdź uprawnienia API key w Google Cloud Console. Kliknij na API key → Edit → API restrictions → USUŃ restrykcje lub dodaj PageSpeed Insights API do listy dozwolonych.")
+    parsed = parse_psi_data_full(fetch_psi_data_full(url, strategy, credentials))
+    psi_cache.set(cache_key, parsed)
+    return parsed
 
-    response.raise_for_status()
+def _request_psi(url, strategy, categories, credentials=None):
+    """
+    Zapytanie do PageSpeed Insights API w ramach kwoty klucza
 
-    return response.json()
+    - dzienny limit i limit zapytań na sekundę per klucz, wspólne dla workerów (rate_limiter.py);
+      zapytania ponad limit czekają w kolejce (maks. PSI_MAX_QUEUE_WAIT)
+    - 429/503: Retry-After (lub backoff z jitterem) wstrzymuje kubełek dla wszystkich audytów
 
-def fetch_psi_data_full(url, strategy='mobile'):
-    """Pobierz pełne dane z wszystkimi kategoriami Lighthouse"""
+    Raises:
+        PSIQuotaExceeded: wyczerpana dzienna kwota klucza
+        RateLimitTimeout: brak miejsca w kwocie w PSI_MAX_QUEUE_WAIT sekund
+    """
     endpoint = 'https://www.googleapis.com/pagespeedonline/v5/runPagespeed'
 
     params = {
         'url': url,
-        'strategy': strategy,
-        # TEMPORARY FIX: Only performance category to avoid 429
-        # TODO: Implement sequential fetching for all categories if this works
-        'category': 'performance'  # Was: ['performance', 'accessibility', 'best-practices', 'seo']
+        'strategy': strategy,  # mobile lub desktop
+        'category': categories  # lista = parametr powtórzony dla każdej kategorii
     }
 
-    # Dodaj API key tylko jeśli jest ustawiony
-    if GOOGLE_PSI_API_KEY and GOOGLE_PSI_API_KEY != "YOUR_API_KEY_HERE":
-        params['key'] = GOOGLE_PSI_API_KEY
+    # Dodaj API key tylko jeśli jest ustawiony (klucz audytu lub z config)
+    psi_key = resolve_credentials(credentials).psi_api_key
+    has_key = psi_key and psi_key != "YOUR_API_KEY_HERE"
+    if has_key:
+        params['key'] = psi_key
+
+    bucket = f"psi:{hashlib.sha256(psi_key.encode('utf-8')).hexdigest()[:16]}" if has_key else 'psi:anonymous'
 
-    # Pre-emptive delay before request (helps with rate limiting)
-    time.sleep(1)
+    for attempt in range(PSI_MAX_RETRIES + 1):
+        if not rate_limiter.consume_daily(bucket, PSI_DAILY_QUOTA):
+            raise PSIQuotaExceeded(f"Dzienny limit PageSpeed Insights ({PSI_DAILY_QUOTA} zapytań) wyczerpany - spróbuj jutro")
+        rate_limiter.acquire(bucket, rate=PSI_QUERIES_PER_SECOND, capacity=PSI_BURST,
+                             max_wait=PSI_MAX_QUEUE_WAIT, label='PageSpeed')
 
-    response = requests.get(endpoint, params=params, timeout=PSI_TIMEOUT)
+        # Sesja bez ponowień statusów - jedyną warstwą retry i liczenia kwoty jest ta pętla
+        response = api_get(endpoint, params=params, timeout=PSI_TIMEOUT)
 
-    # Exponential backoff retry for 429 (2 attempts: 5s, then 10s)
-    retry_delays = [5, 10]
-    for attempt, delay in enumerate(retry_delays, start=1):
-        if response.status_code == 429:
-            print(f"  [PageSpeed] Rate limit hit (429), attempt {attempt}/{len(retry_delays)}, waiting {delay}s...")
-            time.sleep(delay)
-            response = requests.get(endpoint, params=params, timeout=PSI_TIMEOUT)
-        else:
-            break  # Success or other error - exit retry loop
+        if response.status_code not in (429, 503) or attempt == PSI_MAX_RETRIES:
+            break
 
+        delay = backoff_delay(attempt, PSI_BACKOFF_BASE, PSI_BACKOFF_MAX,
+                              parse_retry_after(response.headers.get('Retry-After')))
+        print(f"  [PageSpeed] {response.status_code} ({strategy}), retry {attempt + 1}/{PSI_MAX_RETRIES} in {delay:.1f}s")
+        rate_limiter.pause(bucket, delay)
+
+    # Lepszy error handling
     if response.status_code == 403:
-        raise Exception("403 Forbidden - Sprawdź uprawnienia API key")
+        raise Exception("403 Forbidden - Sprawdź uprawnienia API key w Google Cloud Console. Kliknij na API key → Edit → API restrictions → USUŃ restrykcje lub dodaj PageSpeed Insights API do listy dozwolonych.")
 
     response.raise_for_status()
 
     return response.json()
 
+def fetch_psi_data(url, strategy='mobile', credentials=None):
+    """Pobierz dane z PageSpeed Insights API (tylko performance - legacy)"""
+    return _request_psi(url, strategy, ['performance'], credentials)
+
+def fetch_psi_data_full(url, strategy='mobile', credentials=None):
+    """Pobierz pełne dane z wszystkimi kategoriami Lighthouse (PSI_CATEGORIES) w jednym zapytaniu"""
+    return _request_psi(url, strategy, PSI_CATEGORIES, credentials)
+
 def parse_psi_data_full(data):
     """Parsuj pełne dane PSI ze wszystkimi kategoriami"""
     lighthouse = data.get('lighthouseResult', {})
@@ -187,10 +224,10 @@ def parse_psi_data_full(data):
     categories = lighthouse.get('categories', {})
 
     # All category scores
-    performance_score = int(categories.get('performance', {}).get('score', 0) * 100)
-    accessibility_score = int(categories.get('accessibility', {}).get('score', 0) * 100)
-    best_practices_score = int(categories.get('best-practices', {}).get('score', 0) * 100)
-    seo_score = int(categories.get('seo', {}).get('score', 0) * 100)
+    performance_score = int((categories.get('performance', {}).get('score') or 0) * 100)
+    accessibility_score = int((categories.get('accessibility', {}).get('score') or 0) * 100)
+    best_practices_score = int((categories.get('best-practices', {}).get('score') or 0) * 100)
+    seo_score = int((categories.get('seo', {}).get('score') or 0) * 100)
 
     # Core Web Vitals
     lcp_audit = audits.get('largest-contentful-paint', {})
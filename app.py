@@ -4,10 +4,12 @@ from flask_cors import CORS
 import json
 import datetime
 from urllib.parse import urlparse
-from audit_engine import run_audit
+from audit_engine import run_audit, run_crawl_audit, audit_key, crawl_key
+from credentials import Credentials
+import time
+from job_queue import get_job_queue, QueueFull
+from job_store import get_job_store, TERMINAL_EVENTS
 import os
-import queue
-import threading
 import hmac
 import hashlib
 import subprocess
@@ -27,7 +29,7 @@ def home():
 
 @app.route('/api/health', methods=['GET'])
 def health():
-    return jsonify({'status': 'healthy', 'service': 'SEO AIditor API'})
+    return jsonify({'status': 'healthy', 'service': 'SEO AIditor API', 'queue': get_job_queue().stats()})
 
 @app.route('/api/config', methods=['GET'])
 def get_config():
@@ -54,70 +56,222 @@ def get_config():
             'error': str(e)
         })
 
-@app.route('/api/audit', methods=['POST'])
-def audit():
+def _run_audit_job(progress_callback, url, gemini_key=None, psi_key=None, **options):
+    """
+    Funkcja joba: run_audit z kluczami API użytkownika (tryb produkcyjny)
+
+    Klucze trafiają do audytu jawnie (Credentials), a nie przez os.environ -
+    równoległe audyty w jednym procesie nie widzą nawzajem swoich kluczy.
+    W trybie lokalnym (gemini_key=None) używane są klucze z config.
+    """
+    return run_audit(url, progress_callback=progress_callback,
+                     credentials=_job_credentials(gemini_key, psi_key), **options)
+
+def _job_credentials(gemini_key=None, psi_key=None):
+    """Credentials joba - None gdy użytkownik nie podał kluczy (klucze z config)"""
+    if not gemini_key and not psi_key:
+        return None
+    return Credentials(gemini_key=gemini_key, psi_key=psi_key)
+
+def _submit_audit(data):
+    """
+    Zwaliduj żądanie audytu i dodaj je do kolejki
+
+    Returns:
+        Job
+
+    Raises:
+        ValueError: niepoprawne żądanie (HTTP 400)
+        QueueFull: kolejka pełna (HTTP 503)
+    """
+    import config
+
+    if not data or not data.get('url'):
+        raise ValueError('URL is required')
+
+    params = {
+        'url': data['url'],
+        'force_refresh': bool(data.get('force_refresh', False)),  # Pomiń cache wyników
+        'incremental': data.get('incremental')  # None = domyślny tryb z config
+    }
+    if 'multi_page' in data:
+        params['multi_page'] = data['multi_page']
+
+    # Production mode: Accept API keys from user
+    if config.REQUIRE_USER_API_KEYS:
+        if not data.get('gemini_key'):
+            raise ValueError('Gemini API key is required. Get your free key at https://aistudio.google.com/apikey')
+        params['gemini_key'] = data['gemini_key']
+        params['psi_key'] = data.get('psi_key', '')
+
+    # Single-flight: jednoczesne audyty tego samego URL w tym samym trybie (multi_page, incremental)
+    # i z tymi samymi kluczami API dzielą jeden job - inny użytkownik nie dostaje wyniku (ani błędu
+    # limitu) opłaconego cudzym kluczem. Klucz zawiera tylko hash kluczy API.
+    # force_refresh ma osobny klucz - nie dołącza do audytu, który może zwrócić wynik z cache.
+    credentials = _job_credentials(params.get('gemini_key'), params.get('psi_key'))
+    dedupe_key = audit_key(params['url'], params.get('multi_page'), params['incremental'], credentials)
+    if dedupe_key and params['force_refresh']:
+        dedupe_key += ':refresh'
+
+    return get_job_queue().submit(_run_audit_job, dedupe_key=dedupe_key, **params)
+
+def _submit_crawl(data):
+    """
+    Zwaliduj żądanie crawla całej strony i dodaj je do kolejki (ta sama pula co audyty)
+
+    Raises:
+        ValueError: niepoprawne żądanie (HTTP 400)
+        QueueFull: kolejka pełna (HTTP 503)
+    """
+    import config
+
+    if not data or not data.get('url'):
+        raise ValueError('URL is required')
+
     try:
-        import config
-        data = request.get_json()
-        url = data.get('url')
-
-        if not url:
-            return jsonify({'error': 'URL is required'}), 400
-
-        # Production mode: Accept API keys from user
-        if config.REQUIRE_USER_API_KEYS:
-            user_gemini_key = data.get('gemini_key')
-            user_psi_key = data.get('psi_key', '')
-
-            if not user_gemini_key:
-                return jsonify({
-                    'error': 'Gemini API key is required. Get your free key at https://aistudio.google.com/apikey'
-                }), 400
-
-            # Temporarily set environment variables for this request only
-            # Store original values for cleanup
-            original_gemini = os.environ.get('GEMINI_API_KEY')
-            original_psi = os.environ.get('GOOGLE_PSI_API_KEY')
-
-            try:
-                # Set user-provided keys
-                os.environ['GEMINI_API_KEY'] = user_gemini_key
-                os.environ['GOOGLE_PSI_API_KEY'] = user_psi_key
-
-                # Run the audit with user's keys
-                results = run_audit(url)
-
-            finally:
-                # Always restore original environment (cleanup)
-                if original_gemini is not None:
-                    os.environ['GEMINI_API_KEY'] = original_gemini
-                elif 'GEMINI_API_KEY' in os.environ:
-                    del os.environ['GEMINI_API_KEY']
-
-                if original_psi is not None:
-                    os.environ['GOOGLE_PSI_API_KEY'] = original_psi
-                elif 'GOOGLE_PSI_API_KEY' in os.environ:
-                    del os.environ['GOOGLE_PSI_API_KEY']
+        max_pages = int(data.get('max_pages') or config.CRAWL_MAX_PAGES)
+        max_depth = int(data.get('max_depth', config.CRAWL_MAX_DEPTH))
+    except (TypeError, ValueError):
+        raise ValueError('max_pages and max_depth must be integers')
+
+    params = {
+        'url': data['url'],
+        # Limity z config są górną granicą - użytkownik może tylko zmniejszyć crawl
+        'max_pages': max(1, min(max_pages, config.CRAWL_MAX_PAGES)),
+        'max_depth': max(0, min(max_depth, config.CRAWL_MAX_DEPTH)),
+        'incremental': data.get('incremental')
+    }
+    dedupe_key = crawl_key(params['url'], params['max_pages'], params['max_depth'], params['incremental'])
+    return get_job_queue().submit(run_crawl_audit, dedupe_key=dedupe_key, **params)
+
+def _job_response(job):
+    """Odpowiedź HTTP 202 dla przyjętego joba (status + linki do zdarzeń i wyniku)"""
+    data = job.to_dict()
+    data.update({
+        'position': get_job_queue().position(job),
+        'status_url': f'/api/jobs/{job.id}',
+        'events_url': f'/api/jobs/{job.id}/events',
+        'result_url': f'/api/jobs/{job.id}/result'
+    })
+    return jsonify(data), 202
+
+def _queue_full_response(error):
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after})
+    response.status_code = 503
+    if error.retry_after:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def _sse(event, event_id=None):
+    prefix = f"id: {event_id}\n" if event_id is not None else ''
+    return f"{prefix}data: {json.dumps(event)}\n\n"
+
+def _stream_job_events(job_id, last_event_id=0):
+    """
+    Generator SSE dla joba: numerowane zdarzenia queued/progress, a na końcu complete lub error.
 
+    Zdarzenia czytane są z JobStore, więc strumień można wznowić od Last-Event-ID
+    na dowolnym workerze. Jeśli audyt działa w tym procesie, czekamy na powiadomienie
+    joba; jeśli w innym - odpytujemy SQLite. Keepalive co sekundę, gdy nic się nie dzieje.
+    Gdy JobStore nie ma nowych zdarzeń lokalnego joba (np. zapis do SQLite się nie powiódł),
+    zdarzenia czytane są z pamięci joba - numeracja jest ta sama (pozycja w liście, od 1).
+    """
+    store = get_job_store()
+    last = last_event_id
+    while True:
+        events = _stored_events(store, job_id, last)
+        local_job = get_job_queue().get(job_id)
+        if not events and local_job:
+            events = list(enumerate(local_job.events[last:], start=last + 1))
+
+        for seq, event in events:
+            yield _sse(event, seq)
+            last = seq
+            if event.get('type') in TERMINAL_EVENTS:
+                return
+        if events:
+            continue
+
+        if local_job:
+            if local_job.wait_events(last, timeout=1):
+                continue
         else:
-            # Local mode: Use keys from config_local.py
-            results = run_audit(url)
+            job = store.get_job(job_id)
+            if job is None or (job['finished_at'] and not store.events(job_id, after=last)):
+                # Job wygasł lub jego zdarzenie końcowe zostało już wysłane
+                return
+            if not job['finished_at'] and not store.owner_alive(job_id):
+                yield _sse({'type': 'error', 'message': 'Audit worker stopped'})
+                return
+            time.sleep(1)
 
-        if 'error' in results:
-            return jsonify(results), 400
+        # No event yet, send keepalive (prevents timeout)
+        yield ": keepalive\n\n"
 
-        return jsonify(results), 200
+def _stored_events(store, job_id, after):
+    """Zdarzenia joba z JobStore (pusta lista, gdy odczyt się nie powiódł)"""
+    try:
+        return store.events(job_id, after=after)
+    except Exception as e:
+        print(f"[JOBS] Warning: job store events failed: {e}")
+        return []
 
+def _job_result(job_id):
+    """
+    Wynik zakończonego joba: z pamięci joba w tym procesie, inaczej z JobStore
+
+    Lokalny job ma wynik także wtedy, gdy zapis do JobStore się nie powiódł.
+    """
+    local_job = get_job_queue().get(job_id)
+    if local_job and local_job.result is not None:
+        return local_job.result
+    try:
+        return get_job_store().get_result(job_id)
     except Exception as e:
-        # Ensure cleanup even on exception
-        if config.REQUIRE_USER_API_KEYS:
-            if 'original_gemini' in locals() and original_gemini is not None:
-                os.environ['GEMINI_API_KEY'] = original_gemini
-            if 'original_psi' in locals() and original_psi is not None:
-                os.environ['GOOGLE_PSI_API_KEY'] = original_psi
+        print(f"[JOBS] Warning: job store result failed: {e}")
+        return None
+
+def _find_job(job_id):
+    """Status joba: lokalny (z pozycją w kolejce) lub z JobStore (job innego workera)"""
+    job = get_job_queue().get(job_id)
+    if job:
+        data = job.to_dict()
+        data['position'] = get_job_queue().position(job)
+        return data
+    return get_job_store().get_job(job_id)
+
+def _sse_response(generator):
+    # Return SSE response with correct headers
+    return Response(
+        generator,
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # Disable nginx buffering
+            'Connection': 'keep-alive'
+        }
+    )
 
+@app.route('/api/audit', methods=['POST'])
+def audit():
+    """Synchroniczny audyt - przechodzi przez tę samą ograniczoną kolejkę co audyty w tle"""
+    try:
+        job = _submit_audit(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except QueueFull as e:
+        return _queue_full_response(e)
+    except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+    job.wait()
+    if job.status == 'failed':
+        if isinstance(job.result, dict) and 'error' in job.result:
+            return jsonify(job.result), 400
+        return jsonify({'error': job.error}), 500
+
+    return jsonify(job.result), 200
+
 @app.route('/api/audit-stream', methods=['POST'])
 def audit_stream():
     """
@@ -127,9 +281,19 @@ def audit_stream():
     Instead of waiting 120+ seconds for a single response, it sends progress updates
     every few seconds, keeping the connection alive.
 
+    The audit runs as a job in the bounded queue (job_queue.py); while it waits,
+    'queued' events report its position. Events are numbered - after a dropped
+    connection the client resumes with GET /api/jobs/<job_id>/events and the
+    Last-Event-ID header (job_id is sent in the first event).
+
     SSE Format:
+        id: 1
+        data: {"type": "queued", "job_id": "...", "position": 2, "message": "Waiting in queue (position 2)..."}
+
+        id: 2
         data: {"type": "progress", "percent": 25, "message": "Crawling links..."}
 
+        id: 3
         data: {"type": "complete", "results": {...full audit data...}}
 
     Frontend usage:
@@ -139,192 +303,93 @@ def audit_stream():
     """
 
     # Parse request data OUTSIDE generator (to access Flask request context)
-    import config
+    try:
+        job = _submit_audit(request.get_json())
+    except QueueFull as e:
+        return _sse_response(iter([_sse({'type': 'error', 'message': str(e), 'retry_after': e.retry_after})]))
+    except Exception as e:
+        # Invalid JSON / missing URL / missing key - return error immediately
+        return _sse_response(iter([_sse({'type': 'error', 'message': str(e)})]))
 
+    return _sse_response(_stream_job_events(job.id))
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """
+    Dodaj audyt do kolejki i zwróć od razu id joba (HTTP 202)
+
+    Body: jak /api/audit (url, gemini_key, psi_key, force_refresh, incremental, multi_page)
+    """
     try:
-        data = request.get_json()
+        job = _submit_audit(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except QueueFull as e:
+        return _queue_full_response(e)
     except Exception as e:
-        # If JSON parsing fails, return error immediately
-        def error_gen():
-            yield f"data: {json.dumps({'type': 'error', 'message': f'Invalid JSON: {str(e)}'})}\n\n"
-        return Response(error_gen(), mimetype='text/event-stream')
+        return jsonify({'error': str(e)}), 500
 
-    url = data.get('url')
-    user_gemini_key = data.get('gemini_key') if config.REQUIRE_USER_API_KEYS else None
-    user_psi_key = data.get('psi_key', '') if config.REQUIRE_USER_API_KEYS else None
+    return _job_response(job)
 
-    def generate():
-        """Generator function that yields SSE events"""
+@app.route('/api/crawl', methods=['POST'])
+def create_crawl_job():
+    """
+    Crawl całej strony (run_crawl_audit) jako job w kolejce - zwraca id joba (HTTP 202)
 
-        try:
+    Body: url, max_pages, max_depth (opcjonalne, maks. wartości z config), incremental
 
-            if not url:
-                yield f"data: {json.dumps({'type': 'error', 'message': 'URL is required'})}\n\n"
-                return
+    Każda przeanalizowana strona jest wysyłana w zdarzeniu progress (details.page)
+    na /api/jobs/<job_id>/events; wynik końcowy zawiera agregaty i najsłabsze strony.
+    """
+    try:
+        job = _submit_crawl(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except QueueFull as e:
+        return _queue_full_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-            # Production mode: Accept API keys from user
-            if config.REQUIRE_USER_API_KEYS:
-                if not user_gemini_key:
-                    yield f"data: {json.dumps({'type': 'error', 'message': 'Gemini API key is required'})}\n\n"
-                    return
-
-                # Set user-provided keys
-                original_gemini = os.environ.get('GEMINI_API_KEY')
-                original_psi = os.environ.get('GOOGLE_PSI_API_KEY')
-
-                try:
-                    os.environ['GEMINI_API_KEY'] = user_gemini_key
-                    os.environ['GOOGLE_PSI_API_KEY'] = user_psi_key
-
-                    # Create a queue for progress events (thread-safe communication)
-                    progress_queue = queue.Queue()
-
-                    # Progress callback function - runs in audit thread
-                    def progress_callback(percent, message, details=None):
-                        """Called by audit_engine to report progress"""
-                        event_data = {
-                            'type': 'progress',
-                            'percent': percent,
-                            'message': message
-                        }
-                        if details:
-                            event_data['details'] = details
-
-                        # Put event in queue (thread-safe)
-                        progress_queue.put(event_data)
-
-                    # Run audit in separate thread (so we can yield events as they arrive)
-                    audit_result = {'data': None, 'error': None}
-
-                    def run_audit_thread():
-                        """Thread function to run audit"""
-                        try:
-                            result = run_audit(url, progress_callback=progress_callback)
-                            audit_result['data'] = result
-                        except Exception as e:
-                            audit_result['error'] = str(e)
-                        finally:
-                            # Signal completion
-                            progress_queue.put({'type': 'DONE'})
-
-                    # Start audit thread
-                    thread = threading.Thread(target=run_audit_thread)
-                    thread.start()
-
-                    # Initial progress event
-                    yield f"data: {json.dumps({'type': 'progress', 'percent': 0, 'message': 'Starting audit...'})}\n\n"
-
-                    # Yield progress events as they arrive in queue
-                    while True:
-                        try:
-                            # Wait for next event (with timeout to prevent hanging)
-                            event = progress_queue.get(timeout=1)
-
-                            if event.get('type') == 'DONE':
-                                # Audit finished
-                                break
-
-                            # Yield progress event
-                            yield f"data: {json.dumps(event)}\n\n"
-
-                        except queue.Empty:
-                            # No event yet, send keepalive (prevents timeout)
-                            yield f": keepalive\n\n"
-                            continue
-
-                    # Wait for thread to finish
-                    thread.join(timeout=10)
-
-                    # Get final results
-                    results = audit_result['data']
-                    error = audit_result['error']
-
-                    if error:
-                        yield f"data: {json.dumps({'type': 'error', 'message': error})}\n\n"
-                        return
-
-                    # Send final results
-                    if 'error' in results:
-                        yield f"data: {json.dumps({'type': 'error', 'message': results['error']})}\n\n"
-                    else:
-                        yield f"data: {json.dumps({'type': 'complete', 'results': results})}\n\n"
-
-                finally:
-                    # Cleanup environment
-                    if original_gemini is not None:
-                        os.environ['GEMINI_API_KEY'] = original_gemini
-                    elif 'GEMINI_API_KEY' in os.environ:
-                        del os.environ['GEMINI_API_KEY']
-
-                    if original_psi is not None:
-                        os.environ['GOOGLE_PSI_API_KEY'] = original_psi
-                    elif 'GOOGLE_PSI_API_KEY' in os.environ:
-                        del os.environ['GOOGLE_PSI_API_KEY']
-
-            else:
-                # Local mode - same threading pattern
-                progress_queue = queue.Queue()
-
-                def progress_callback(percent, message, details=None):
-                    event_data = {
-                        'type': 'progress',
-                        'percent': percent,
-                        'message': message
-                    }
-                    if details:
-                        event_data['details'] = details
-                    progress_queue.put(event_data)
-
-                audit_result = {'data': None, 'error': None}
-
-                def run_audit_thread():
-                    try:
-                        result = run_audit(url, progress_callback=progress_callback)
-                        audit_result['data'] = result
-                    except Exception as e:
-                        audit_result['error'] = str(e)
-                    finally:
-                        progress_queue.put({'type': 'DONE'})
-
-                thread = threading.Thread(target=run_audit_thread)
-                thread.start()
-
-                yield f"data: {json.dumps({'type': 'progress', 'percent': 0, 'message': 'Starting audit...'})}\n\n"
-
-                while True:
-                    try:
-                        event = progress_queue.get(timeout=1)
-                        if event.get('type') == 'DONE':
-                            break
-                        yield f"data: {json.dumps(event)}\n\n"
-                    except queue.Empty:
-                        yield f": keepalive\n\n"
-                        continue
-
-                thread.join(timeout=10)
-                results = audit_result['data']
-                error = audit_result['error']
-
-                if error:
-                    yield f"data: {json.dumps({'type': 'error', 'message': error})}\n\n"
-                elif 'error' in results:
-                    yield f"data: {json.dumps({'type': 'error', 'message': results['error']})}\n\n"
-                else:
-                    yield f"data: {json.dumps({'type': 'complete', 'results': results})}\n\n"
-
-        except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+    return _job_response(job)
 
-    # Return SSE response with correct headers
-    return Response(
-        generate(),
-        mimetype='text/event-stream',
-        headers={
-            'Cache-Control': 'no-cache',
-            'X-Accel-Buffering': 'no',  # Disable nginx buffering
-            'Connection': 'keep-alive'
-        }
-    )
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = _find_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job), 200
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = _find_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    if job['status'] not in ('completed', 'failed'):
+        return jsonify(job), 202
+
+    result = _job_result(job_id)
+    if job['status'] == 'failed':
+        return jsonify(result or {'error': job.get('error')}), 400 if result else 500
+    return jsonify(result), 200
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """
+    SSE ze zdarzeniami joba (ten sam format co /api/audit-stream)
+
+    Wznowienie: nagłówek Last-Event-ID (lub ?last_event_id=N) - wysyłane są tylko
+    zdarzenia o większym numerze, łącznie z wynikiem końcowym.
+    """
+    if not _find_job(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+    except ValueError:
+        return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+
+    return _sse_response(_stream_job_events(job_id, last_event_id))
 
 @app.route('/api/export/json', methods=['POST'])
 def export_json():
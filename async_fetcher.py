@@ -0,0 +1,222 @@
+# async_fetcher.py - Asynchroniczne pobieranie wielu stron (asyncio + aiohttp)
+import time
+import atexit
+import asyncio
+import threading
+from config import (
+    REQUEST_TIMEOUT, USER_AGENT,
+    FETCH_CONCURRENCY, FETCH_PER_HOST_LIMIT, FETCH_MAX_BODY_BYTES
+)
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Rozmiar fragmentu przy strumieniowym czytaniu body
+CHUNK_SIZE = 64 * 1024
+
+_loop = None
+_loop_lock = threading.Lock()
+_fetchers = {}
+_fetchers_lock = threading.Lock()
+
+
+def is_available():
+    """Czy silnik async jest dostępny (zainstalowany aiohttp)"""
+    return aiohttp is not None
+
+
+class AsyncFetcher:
+    """
+    Pobieranie stron na jednej pętli zdarzeń zamiast wątku na request.
+
+    - Globalny limit równoległych połączeń (concurrency) i limit per host
+    - Timeout per strona
+    - Body czytane strumieniowo i ucinane po max_body_bytes (ochrona pamięci)
+
+    Użycie:
+        async with AsyncFetcher() as fetcher:
+            page = await fetcher.fetch(url)
+
+        # Z kodu synchronicznego - sesja na współdzielonej pętli, żyje do close()
+        fetcher = AsyncFetcher().open()
+        future = fetcher.submit(url)  # concurrent.futures.Future
+        fetcher.close()
+    """
+
+    def __init__(self, concurrency=FETCH_CONCURRENCY, per_host=FETCH_PER_HOST_LIMIT,
+                 timeout=REQUEST_TIMEOUT, max_body_bytes=FETCH_MAX_BODY_BYTES):
+        if aiohttp is None:
+            raise ImportError("aiohttp not installed. Run: pip install aiohttp")
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_body_bytes = max_body_bytes
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers={'User-Agent': USER_AGENT},
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            cookie_jar=aiohttp.DummyCookieJar()
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        self.session = None
+
+    def open(self):
+        """Otwórz sesję na współdzielonej pętli (get_loop) - do użycia z kodu synchronicznego"""
+        if self.session is None:
+            run_coroutine(self.__aenter__())
+        return self
+
+    def close(self):
+        """Zamknij sesję otwartą przez open()"""
+        if self.session is not None:
+            run_coroutine(self.__aexit__(None, None, None))
+
+    def submit(self, url, **kwargs):
+        """
+        Zaplanuj fetch() na współdzielonej pętli (sesja z open())
+
+        Returns:
+            concurrent.futures.Future z wynikiem fetch()
+        """
+        return submit(self.fetch(url, **kwargs))
+
+    async def fetch(self, url, headers=None, delay=0, check_status=True, html_only=False):
+        """
+        Pobierz jedną stronę
+
+        Args:
+            url: URL
+            headers: Dodatkowe nagłówki (np. warunkowy GET)
+            delay: Odczekaj tyle sekund przed requestem (politeness crawlera)
+            check_status: Status >= 400 jako błąd; False = zwróć odpowiedź z każdym statusem
+            html_only: Nie czytaj body odpowiedzi innych niż 2xx text/html
+
+        Returns:
+            dict: ten sam kształt co site_crawler.fetch_selected_pages():
+                {'url', 'success', 'html', 'status_code', 'final_url', 'headers', 'content_type',
+                 'elapsed', 'truncated'}
+                lub {'url', 'success': False, 'error', 'html': ''}
+        """
+        if delay > 0:
+            await asyncio.sleep(delay)
+        started = time.monotonic()
+        try:
+            async with self.session.get(url, headers=headers) as response:
+                if check_status:
+                    response.raise_for_status()
+                content_type = response.headers.get('Content-Type', '')
+
+                body = bytearray()
+                truncated = False
+                read_body = not html_only or (200 <= response.status < 300 and 'html' in content_type.lower())
+                if read_body:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        body.extend(chunk)
+                        if len(body) >= self.max_body_bytes:
+                            del body[self.max_body_bytes:]
+                            truncated = True
+                            break
+
+                encoding = response.charset or 'utf-8'
+                try:
+                    html = body.decode(encoding, errors='replace')
+                except LookupError:
+                    html = body.decode('utf-8', errors='replace')
+
+                return {
+                    'url': url,
+                    'success': True,
+                    'html': html,
+                    'status_code': response.status,
+                    'final_url': str(response.url),
+                    'headers': dict(response.headers),
+                    'content_type': content_type,
+                    'elapsed': round(time.monotonic() - started, 3),
+                    'truncated': truncated
+                }
+        except asyncio.TimeoutError:
+            return {'url': url, 'success': False, 'error': 'Timeout', 'html': ''}
+        except Exception as e:
+            return {'url': url, 'success': False, 'error': str(e) or type(e).__name__, 'html': ''}
+
+    async def fetch_all(self, urls):
+        """Pobierz wszystkie URLe równolegle (w granicach limitów). Kolejność = kolejność urls."""
+        return await asyncio.gather(*(self.fetch(url) for url in urls))
+
+
+def get_loop():
+    """
+    Współdzielona pętla zdarzeń działająca w wątku w tle (tworzona leniwie, raz na proces)
+
+    Tworzenie przy pierwszym użyciu (a nie przy imporcie) sprawia, że każdy
+    worker gunicorna po forku ma własną pętlę - jak sesja w http_client.
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='async-fetcher-loop', daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def submit(coroutine):
+    """Zaplanuj coroutine na współdzielonej pętli. Returns: concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coroutine, get_loop())
+
+
+def run_coroutine(coroutine):
+    """
+    Uruchom coroutine z kodu synchronicznego i poczekaj na wynik
+
+    Coroutine działa na współdzielonej pętli (get_loop), więc wywołanie działa
+    także z wątku, w którym działa już inna pętla zdarzeń. Nie wywoływać z samej
+    pętli get_loop() - to zablokowałoby ją na zawsze.
+    """
+    return submit(coroutine).result()
+
+
+def get_fetcher(concurrency=FETCH_CONCURRENCY, per_host=FETCH_PER_HOST_LIMIT, timeout=REQUEST_TIMEOUT):
+    """Długo żyjący AsyncFetcher (jedna sesja i pula połączeń) dla danych limitów"""
+    key = (concurrency, per_host, timeout)
+    with _fetchers_lock:
+        fetcher = _fetchers.get(key)
+        if fetcher is None:
+            fetcher = _fetchers[key] = AsyncFetcher(concurrency=concurrency, per_host=per_host,
+                                                    timeout=timeout).open()
+    return fetcher
+
+
+@atexit.register
+def _close_fetchers():
+    """Zamknij długo żyjące sesje przy wyjściu procesu (pętla w wątku daemon jeszcze działa)"""
+    with _fetchers_lock:
+        fetchers = list(_fetchers.values())
+        _fetchers.clear()
+    for fetcher in fetchers:
+        try:
+            fetcher.close()
+        except Exception:
+            pass
+
+
+def fetch_pages(urls, timeout_per_page=REQUEST_TIMEOUT, concurrency=FETCH_CONCURRENCY,
+                per_host=FETCH_PER_HOST_LIMIT):
+    """
+    Synchroniczny wrapper: pobierz listę stron na współdzielonej pętli asyncio
+
+    Returns:
+        list: wyniki AsyncFetcher.fetch() w kolejności urls
+    """
+    fetcher = get_fetcher(concurrency=concurrency, per_host=per_host, timeout=timeout_per_page)
+    return run_coroutine(fetcher.fetch_all(urls))
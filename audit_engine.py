@@ -1,35 +1,110 @@
 # audit_engine.py
+import os
+import time
+import hashlib
+import heapq
 import datetime
-from utils import validate_url, fetch_url
+from collections import Counter
+from utils import validate_url, normalize_url
+from disk_cache import DiskCache
+from page_document import ParsedDocument
+from site_resources import SiteResources
+from page_store import PageStore
+from credentials import resolve_credentials
+from rate_limiter import report_waits
+from ai_engine import report_partial_sections
+from pipeline import Pipeline, Stage, StageFailed
 from analyzers.technical import analyze_technical
 from analyzers.onpage import analyze_onpage
 from analyzers.indexing import analyze_indexing
 from analyzers.content import analyze_content
-from analyzers.pagespeed import analyze_pagespeed, analyze_pagespeed_full
+from analyzers.pagespeed import analyze_pagespeed_full
 from analyzers.ai_content import analyze_ai_content, detect_page_language
 from analyzers.ai_action_plan import generate_ai_action_plan
-from config import WEIGHTS, ENABLE_AI_ANALYSIS, ENABLE_MULTI_PAGE_ANALYSIS, MAX_PAGES_TO_ANALYZE
+from config import (
+    WEIGHTS, ENABLE_AI_ANALYSIS, ENABLE_MULTI_PAGE_ANALYSIS, MAX_PAGES_TO_ANALYZE, PIPELINE_MAX_WORKERS,
+    CRAWL_MAX_PAGES, CRAWL_MAX_DEPTH, CRAWL_REPORT_PAGES,
+    CACHE_DIR, RESULT_CACHE_ENABLED, RESULT_CACHE_TTL, RESULT_CACHE_MAX_ENTRIES, INCREMENTAL_AUDITS
+)
+
+# Kategorie w stałej kolejności (wpływa na kolejność issues i eksport CSV)
+CATEGORY_STAGES = ['technical', 'onpage', 'indexing', 'content', 'ai_content']
+
+# Etapy multi-page - ich porażka oznacza fallback do single-page
+MULTI_PAGE_STAGES = ['internal_links', 'page_selection', 'fetch_pages', 'holistic']
+
+# Cache gotowych wyników audytu (współdzielony przez workery, TTL + LRU)
+result_cache = DiskCache(
+    os.path.join(CACHE_DIR, 'audit_results.sqlite'),
+    ttl=RESULT_CACHE_TTL,
+    max_entries=RESULT_CACHE_MAX_ENTRIES
+)
+
+def audit_key(url, multi_page=None, incremental=None, credentials=None):
+    """
+    Klucz audytu: tryb + tryb przyrostowy + zakres kluczy API + znormalizowany URL
+
+    Wspólny dla cache wyników i deduplikacji jednoczesnych audytów (job_queue) -
+    wynik (lub job) jest współdzielony tylko gdy wszystko, co wpływa na wynik, jest takie samo.
+
+    Returns:
+        str: np. 'single-page:full:3f2a...:https://example.com/' lub None dla niepoprawnego URL
+    """
+    url = validate_url(url)
+    if not url:
+        return None
+
+    enable_multi_page = multi_page if multi_page is not None else ENABLE_MULTI_PAGE_ANALYSIS
+    mode = 'multi-page' if enable_multi_page and ENABLE_AI_ANALYSIS else 'single-page'
+    run_incremental = INCREMENTAL_AUDITS if incremental is None else bool(incremental)
+    scope = resolve_credentials(credentials).scope()
+    return f"{mode}:{'incremental' if run_incremental else 'full'}:{scope}:{normalize_url(url)}"
 
-def run_audit(url, multi_page=None, progress_callback=None):
+def run_audit(url, multi_page=None, progress_callback=None, force_refresh=False, incremental=None,
+              credentials=None):
     """
     Uruchom pełny audyt SEO (single-page lub multi-page)
 
+    Etapy audytu są zadeklarowane jako DAG (pipeline.py) i uruchamiane równolegle,
+    gdy tylko ich zależności są gotowe. Postęp wynika z faktycznie zakończonych etapów.
+
     Args:
         url: Homepage URL
         multi_page: Enable multi-page analysis (None = use config default, True/False = override)
         progress_callback: Optional function(percent, message, details) for progress updates
+        force_refresh: Ignore cached result for this URL/mode and run the audit again
+        incremental: Conditional GET of the homepage and reuse of stage outputs whose
+                     inputs did not change since the previous audit (None = config default)
+        credentials: Credentials with the user's API keys (None = keys from config);
+                     passed explicitly to AI and PageSpeed stages, so concurrent audits
+                     in one process can use different keys
 
     Returns:
-        dict: Audit results (structure varies based on single/multi-page mode)
+        dict: Audit results (structure varies based on single/multi-page mode);
+              results served from cache contain 'cache': {'hit': True, 'cached_at', 'age'}
     """
 
+    last_percent = 0
+
     # Helper function to emit progress
     def emit_progress(percent, message, details=None):
         """Emit progress event if callback is provided"""
+        nonlocal last_percent
+        last_percent = percent
         print(f"[{percent}%] {message}")  # Console logging
         if progress_callback:
             progress_callback(percent, message, details)
 
+    def emit_rate_limit_wait(seconds, service):
+        """Czekanie na limit zapytań API (rate_limiter) widoczne w postępie audytu"""
+        emit_progress(last_percent, f"Waiting for {service} rate limit ({seconds:.0f}s)...",
+                      {'rate_limit_wait': round(seconds, 1), 'service': service})
+
+    def emit_partial_section(stage, section, value):
+        """Sekcja odpowiedzi AI gotowa w trakcie streamingu - wysyłana od razu (details.partial)"""
+        emit_progress(last_percent, f"AI {stage}: {section} ready",
+                      {'partial': {'stage': stage, 'section': section, 'value': value}})
+
     # Determine if multi-page is enabled
     enable_multi_page = multi_page if multi_page is not None else ENABLE_MULTI_PAGE_ANALYSIS
 
@@ -39,227 +114,544 @@ def run_audit(url, multi_page=None, progress_callback=None):
     if not url:
         return {'error': 'Invalid URL'}
 
-    # 2. Pobierz homepage
-    emit_progress(5, f"Fetching homepage: {url}")
-    print(f"Fetching {url}...")
-    page_data = fetch_url(url)
-
-    if not page_data['success']:
+    run_multi_page = enable_multi_page and ENABLE_AI_ANALYSIS
+    if not enable_multi_page:
+        print("  Multi-page analysis disabled in config")
+    elif not ENABLE_AI_ANALYSIS:
+        print("  AI analysis disabled (required for multi-page)")
+
+    # Cache wyników - klucz: znormalizowany URL + tryb audytu + zakres kluczy API (jak deduplikacja jobów)
+    cache_key = audit_key(url, multi_page, incremental, credentials)
+    if RESULT_CACHE_ENABLED and not force_refresh:
+        cached = _get_cached_result(cache_key)
+        if cached:
+            emit_progress(100, "Audit loaded from cache", {'cache': cached['cache']})
+            return cached
+
+    # 2. Zbuduj i uruchom DAG etapów
+    stages = homepage_stages() + page_analysis_stages()
+    if run_multi_page:
+        stages += multi_page_stages()
+
+    run_incremental = INCREMENTAL_AUDITS if incremental is None else incremental
+    page_store = PageStore() if run_incremental else None
+
+    print(f"Running audit pipeline ({len(stages)} stages{', incremental' if run_incremental else ''})...")
+    # robots.txt, sitemapy i homepage pobierane raz i współdzielone przez wszystkie etapy
+    with report_waits(emit_rate_limit_wait), report_partial_sections(emit_partial_section):
+        pipeline_result = Pipeline(stages, max_workers=PIPELINE_MAX_WORKERS).run(
+            initial={
+                'url': url,
+                # Pełne podsumowanie sitemap index tylko w multi-page (pobieżne w single-page)
+                'site': SiteResources(url, page_store=page_store, full_sitemap=run_multi_page),
+                'credentials': resolve_credentials(credentials)
+            },
+            progress_callback=emit_progress,
+            progress_range=(5, 95),
+            memo=page_store.memo if page_store else None
+        )
+
+    if page_store and pipeline_result.ok('page_data', 'document'):
+        _remember_page(page_store, url, pipeline_result.values['page_data'], pipeline_result.values['document'])
+
+    if 'fetch' in pipeline_result.errors:
         return {
             'error': 'Cannot fetch page',
-            'details': page_data.get('error')
+            'details': str(pipeline_result.errors['fetch'])
         }
 
-    html_content = page_data['content']
+    if not pipeline_result.ok('homepage_results'):
+        # Błąd w analyzerze homepage - propaguj jak wcześniej
+        raise _root_error(pipeline_result, stages)
 
-    # Detect language early
-    emit_progress(10, "Detecting page language...")
-    detected_language = detect_page_language(html_content)
-    print(f"  - Detected language: {detected_language}")
+    homepage_results = pipeline_result.values['homepage_results']
+    homepage_results['ai_action_plan'] = pipeline_result.values['ai_action_plan']
+    homepage_results['stage_timings'] = pipeline_result.timings
+    if run_incremental:
+        homepage_results['incremental'] = _incremental_summary(pipeline_result)
 
-    # 3. Run standard single-page audit on homepage
-    emit_progress(15, "Analyzing homepage (technical, on-page, content)...")
-    print("Running homepage analyzers...")
-    homepage_results = run_single_page_audit(url, page_data, html_content, detected_language)
-
-    # 4. If multi-page is enabled, run STAGE 1 & 2
-    if enable_multi_page and ENABLE_AI_ANALYSIS:
-        print("\n=== MULTI-PAGE ANALYSIS ===")
-
-        try:
-            from site_crawler import crawl_homepage, fetch_selected_pages
-            from analyzers.ai_site_structure import detect_site_type_and_select_pages
-            from analyzers.ai_multi_page import analyze_site_holistically
-
-            # STAGE 1: Crawl homepage & AI selects pages
-            emit_progress(35, "Crawling homepage for internal links...")
-            print("[STAGE 1] Crawling homepage and detecting site type...")
-            crawl_result = crawl_homepage(url)
-
-            if not crawl_result['success']:
-                print(f"  Warning: Crawling failed: {crawl_result['error']}")
-                print("  Falling back to single-page audit")
-                return homepage_results
-
-            available_links = crawl_result['links']
-            print(f"  - Found {len(available_links)} internal links")
-            emit_progress(40, f"Found {len(available_links)} internal links")
-
-            # AI detects site type and selects pages
-            emit_progress(45, "AI analyzing site type and selecting pages...")
-            print("[STAGE 1] AI selecting representative pages...")
-            selection_result = detect_site_type_and_select_pages(
-                url=url,
-                html_content=html_content,
-                available_links=available_links,
-                language=detected_language
-            )
-
-            if not selection_result['success']:
-                print(f"  Warning: Page selection failed: {selection_result['error']}")
-                print("  Falling back to single-page audit")
-                return homepage_results
-
-            site_type = selection_result['site_type']
-            selected_pages = selection_result['selected_pages'][:MAX_PAGES_TO_ANALYZE - 1]  # -1 for homepage
-
-            print(f"  - Site type: {site_type} (confidence: {selection_result.get('site_type_confidence', 0)}%)")
-            print(f"  - Selected {len(selected_pages)} additional pages")
-            emit_progress(55, f"Site type: {site_type}. Selected {len(selected_pages)} pages to analyze")
-
-            # STAGE 1.5: Fetch selected pages in parallel
-            emit_progress(60, f"Fetching {len(selected_pages)} selected pages...")
-            print("[STAGE 1.5] Fetching selected pages in parallel...")
-            urls_to_fetch = [page['url'] for page in selected_pages]
-            fetched_pages = fetch_selected_pages(urls_to_fetch, timeout_per_page=10)
-
-            successful_pages = [p for p in fetched_pages if p['success']]
-            print(f"  - Successfully fetched {len(successful_pages)}/{len(fetched_pages)} pages")
-            emit_progress(70, f"Fetched {len(successful_pages)}/{len(fetched_pages)} pages successfully")
-
-            # Merge page data with selection metadata
-            pages_for_analysis = []
-            for fetched in successful_pages:
-                # Find matching selection data
-                selection_data = next((p for p in selected_pages if p['url'] == fetched['url']), {})
-                pages_for_analysis.append({
-                    'url': fetched['url'],
-                    'html': fetched['html'],
-                    'page_type': selection_data.get('page_type', 'unknown'),
-                    'selection_reason': selection_data.get('selection_reason', 'N/A'),
-                    'expected_insights': selection_data.get('expected_insights', 'N/A')
-                })
-
-            # STAGE 2: Holistic AI analysis
-            emit_progress(75, f"Running AI holistic analysis on {len(pages_for_analysis) + 1} pages (30-60s)...")
-            print(f"[STAGE 2] AI holistic analysis of {len(pages_for_analysis) + 1} pages (this may take 30-40s)...")
-            holistic_result = analyze_site_holistically(
-                homepage_url=url,
-                pages_data=pages_for_analysis,
-                site_type=site_type,
-                language=detected_language
-            )
-
-            if not holistic_result['success']:
-                print(f"  Warning: Holistic analysis failed: {holistic_result['error']}")
-                print("  Falling back to single-page audit")
-                return homepage_results
-
-            print(f"  - Holistic score: {holistic_result.get('holistic_score', 0)}/100")
-            print(f"  - Template insights: {len(holistic_result.get('template_insights', []))}")
-            print(f"  - Scalable recommendations: {len(holistic_result.get('scalable_recommendations', []))}")
-            emit_progress(90, f"AI analysis complete. Building final results...")
-
-            # 5. Build multi-page response
-            multi_page_results = {
-                'audit_type': 'multi-page',
-                'url': url,
-                'timestamp': datetime.datetime.now().isoformat(),
-                'language': detected_language,
-                'site_type': site_type,
-                'site_type_confidence': selection_result.get('site_type_confidence', 0),
-                'site_characteristics': selection_result.get('site_characteristics', {}),
-                'pages_analyzed': len(pages_for_analysis) + 1,  # +1 for homepage
-
-                # Homepage full audit
-                'homepage': homepage_results,
-
-                # Additional pages (AI insights only, no technical crawl)
-                'additional_pages': [
-                    {
-                        'url': page['url'],
-                        'page_type': page['page_type'],
-                        'selection_reason': page['selection_reason'],
-                        'expected_insights': page['expected_insights']
-                    }
-                    for page in pages_for_analysis
-                ],
-
-                # Site-wide holistic analysis
-                'site_wide_analysis': holistic_result,
-
-                # Overall scores
-                'final_score': homepage_results['final_score'],  # Keep homepage score as primary
-                'holistic_score': holistic_result.get('holistic_score', 0),
-                'grade': homepage_results['grade']
+    if not run_multi_page:
+        _store_result(cache_key, homepage_results, pipeline_result)
+        emit_progress(100, "Single-page audit complete!")
+        return homepage_results
+
+    if not pipeline_result.ok('holistic_result'):
+        failed = [name for name in MULTI_PAGE_STAGES if name in pipeline_result.errors]
+        print(f"  Warning: Multi-page analysis failed at stage: {', '.join(failed) or 'unknown'}")
+        print("  Falling back to single-page audit")
+        emit_progress(100, "Audit complete (fallback to single-page)")
+        return homepage_results
+
+    # 3. Build multi-page response
+    values = pipeline_result.values
+    selection_result = values['selection_result']
+    pages_for_analysis = values['pages_for_analysis']
+    holistic_result = values['holistic_result']
+
+    multi_page_results = {
+        'audit_type': 'multi-page',
+        'url': url,
+        'timestamp': datetime.datetime.now().isoformat(),
+        'language': values['detected_language'],
+        'site_type': selection_result['site_type'],
+        'site_type_confidence': selection_result.get('site_type_confidence', 0),
+        'site_characteristics': selection_result.get('site_characteristics', {}),
+        'pages_analyzed': len(pages_for_analysis) + 1,  # +1 for homepage
+
+        # Homepage full audit
+        'homepage': homepage_results,
+
+        # Additional pages (AI insights only, no technical crawl)
+        'additional_pages': [
+            {
+                'url': page['url'],
+                'page_type': page['page_type'],
+                'selection_reason': page['selection_reason'],
+                'expected_insights': page['expected_insights']
             }
+            for page in pages_for_analysis
+        ],
 
-            emit_progress(100, "Multi-page audit complete!")
-            print("\n=== MULTI-PAGE AUDIT COMPLETE ===")
-            return multi_page_results
+        # Site-wide holistic analysis
+        'site_wide_analysis': holistic_result,
 
-        except Exception as e:
-            print(f"  ERROR in multi-page analysis: {e}")
-            print(f"  Falling back to single-page audit")
-            import traceback
-            traceback.print_exc()
-            emit_progress(100, "Audit complete (fallback to single-page)")
-            return homepage_results
+        # Overall scores
+        'final_score': homepage_results['final_score'],  # Keep homepage score as primary
+        'holistic_score': holistic_result.get('holistic_score', 0),
+        'grade': homepage_results['grade'],
+        'stage_timings': pipeline_result.timings
+    }
+    if run_incremental:
+        multi_page_results['incremental'] = homepage_results['incremental']
 
-    else:
-        # Single-page mode
-        if not enable_multi_page:
-            print("  Multi-page analysis disabled in config")
-        if not ENABLE_AI_ANALYSIS:
-            print("  AI analysis disabled (required for multi-page)")
+    _store_result(cache_key, multi_page_results, pipeline_result)
+    emit_progress(100, "Multi-page audit complete!")
+    print("\n=== MULTI-PAGE AUDIT COMPLETE ===")
+    return multi_page_results
 
-        emit_progress(100, "Single-page audit complete!")
-        return homepage_results
 
+def _root_error(pipeline_result, stages):
+    """
+    Pierwotny błąd pipeline: błąd etapu najwcześniejszego w kolejności deklaracji
+
+    Etapy są deklarowane w kolejności zależności (fetch -> parse -> analyzery),
+    więc wynik nie zależy od tego, który etap równoległy zakończył się pierwszy.
+    """
+    for stage in stages:
+        if stage.name in pipeline_result.errors:
+            return pipeline_result.errors[stage.name]
+    return StageFailed(f"Pipeline incomplete: {pipeline_result.skipped}")
 
-def run_single_page_audit(url, page_data, html_content, detected_language='en'):
-    """Run standard single-page audit"""
+
+def _remember_page(page_store, url, page_data, document):
+    """Zapisz stan strony dla kolejnego audytu przyrostowego"""
+    stored_page = {key: value for key, value in page_data.items() if key != 'not_modified'}
+    page_store.save(url, page_data.get('headers'), document.content_hash, page_data=stored_page)
+
+
+def _incremental_summary(pipeline_result):
+    """Co audyt przyrostowy faktycznie pominął"""
+    return {
+        'not_modified': bool(pipeline_result.values.get('page_data', {}).get('not_modified')),
+        'reused_stages': sorted(pipeline_result.reused)
+    }
+
+
+def _html_fingerprint(url, document):
+    """Fingerprint wejść lokalnych analyzerów: URL + dokładny HTML (analyzery czytają cały dokument)"""
+    return hashlib.sha256(f"{url}\n{document.html}".encode('utf-8')).hexdigest()
+
+
+def _get_cached_result(cache_key):
+    """Wynik z cache z metadanymi 'cache' (lub None)"""
+    try:
+        entry = result_cache.get_entry(cache_key)
+    except Exception as e:
+        print(f"[CACHE] Warning: read failed: {e}")
+        return None
+    if not entry:
+        return None
+
+    results = entry['value']
+    results['cache'] = {
+        'hit': True,
+        'cached_at': datetime.datetime.fromtimestamp(entry['created_at']).isoformat(),
+        'age': int(time.time() - entry['created_at'])
+    }
+    print(f"[CACHE] Hit: {cache_key} (age {results['cache']['age']}s)")
+    return results
+
+
+def _store_result(cache_key, results, pipeline_result=None):
+    """
+    Zapisz wynik audytu - tylko w pełni udany
+
+    Wynik z błędem któregokolwiek etapu (np. limit API, chwilowy błąd PSI/Gemini)
+    nie trafia do cache - kolejny audyt uruchomi te etapy ponownie zamiast
+    serwować zdegradowany wynik przez RESULT_CACHE_TTL.
+    """
+    if not RESULT_CACHE_ENABLED or 'error' in results:
+        return
+    failed = _degraded_stages(results, pipeline_result)
+    if failed:
+        print(f"[CACHE] Not caching {cache_key}: incomplete stages ({', '.join(failed)})")
+        return
+    result_cache.set(cache_key, results)
+
+
+def _degraded_stages(results, pipeline_result=None):
+    """Etapy, które zakończyły się błędem lub zwróciły wynik zastępczy (lista nazw)"""
+    failed = sorted(pipeline_result.errors) if pipeline_result else []
+    homepage = results.get('homepage', results)
+
+    ai_content = homepage.get('categories', {}).get('ai_content', {})
+    insights = ai_content.get('insights') or {}
+    if 'error' in ai_content or any(key in insights for key in ('ai_error', 'analysis_error', 'ai_unavailable')):
+        failed.append('ai_content')
+
+    pagespeed_full = homepage.get('pagespeed_full')
+    if pagespeed_full is not None and (not pagespeed_full.get('success') or pagespeed_full.get('errors')):
+        failed.append('pagespeed_full')
+
+    action_plan = homepage.get('ai_action_plan') or {}
+    if 'error' in action_plan:
+        failed.append('ai_action_plan')
+
+    site_wide = results.get('site_wide_analysis')
+    if site_wide is not None and not site_wide.get('success', True):
+        failed.append('holistic')
+    return failed
+
+
+def run_single_page_audit(url, page_data, document, detected_language='en',
+                          progress_callback=None, progress_range=(15, 35), site=None, credentials=None):
+    """
+    Run standard single-page audit on an already fetched & parsed page
+
+    Args:
+        url: Page URL
+        page_data: Result of fetch_url()
+        document: ParsedDocument built once from page_data['content']
+        detected_language: Page language code
+        progress_callback: Optional function(percent, message, details) called as stages complete
+        progress_range: (start, end) percent span reported for this audit's stages
+        site: SiteResources shared with other audits of the same site (robots.txt, sitemaps)
+        credentials: Credentials with the audit's API keys (None = keys from config)
+    """
+    stages = page_analysis_stages()
+    pipeline_result = Pipeline(stages, max_workers=PIPELINE_MAX_WORKERS).run(
+        initial={
+            'url': url,
+            'page_data': page_data,
+            'document': document,
+            'detected_language': detected_language,
+            'site': site or SiteResources(url),
+            'credentials': resolve_credentials(credentials)
+        },
+        progress_callback=progress_callback,
+        progress_range=progress_range
+    )
+
+    if not pipeline_result.ok('homepage_results'):
+        raise _root_error(pipeline_result, stages)
+
+    results = pipeline_result.values['homepage_results']
+    results['ai_action_plan'] = pipeline_result.values['ai_action_plan']
+    return results
+
+
+def run_crawl_audit(url, max_pages=CRAWL_MAX_PAGES, max_depth=CRAWL_MAX_DEPTH, progress_callback=None,
+                    incremental=None):
+    """
+    Full-site crawl audit: BFS over the whole site, every page analyzed as it arrives
+
+    Only local analyzers (technical, on-page, content) run per page - no AI,
+    no PageSpeed. Pages are not kept in memory: each one is reduced to a small
+    summary right after analysis, sent in the progress event (details.page)
+    and folded into running aggregates; the result keeps only the
+    CRAWL_REPORT_PAGES weakest and failed pages.
+
+    Args:
+        url: Homepage URL
+        max_pages: Max pages to crawl
+        max_depth: Max link depth from homepage
+        progress_callback: Optional function(percent, message, details)
+        incremental: Conditional GET per page; pages unchanged since the previous
+                     crawl (304) reuse their stored summary (None = config default)
+
+    Returns:
+        dict: {
+            'audit_type': 'crawl',
+            'url': str,
+            'timestamp': str (ISO),
+            'pages_crawled': int,
+            'pages_analyzed': int,
+            'pages_unchanged': int (pages reused from the previous crawl),
+            'pages_failed': int,
+            'average_scores': {analyzer: float},
+            'failing_checks': [(check, count), ...],
+            'worst_pages': [lowest-scoring page summaries, worst first],
+            'failed_pages': [{'url', 'status_code', 'error'}, ...]
+        }
+    """
+    from site_crawler import crawl_site
+
+    def emit_progress(percent, message, details=None):
+        print(f"[{percent}%] {message}")
+        if progress_callback:
+            progress_callback(percent, message, details)
+
+    emit_progress(0, "Validating URL...")
+    url = validate_url(url)
+    if not url:
+        return {'error': 'Invalid URL'}
+
+    emit_progress(1, f"Crawling site (max {max_pages} pages, depth {max_depth})...")
+
+    run_incremental = INCREMENTAL_AUDITS if incremental is None else incremental
+    page_store = PageStore() if run_incremental else None
+
+    homepage = None
+    crawled = 0
+    score_sums = Counter()
+    failing_checks = Counter()
+    analyzed = 0
+    unchanged = 0
+    worst_pages = []  # kopiec (-średni score, nr strony, podsumowanie) - CRAWL_REPORT_PAGES najsłabszych
+    failed_pages = []
+
+    site = SiteResources(url, full_sitemap=True)
+    for page in crawl_site(url, max_pages=max_pages, max_depth=max_depth, site=site, page_store=page_store):
+        summary = analyze_crawled_page(page, page_store)
+        crawled += 1
+        if homepage is None:
+            homepage = summary
+        if summary.get('reused'):
+            unchanged += 1
+
+        if summary['success']:
+            analyzed += 1
+            score_sums.update(summary['scores'])
+            failing_checks.update(summary['failing_checks'])
+            scores = summary['scores'].values()
+            entry = (-sum(scores) / max(len(scores), 1), crawled, summary)
+            if len(worst_pages) < CRAWL_REPORT_PAGES:
+                heapq.heappush(worst_pages, entry)
+            elif entry > worst_pages[0]:
+                heapq.heapreplace(worst_pages, entry)
+        elif len(failed_pages) < CRAWL_REPORT_PAGES:
+            failed_pages.append({key: summary.get(key) for key in ('url', 'status_code', 'error')})
+
+        percent = min(99, 1 + int(98 * crawled / max_pages))
+        emit_progress(percent, f"Crawled {crawled} pages: {page['url']}",
+                      {'url': page['url'], 'depth': page['depth'], 'success': summary['success'],
+                       'page': summary})
+
+    if homepage is None or not homepage['success']:
+        return {
+            'error': 'Cannot fetch page',
+            'details': homepage.get('error') if homepage else 'No pages crawled'
+        }
 
     results = {
-        'audit_type': 'single-page',
+        'audit_type': 'crawl',
         'url': url,
         'timestamp': datetime.datetime.now().isoformat(),
-        'language': detected_language,
-        'categories': {}
+        'pages_crawled': crawled,
+        'pages_analyzed': analyzed,
+        'pages_unchanged': unchanged,
+        'pages_failed': crawled - analyzed,
+        'average_scores': {name: round(total / analyzed, 1) for name, total in score_sums.items()},
+        'failing_checks': failing_checks.most_common(),
+        'worst_pages': [summary for _, _, summary in sorted(worst_pages, reverse=True)],
+        'failed_pages': failed_pages
+    }
+
+    emit_progress(100, f"Crawl audit complete! ({crawled} pages)")
+    return results
+
+
+def crawl_key(url, max_pages, max_depth, incremental=None):
+    """Klucz deduplikacji crawla (job_queue): limity + tryb przyrostowy + znormalizowany URL"""
+    url = validate_url(url)
+    if not url:
+        return None
+    run_incremental = INCREMENTAL_AUDITS if incremental is None else bool(incremental)
+    return f"crawl:{max_pages}:{max_depth}:{'incremental' if run_incremental else 'full'}:{normalize_url(url)}"
+
+
+def analyze_crawled_page(page, page_store=None):
+    """
+    Run local analyzers on one crawled page and reduce it to a compact summary
+
+    Args:
+        page: Page yielded by site_crawler.crawl_site()
+        page_store: PageStore (incremental crawl) - 304 pages reuse the stored summary,
+                    analyzed pages are stored for the next crawl
+    """
+    if page.get('not_modified'):
+        summary = dict(page['record']['summary'])
+        summary.update({'url': page['url'], 'depth': page['depth'], 'reused': True})
+        return summary
+
+    summary = {
+        'url': page['url'],
+        'depth': page['depth'],
+        'status_code': page.get('status_code'),
+        'success': page['success']
+    }
+    if not page['success']:
+        summary['error'] = page.get('error')
+        return summary
+
+    document = page['document']
+    page_data = {
+        'success': True,
+        'status_code': page['status_code'],
+        'content': page['html'],
+        'headers': page.get('headers', {}),
+        'url': page.get('final_url', page['url']),
+        'elapsed': page.get('elapsed', 0)
+    }
+
+    categories = {
+        'technical': analyze_technical(page['url'], page_data),
+        'onpage': analyze_onpage(page['url'], document),
+        'content': analyze_content(document)
     }
 
-    # Technical
-    print("  - Technical analysis...")
-    results['categories']['technical'] = analyze_technical(url, page_data)
+    summary.update({
+        'title': (document.title or '').strip()[:120],
+        'scores': {name: round(data['score'], 1) for name, data in categories.items()},
+        'issues_count': sum(len(data['issues']) for data in categories.values()),
+        'failing_checks': [
+            f"{name}.{check}"
+            for name, data in categories.items()
+            for check, result in data['checks'].items()
+            if not result.get('pass', True)
+        ]
+    })
+
+    if page_store:
+        page_store.save(page['url'], page.get('headers'), document.content_hash, summary=summary,
+                        links=document.links, final_url=page.get('final_url'))
+    return summary
+
+
+# ========================================
+# STAGE DEFINITIONS
+# ========================================
+
+def homepage_stages():
+    """Fetch -> parse -> language detection"""
+    return [
+        Stage('fetch', _fetch_stage, inputs=['site'], outputs=['page_data'],
+              label="Fetching homepage", weight=5),
+        Stage('parse', lambda url, page_data: ParsedDocument(page_data['content'], url),
+              inputs=['url', 'page_data'], outputs=['document'],
+              label="Parsing HTML", weight=2),
+        Stage('language', _language_stage, inputs=['document'], outputs=['detected_language'],
+              label="Detecting page language", weight=1,
+              fingerprint=lambda document: _html_fingerprint('', document))
+    ]
+
+
+def page_analysis_stages():
+    """
+    Analyzers of a single page + scoring + AI Action Plan.
+    Independent analyzers run concurrently; only scoring and the action plan wait for them.
+    """
+    return [
+        Stage('technical', lambda url, page_data: analyze_technical(url, page_data),
+              inputs=['url', 'page_data'], label="Technical analysis", weight=1),
+        Stage('onpage', lambda url, document: analyze_onpage(url, document),
+              inputs=['url', 'document'], label="On-page analysis", weight=1,
+              fingerprint=_html_fingerprint),
+        Stage('indexing', lambda url, document, site: analyze_indexing(url, document, site),
+              inputs=['url', 'document', 'site'], label="Indexing analysis (robots.txt, sitemap.xml)", weight=3),
+        Stage('content', lambda document: analyze_content(document),
+              inputs=['document'], label="Content analysis", weight=1,
+              fingerprint=lambda document: _html_fingerprint('', document)),
+        # page_data: PSI startuje dopiero po udanym pobraniu strony - nieosiągalny URL nie zużywa limitu PSI
+        Stage('pagespeed_full', lambda url, page_data, credentials: _pagespeed_stage(url, credentials),
+              inputs=['url', 'page_data', 'credentials'],
+              label="PageSpeed analysis (mobile + desktop)", weight=8),
+        Stage('ai_content', _ai_content_stage, inputs=['url', 'document', 'credentials'],
+              label="AI Content Quality analysis (Gemini)", weight=15),
+        Stage('homepage_results', _page_results_stage,
+              inputs=['url', 'detected_language', 'pagespeed_full'] + CATEGORY_STAGES,
+              label="Calculating scores", weight=1),
+        Stage('ai_action_plan', _action_plan_stage, inputs=['url', 'homepage_results', 'credentials'],
+              label="Generating AI Action Plan", weight=12)
+    ]
+
+
+def multi_page_stages():
+    """STAGE 1 (page selection) & STAGE 2 (holistic AI analysis)"""
+    return [
+        Stage('internal_links', _internal_links_stage, inputs=['url', 'document'],
+              outputs=['available_links'], label="Extracting internal links from homepage", weight=1),
+        Stage('page_selection', _page_selection_stage,
+              inputs=['url', 'document', 'available_links', 'detected_language', 'credentials'],
+              outputs=['selection_result'], label="AI analyzing site type and selecting pages", weight=12),
+        Stage('fetch_pages', _fetch_pages_stage, inputs=['selection_result'],
+              outputs=['pages_for_analysis'], label="Fetching selected pages", weight=6),
+        Stage('holistic', _holistic_stage,
+              inputs=['url', 'document', 'pages_for_analysis', 'selection_result', 'detected_language', 'credentials'],
+              outputs=['holistic_result'], label="Running AI holistic analysis (30-60s)", weight=30)
+    ]
+
+
+def _fetch_stage(site):
+    print(f"Fetching {site.url}...")
+    page_data = site.homepage()
+    if not page_data['success']:
+        raise StageFailed(page_data.get('error'))
+    return page_data
 
-    # On-Page
-    print("  - On-page analysis...")
-    results['categories']['onpage'] = analyze_onpage(url, html_content)
 
-    # Indexing
-    print("  - Indexing analysis...")
-    results['categories']['indexing'] = analyze_indexing(url, html_content)
+def _language_stage(document):
+    detected_language = detect_page_language(document)
+    print(f"  - Detected language: {detected_language}")
+    return detected_language
 
-    # Content
-    print("  - Content analysis...")
-    results['categories']['content'] = analyze_content(html_content)
 
-    # PageSpeed (może zająć chwilę)
+def _pagespeed_stage(url, credentials):
     # PageSpeed Full (desktop + mobile + all categories) - dla zakładki Performance
     # Note: Removed old pagespeed category - now using pagespeed_full with dedicated Performance tab
-    print("  - PageSpeed Full analysis (mobile + desktop + all Lighthouse categories)...")
     try:
-        results['pagespeed_full'] = analyze_pagespeed_full(url)
-        if results['pagespeed_full']['success']:
-            mobile_perf = results['pagespeed_full']['mobile']['scores']['performance']
-            desktop_perf = results['pagespeed_full']['desktop']['scores']['performance']
-            print(f"    Mobile: {mobile_perf}/100, Desktop: {desktop_perf}/100")
+        pagespeed_full = analyze_pagespeed_full(url, credentials)
+        for strategy in ('mobile', 'desktop'):
+            if pagespeed_full[strategy]:
+                print(f"    {strategy.capitalize()}: {pagespeed_full[strategy]['scores']['performance']}/100")
+        return pagespeed_full
     except Exception as e:
         print(f"    Warning: PageSpeed Full failed: {e}")
-        results['pagespeed_full'] = {'success': False, 'error': str(e)}
-
-    # AI Content Analysis (optional, może zająć chwilę)
-    if ENABLE_AI_ANALYSIS:
-        print("  - AI Content Quality analysis (Gemini 2.5 Flash)...")
-        try:
-            results['categories']['ai_content'] = analyze_ai_content(url, html_content)
-            print(f"    AI Content Score: {results['categories']['ai_content'].get('score', 0)}/100")
-        except Exception as e:
-            print(f"    Warning: AI Content analysis failed: {e}")
-            results['categories']['ai_content'] = {'score': 0, 'error': str(e), 'insights': {}}
-    else:
+        return {'success': False, 'error': str(e)}
+
+
+def _ai_content_stage(url, document, credentials):
+    if not ENABLE_AI_ANALYSIS:
         print("  - AI analysis disabled in config")
-        results['categories']['ai_content'] = {'score': 0, 'insights': {'disabled': True}}
+        return {'score': 0, 'insights': {'disabled': True}}
+    try:
+        ai_content = analyze_ai_content(url, document, credentials)
+        print(f"    AI Content Score: {ai_content.get('score', 0)}/100")
+        return ai_content
+    except Exception as e:
+        print(f"    Warning: AI Content analysis failed: {e}")
+        return {'score': 0, 'error': str(e), 'insights': {}}
+
+
+def _page_results_stage(url, detected_language, pagespeed_full, **categories):
+    results = {
+        'audit_type': 'single-page',
+        'url': url,
+        'timestamp': datetime.datetime.now().isoformat(),
+        'language': detected_language,
+        'categories': {name: categories[name] for name in CATEGORY_STAGES},
+        'pagespeed_full': pagespeed_full
+    }
 
     # Oblicz finalny score
     final_score = calculate_final_score(results['categories'])
@@ -281,20 +673,99 @@ def run_single_page_audit(url, page_data, html_content, detected_language='en'):
         if issue['impact'] >= 6 and issue['severity'] in ['important', 'recommendation']
     ][:5]
 
+    return results
+
+
+def _action_plan_stage(url, homepage_results, credentials):
     # AI Action Plan (personalized recommendations)
-    if ENABLE_AI_ANALYSIS:
-        print("  - Generating AI Action Plan...")
-        try:
-            results['ai_action_plan'] = generate_ai_action_plan(url, results)
-            if results['ai_action_plan'].get('success'):
-                print(f"    [OK] Generated action plan with {len(results['ai_action_plan'].get('quick_wins', []))} AI quick wins")
-        except Exception as e:
-            print(f"    Warning: AI Action Plan failed: {e}")
-            results['ai_action_plan'] = {'error': str(e)}
-    else:
-        results['ai_action_plan'] = {'disabled': True}
+    if not ENABLE_AI_ANALYSIS:
+        return {'disabled': True}
+    try:
+        action_plan = generate_ai_action_plan(url, homepage_results, credentials)
+        if action_plan.get('success'):
+            print(f"    [OK] Generated action plan with {len(action_plan.get('quick_wins', []))} AI quick wins")
+        return action_plan
+    except Exception as e:
+        print(f"    Warning: AI Action Plan failed: {e}")
+        return {'error': str(e)}
+
+
+def _internal_links_stage(url, document):
+    from site_crawler import extract_internal_links
+
+    available_links = extract_internal_links(url, document)
+    print(f"  - Found {len(available_links)} internal links")
+    return available_links
+
+
+def _page_selection_stage(url, document, available_links, detected_language, credentials):
+    from analyzers.ai_site_structure import detect_site_type_and_select_pages
+
+    selection_result = detect_site_type_and_select_pages(
+        url=url,
+        html_content=document,
+        available_links=available_links,
+        language=detected_language,
+        content_hash=document.content_hash,
+        credentials=credentials
+    )
+    if not selection_result['success']:
+        raise StageFailed(f"Page selection failed: {selection_result['error']}")
+
+    selection_result['selected_pages'] = selection_result['selected_pages'][:MAX_PAGES_TO_ANALYZE - 1]  # -1 for homepage
+    print(f"  - Site type: {selection_result['site_type']} (confidence: {selection_result.get('site_type_confidence', 0)}%)")
+    print(f"  - Selected {len(selection_result['selected_pages'])} additional pages")
+    return selection_result
+
+
+def _fetch_pages_stage(selection_result):
+    from site_crawler import fetch_selected_pages
+
+    selected_pages = selection_result['selected_pages']
+    urls_to_fetch = [page['url'] for page in selected_pages]
+    fetched_pages = fetch_selected_pages(urls_to_fetch, timeout_per_page=10)
+
+    successful_pages = [p for p in fetched_pages if p['success']]
+    print(f"  - Successfully fetched {len(successful_pages)}/{len(fetched_pages)} pages")
+
+    # Merge page data with selection metadata
+    pages_for_analysis = []
+    for fetched in successful_pages:
+        # Find matching selection data
+        selection_data = next((p for p in selected_pages if p['url'] == fetched['url']), {})
+        document = ParsedDocument(fetched['html'], fetched['url'])
+        pages_for_analysis.append({
+            'url': fetched['url'],
+            'html': fetched['html'],
+            'document': document,
+            'content_hash': document.content_hash,
+            'page_type': selection_data.get('page_type', 'unknown'),
+            'selection_reason': selection_data.get('selection_reason', 'N/A'),
+            'expected_insights': selection_data.get('expected_insights', 'N/A')
+        })
+    return pages_for_analysis
+
+
+def _holistic_stage(url, document, pages_for_analysis, selection_result, detected_language, credentials):
+    from analyzers.ai_multi_page import analyze_site_holistically
+
+    holistic_result = analyze_site_holistically(
+        homepage_url=url,
+        pages_data=pages_for_analysis,
+        site_type=selection_result['site_type'],
+        language=detected_language,
+        homepage_content_hash=document.content_hash,
+        credentials=credentials,
+        homepage_document=document
+    )
+    if not holistic_result['success']:
+        raise StageFailed(f"Holistic analysis failed: {holistic_result['error']}")
+
+    print(f"  - Holistic score: {holistic_result.get('holistic_score', 0)}/100")
+    print(f"  - Template insights: {len(holistic_result.get('template_insights', []))}")
+    print(f"  - Scalable recommendations: {len(holistic_result.get('scalable_recommendations', []))}")
+    return holistic_result
 
-    return results
 
 def calculate_final_score(categories):
     """Oblicz finalny wynik z wagami"""
@@ -59,15 +59,111 @@ else:
 GEMINI_MODEL = "gemini-2.5-flash"  # Model AI
 ENABLE_AI_ANALYSIS = True  # Toggle AI features on/off
 
+# Pula klientów Gemini (ai_engine.gemini_clients) - jeden klient (i jego połączenia HTTP) na klucz API
+GEMINI_CLIENT_IDLE_TIMEOUT = 600  # Klient nieużywany dłużej (s) jest zamykany
+GEMINI_CLIENT_MAX = 50  # Maks. klientów w procesie (LRU) - tryb produkcyjny: klucz na użytkownika
+
+# Limit zapytań Gemini (rate_limiter.py) - token bucket per klucz API, wspólny dla workerów gunicorna
+GEMINI_REQUESTS_PER_MINUTE = 10  # Free tier gemini-2.5-flash: 10 RPM (płatny tier: podnieś)
+GEMINI_BURST = 3  # Maks. zapytań wysłanych od razu (pojemność kubełka)
+GEMINI_MAX_QUEUE_WAIT = 180  # Maks. czekanie na wolny token (s); potem etap AI kończy się błędem
+GEMINI_MAX_RETRIES = 3  # Ponowienia po 429/503 (exponential backoff z jitterem)
+GEMINI_BACKOFF_BASE = 2  # Bazowe opóźnienie backoff (s): losowo 0..base*2^próba
+GEMINI_BACKOFF_MAX = 60  # Maks. opóźnienie backoff (s)
+
+# Budżety treści w promptach AI (content_extractor.py) - szacunkowe tokeny wejściowe na etap
+AI_TOKEN_BUDGETS = {
+    'ai_content': 6000,  # Treść analizowanej strony
+    'page_selection': 700,  # Lista linków strony głównej (STAGE 1), ~50 URLi
+    'page_selection_content': 1500,  # Treść strony głównej (STAGE 1)
+    'holistic': 12000,  # Wszystkie strony razem (STAGE 2) - dzielone po równo między strony
+    'ai_action_plan': 3000,  # Podsumowanie audytu
+    'text': 2500  # analyze_text bez budżetu etapu (~10k znaków)
+}
+
+# Treść stron dla AI: True = pobrana już przez audyt, skompaktowana treść jest wysyłana w zapytaniu
+# (Gemini nie pobiera strony ponownie). URL Context tylko gdy HTML nie ma treści (np. strona renderowana JS)
+AI_INLINE_CONTENT = True
+AI_INLINE_MIN_TOKENS = 50  # Mniej tekstu w głównej treści = fallback na URL Context
+
 # Multi-Page Analysis
 ENABLE_MULTI_PAGE_ANALYSIS = True  # Enable intelligent multi-page audit
 MAX_PAGES_TO_ANALYZE = 5  # Maximum pages per audit (including homepage)
 MULTI_PAGE_TIMEOUT = 60  # Total timeout for multi-page analysis (seconds)
 
+# Audit pipeline (pipeline.py) - max. liczba etapów wykonywanych równolegle
+PIPELINE_MAX_WORKERS = 8
+
+# Kolejka audytów (job_queue.py) - limity per proces (worker gunicorna)
+AUDIT_WORKERS = 2  # Audyty wykonywane jednocześnie; reszta czeka w kolejce
+AUDIT_QUEUE_LIMIT = 10  # Maks. oczekujących audytów; kolejne dostają HTTP 503 + Retry-After
+JOB_RETENTION = 3600  # Jak długo (s) trzymamy status i wynik zakończonego joba
+
+# Cache (disk_cache.py) - pliki SQLite współdzielone przez workery gunicorna
+CACHE_DIR = os.getenv('SEO_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+
+# Cache wyników audytu (audit_engine.run_audit) - klucz: znormalizowany URL + tryb audytu
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_TTL = 6 * 3600  # sekundy; po tym czasie audyt jest wykonywany od nowa
+RESULT_CACHE_MAX_ENTRIES = 500  # LRU - najdawniej otwierane raporty są usuwane
+
+# Cache odpowiedzi Gemini (ai_engine.py) - klucz: model + prompt + hash treści strony
+AI_CACHE_ENABLED = True
+AI_CACHE_TTL = 7 * 24 * 3600  # sekundy
+AI_CACHE_MAX_ENTRIES = 2000
+
+# Audyty przyrostowe (page_store.py) - conditional GET (ETag/Last-Modified) i ponowne
+# użycie wyników etapów dla niezmienionych stron
+INCREMENTAL_AUDITS = False  # Domyślny tryb (API: parametr 'incremental')
+PAGE_STORE_TTL = 90 * 24 * 3600  # Jak długo pamiętamy stan strony (s)
+PAGE_STORE_MAX_ENTRIES = 50000  # Strony (LRU) - crawl wielu witryn po kilkaset stron
+
+# HTML Parsing
+# 'lxml' (C-extension, 5-20x szybszy na dużych stronach) lub 'html.parser' (czysty Python)
+# Jeśli lxml nie jest zainstalowany, automatycznie używany jest 'html.parser'
+HTML_PARSER = "lxml"
+
+# Full-site crawl mode (site_crawler.crawl_site)
+CRAWL_MAX_PAGES = 500  # Maks. stron na jeden crawl
+CRAWL_MAX_DEPTH = 3  # Maks. głębokość linków od strony głównej
+CRAWL_DELAY = 0.5  # Odstęp między requestami do hosta (s); Crawl-delay z robots.txt ma pierwszeństwo jeśli większy
+CRAWL_CONCURRENCY = 4  # Maks. równoległych requestów crawlera
+CRAWL_IGNORE_QUERY = True  # Ignoruj query string przy deduplikacji URLi (faceted navigation)
+CRAWL_REPORT_PAGES = 50  # Ile najsłabszych / niepobranych stron trafia do wyniku crawla (pełne podsumowania idą w zdarzeniach postępu)
+
+# Sitemap parsing (sitemap_parser.py)
+SITEMAP_MAX_FILES = 50  # Maks. plików sitemap pobieranych z sitemap index (multi-page / crawl)
+SITEMAP_QUICK_MAX_FILES = 2  # Audyt single-page: tylko sitemap index + pierwszy plik podrzędny
+SITEMAP_TIMEOUT = 10  # Timeout per plik sitemap (s)
+
+# Async fetching (async_fetcher.py) - multi-page i crawl
+FETCH_CONCURRENCY = 20  # Globalny limit równoległych requestów
+FETCH_PER_HOST_LIMIT = 5  # Limit równoległych requestów do jednego hosta
+FETCH_MAX_BODY_BYTES = 5 * 1024 * 1024  # Body powyżej 5 MB jest ucinane
+
 # Timeouts
 REQUEST_TIMEOUT = 10  # sekundy
 PSI_TIMEOUT = 30  # PSI może trwać dłużej
 
+# PageSpeed Insights (analyzers/pagespeed.py) - kwota per klucz API, wspólna dla workerów gunicorna
+PSI_CATEGORIES = ['performance', 'accessibility', 'best-practices', 'seo']  # Jedno zapytanie = wszystkie kategorie
+PSI_QUERIES_PER_SECOND = 1.0  # Domyślna kwota Google: 400 zapytań / 100 s na projekt - zostawiamy zapas
+PSI_BURST = 2  # Mobile + desktop wysyłane równolegle
+PSI_DAILY_QUOTA = 25000  # Domyślny dzienny limit zapytań na projekt
+PSI_MAX_QUEUE_WAIT = 60  # Maks. czekanie na wolne miejsce w kwocie (s)
+PSI_MAX_RETRIES = 2  # Ponowienia po 429/503 (Retry-After lub backoff z jitterem)
+PSI_BACKOFF_BASE = 5  # Bazowe opóźnienie backoff (s)
+PSI_BACKOFF_MAX = 60  # Maks. opóźnienie backoff (s)
+PSI_CACHE_TTL = 12 * 3600  # Wyniki PSI per URL + strategia (s)
+PSI_CACHE_MAX_ENTRIES = 1000
+
+# HTTP connection pooling (http_client.py)
+HTTP_POOL_CONNECTIONS = 20  # Liczba hostów z utrzymywaną pulą połączeń
+HTTP_POOL_MAXSIZE = 10  # Maks. połączeń keep-alive na jeden host
+HTTP_MAX_RETRIES = 2  # Retry dla błędów połączenia i 502/503/504
+HTTP_RETRY_BACKOFF = 0.5  # Backoff między retry (0.5s, 1s, ...)
+HTTP_RETRY_AFTER_MAX = 5  # Maks. respektowany Retry-After audytowanej strony (s) - duży nie blokuje workera
+
 # User agent
 USER_AGENT = "SEO-Audit-Tool/1.0 (Educational Purpose)"
 
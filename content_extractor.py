@@ -0,0 +1,339 @@
+# content_extractor.py - Główna treść strony i budżet tokenów dla promptów AI
+import re
+import math
+import hashlib
+from collections import Counter, namedtuple
+from bs4 import NavigableString, Tag
+from config import AI_INLINE_CONTENT, AI_INLINE_MIN_TOKENS
+
+# Blok treści: tag źródłowy ('h2', 'p', 'li', 'tr', ...) i znormalizowany tekst
+ContentBlock = namedtuple('ContentBlock', ['tag', 'text'])
+
+# Elementy, które nigdy nie są treścią
+BOILERPLATE_TAGS = frozenset([
+    'script', 'style', 'noscript', 'template', 'svg', 'canvas', 'iframe', 'object',
+    'nav', 'aside', 'form', 'button', 'select', 'dialog'
+])
+# header/footer pomijamy tylko poza głównym kontenerem (w <article> to zwykle tytuł i autor)
+PAGE_CHROME_TAGS = frozenset(['header', 'footer'])
+
+# Klasy / id typowych elementów szablonu (cookie bar, menu, sidebar, share, ...)
+_BOILERPLATE_PATTERN = re.compile(
+    r'(^|[-_\s])(cookie|consent|gdpr|banner|breadcrumbs?|menu|navbar|sidebar|widget|newsletter|'
+    r'subscribe|popup|modal|share|social|advert|ads|promo|related)([-_\s]|$)',
+    re.IGNORECASE
+)
+
+# Elementy, których cały tekst to jeden blok
+BLOCK_TAGS = frozenset([
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'li', 'dt', 'dd', 'blockquote', 'pre',
+    'figcaption', 'caption', 'tr', 'summary'
+])
+
+# Kontenery, wśród których szukamy głównej treści (gdy brak <main>/<article>)
+_CANDIDATE_TAGS = frozenset(['div', 'section', 'article', 'main', 'td'])
+
+# Poniżej tej liczby znaków najlepszy kontener to raczej przypadek - bierzemy całe <body>
+MIN_MAIN_CONTENT_CHARS = 250
+
+# Szacowanie tokenów Gemini: ~4 bajty UTF-8 na token (znaki diakrytyczne / nie-łacińskie liczą się więcej)
+BYTES_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Szacunkowa liczba tokenów tekstu (bez wywołania API count_tokens)"""
+    if not text:
+        return 0
+    return math.ceil(len(text.encode('utf-8')) / BYTES_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Utnij tekst do ~max_tokens tokenów (na granicy słowa)"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    # Przycinamy po bajtach, żeby nie zawyżać limitu dla tekstów z diakrytykami
+    limit = max(0, max_tokens * BYTES_PER_TOKEN)
+    cut = text.encode('utf-8')[:limit].decode('utf-8', errors='ignore')
+    if ' ' in cut[-200:]:
+        cut = cut[:cut.rfind(' ')]
+    return cut.rstrip() + ' …'
+
+
+def block_key(text):
+    """Klucz bloku do deduplikacji (wielkość liter i białe znaki bez znaczenia)"""
+    return hashlib.sha1(' '.join(text.lower().split()).encode('utf-8')).hexdigest()
+
+
+def extract_main_content(document):
+    """
+    Bloki głównej treści strony - bez nawigacji, stopki, cookie barów, sidebarów itp.
+
+    Główny kontener: <main> / role="main" / <article>, a jeśli ich brak - kontener
+    z największą ilością tekstu akapitów (z karą za gęstość linków). Powtórzone
+    na stronie bloki (np. ten sam CTA dwa razy) są pomijane.
+
+    Drzewo dokumentu nie jest modyfikowane (ParsedDocument jest współdzielony).
+
+    Args:
+        document: ParsedDocument
+
+    Returns:
+        list: [ContentBlock] w kolejności dokumentu
+    """
+    root, is_page = _find_main_root(document)
+    skip_tags = BOILERPLATE_TAGS | PAGE_CHROME_TAGS if is_page else BOILERPLATE_TAGS
+
+    blocks = []
+    seen = set()
+    for block in _walk_blocks(root, skip_tags):
+        key = block_key(block.text)
+        if key in seen:
+            continue
+        seen.add(key)
+        blocks.append(block)
+    return blocks
+
+
+def find_template_blocks(documents, min_share=0.5):
+    """
+    Klucze bloków powtarzających się na wielu stronach (elementy szablonu)
+
+    Args:
+        documents: ParsedDocument analizowanych razem stron
+        min_share: Minimalny udział stron z blokiem (i co najmniej 2 strony)
+
+    Returns:
+        set: klucze block_key - do pominięcia przy compact_page
+    """
+    if len(documents) < 2:
+        return set()
+
+    counts = Counter()
+    for document in documents:
+        counts.update({block_key(block.text) for block in document.main_content})
+
+    threshold = max(2, math.ceil(len(documents) * min_share))
+    return {key for key, count in counts.items() if count >= threshold}
+
+
+def format_blocks(blocks, max_tokens, skip_keys=None):
+    """
+    Bloki jako zwarty tekst (nagłówki jako '#', elementy list jako '-') w budżecie tokenów
+
+    Bloki są brane w kolejności dokumentu aż do wyczerpania budżetu;
+    ostatni mieszczący się częściowo blok jest ucinany.
+    """
+    lines = []
+    used = 0
+    for block in blocks:
+        if skip_keys and block_key(block.text) in skip_keys:
+            continue
+
+        line = _format_block(block)
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            remaining = max_tokens - used
+            if remaining > 20:
+                lines.append(truncate_to_tokens(line, remaining))
+            break
+        lines.append(line)
+        used += cost
+    return '\n'.join(lines)
+
+
+def compact_page(document, max_tokens, skip_keys=None):
+    """
+    Zwarta reprezentacja strony dla promptu AI: URL, title, meta description, H1 i główna treść
+
+    Args:
+        document: ParsedDocument
+        max_tokens: Budżet tokenów całego fragmentu
+        skip_keys: Klucze bloków szablonu do pominięcia (find_template_blocks)
+
+    Returns:
+        str
+    """
+    header = []
+    skip_keys = set(skip_keys or ())
+    if document.url:
+        header.append(f"URL: {document.url}")
+    if document.title and document.title.strip():
+        header.append(f"Title: {' '.join(document.title.split())}")
+    description = document.meta_content('description')
+    if description:
+        header.append(f"Meta description: {' '.join(description.split())}")
+    for h1 in document.headings['h1'][:2]:
+        text = h1.get_text(' ', strip=True)
+        if text:
+            header.append(f"H1: {' '.join(text.split())}")
+            skip_keys.add(block_key(text))  # Bez powtórzenia H1 w treści
+
+    header_text = truncate_to_tokens('\n'.join(header), max_tokens // 4)
+    body = format_blocks(document.main_content, max_tokens - estimate_tokens(header_text) - 5, skip_keys)
+    return f"{header_text}\n---\n{body}" if body else header_text
+
+
+def has_main_content(document, min_tokens=AI_INLINE_MIN_TOKENS):
+    """Czy HTML ma treść (strony renderowane JS mają często pusty szkielet)"""
+    total = 0
+    for block in document.main_content:
+        total += estimate_tokens(block.text)
+        if total >= min_tokens:
+            return True
+    return False
+
+
+def inline_page_content(document, max_tokens, skip_keys=None):
+    """
+    compact_page do wysłania w zapytaniu AI (tryb AI_INLINE_CONTENT)
+
+    Returns:
+        str lub None - wtedy etap używa URL Context (tryb wyłączony lub brak treści w HTML)
+    """
+    if not AI_INLINE_CONTENT:
+        return None
+    if not has_main_content(document):
+        print(f"[AI] No main content in fetched HTML of {document.url} - falling back to URL Context")
+        return None
+    return compact_page(document, max_tokens, skip_keys)
+
+
+def fit_lines(lines, max_tokens):
+    """Pierwsze linie (np. lista URLi) mieszczące się w budżecie tokenów"""
+    fitted = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        fitted.append(line)
+        used += cost
+    return fitted
+
+
+# ----------------------------------------
+# Helpers
+# ----------------------------------------
+
+def _format_block(block):
+    if block.tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+        return f"{'#' * int(block.tag[1])} {block.text}"
+    if block.tag in ('li', 'dd'):
+        return f"- {block.text}"
+    return block.text
+
+
+def _is_boilerplate(tag, skip_tags):
+    if tag.name in skip_tags:
+        return True
+    if tag.get('aria-hidden') == 'true' or tag.has_attr('hidden'):
+        return True
+    role = tag.get('role')
+    if role in ('navigation', 'banner', 'contentinfo', 'complementary', 'dialog'):
+        return True
+
+    classes = tag.get('class') or []
+    if isinstance(classes, str):
+        classes = [classes]
+    identifiers = ' '.join(classes + [tag.get('id') or ''])
+    return bool(identifiers.strip()) and bool(_BOILERPLATE_PATTERN.search(identifiers))
+
+
+def _text(tag, skip_tags):
+    """Tekst elementu z pominięciem poddrzew boilerplate, białe znaki znormalizowane"""
+    if tag.name == 'tr':
+        cells = [_text(cell, skip_tags) for cell in tag.find_all(['td', 'th'], recursive=False)]
+        return ' | '.join(cell for cell in cells if cell)
+
+    parts = []
+    stack = list(reversed(tag.contents))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Tag):
+            if not _is_boilerplate(node, skip_tags):
+                stack.extend(reversed(node.contents))
+        elif type(node) is NavigableString:
+            parts.append(node)
+    return ' '.join(''.join(parts).split())
+
+
+def _walk_blocks(root, skip_tags):
+    """Bloki pod root: elementy BLOCK_TAGS w całości, luźny tekst kontenerów jako akapity"""
+    loose = []
+
+    def flush():
+        text = ' '.join(''.join(loose).split())
+        loose.clear()
+        if len(text) > 2:
+            yield ContentBlock('p', text)
+
+    for child in root.children:
+        if isinstance(child, Tag):
+            if _is_boilerplate(child, skip_tags):
+                continue
+            if child.name in BLOCK_TAGS:
+                yield from flush()
+                text = _text(child, skip_tags)
+                if text:
+                    yield ContentBlock(child.name, text)
+            elif child.name in ('a', 'span', 'strong', 'b', 'em', 'i', 'u', 'small', 'mark', 'code', 'abbr', 'time',
+                                'sup', 'sub', 'label', 'br'):
+                loose.append(_text(child, skip_tags))
+            else:
+                yield from flush()
+                yield from _walk_blocks(child, skip_tags)
+        elif type(child) is NavigableString:
+            loose.append(child)
+    yield from flush()
+
+
+def _find_main_root(document):
+    """
+    Returns:
+        tuple: (element głównej treści, True jeśli to cała strona - wtedy pomijamy też header/footer)
+    """
+    main = document.find('main')
+    if main is None:
+        main = next((tag for tag in document.find_all('div') + document.find_all('section')
+                     if tag.get('role') == 'main'), None)
+    if main is not None and len(main.get_text(' ', strip=True)) >= MIN_MAIN_CONTENT_CHARS:
+        return main, False
+
+    articles = document.find_all('article')
+    if len(articles) == 1 and len(articles[0].get_text(' ', strip=True)) >= MIN_MAIN_CONTENT_CHARS:
+        return articles[0], False
+
+    # Kontener z największą ilością tekstu akapitów (rodzic: pełna waga, dziadek: połowa)
+    scores = Counter()
+    for paragraph in document.find_all('p'):
+        length = len(paragraph.get_text(' ', strip=True))
+        if length < 25:
+            continue
+        parent = paragraph.parent
+        if parent is not None and parent.name in _CANDIDATE_TAGS:
+            scores[id(parent)] += length
+            if parent.parent is not None and parent.parent.name in _CANDIDATE_TAGS:
+                scores[id(parent.parent)] += length / 2
+
+    candidates = {id(tag): tag for name in _CANDIDATE_TAGS for tag in document.find_all(name)}
+    best, best_score = None, 0
+    for tag_id, score in scores.most_common(10):  # Gęstość linków liczymy tylko dla czołówki
+        tag = candidates.get(tag_id)
+        if tag is None or _is_boilerplate(tag, BOILERPLATE_TAGS):
+            continue
+        score *= 1 - _link_density(tag)
+        if score > best_score:
+            best, best_score = tag, score
+
+    if best is not None and best_score >= MIN_MAIN_CONTENT_CHARS:
+        return best, False
+    return (document.find('body') or document.soup), True
+
+
+def _link_density(tag):
+    text_length = len(tag.get_text(' ', strip=True))
+    if not text_length:
+        return 1.0
+    link_length = sum(len(a.get_text(' ', strip=True)) for a in tag.find_all('a'))
+    return min(1.0, link_length / text_length)
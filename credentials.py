@@ -0,0 +1,54 @@
+# credentials.py - Klucze API jednego audytu (zamiast podmiany os.environ)
+import hashlib
+
+
+class Credentials:
+    """
+    Klucze API przekazywane jawnie przez audyt:
+    run_audit -> etapy pipeline -> AIAnalyzer/AIEngine, fetch_psi_data.
+
+    Dzięki temu jeden proces może wykonywać równolegle audyty z różnymi
+    kluczami użytkowników (tryb produkcyjny). Klucz None = klucz z config
+    (tryb lokalny: config_local.py / zmienne środowiskowe).
+
+    Użycie:
+        credentials = Credentials(gemini_key='...', psi_key='...')
+        run_audit(url, credentials=credentials)
+    """
+
+    def __init__(self, gemini_key=None, psi_key=None):
+        self.gemini_key = gemini_key
+        self.psi_key = psi_key
+
+    @property
+    def gemini_api_key(self):
+        """Klucz Gemini tego audytu lub domyślny z config"""
+        if self.gemini_key:
+            return self.gemini_key
+        from config import GEMINI_API_KEY
+        return GEMINI_API_KEY
+
+    @property
+    def psi_api_key(self):
+        """Klucz PageSpeed Insights tego audytu lub domyślny z config"""
+        if self.psi_key:
+            return self.psi_key
+        from config import GOOGLE_PSI_API_KEY
+        return GOOGLE_PSI_API_KEY
+
+    def scope(self):
+        """
+        Skrót (hash) efektywnych kluczy - do kluczy cache wyników i deduplikacji audytów.
+        Audyty z różnymi kluczami nie współdzielą jobów ani wyników; sam klucz nie trafia do SQLite.
+        """
+        material = f"{self.gemini_api_key or ''}\0{self.psi_api_key or ''}"
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()[:16]
+
+    def __repr__(self):
+        # Bez wartości kluczy - obiekt trafia do logów i komunikatów błędów
+        return f"Credentials(gemini_key={'set' if self.gemini_key else 'default'}, psi_key={'set' if self.psi_key else 'default'})"
+
+
+def resolve_credentials(credentials=None):
+    """Credentials audytu lub domyślne (klucze z config)"""
+    return credentials if credentials is not None else Credentials()
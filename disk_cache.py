@@ -0,0 +1,144 @@
+# disk_cache.py - Trwały cache klucz -> JSON w SQLite (TTL + LRU), współdzielony przez workery gunicorna
+import os
+import json
+import time
+import sqlite3
+import threading
+
+
+def open_connection(path):
+    """Połączenie SQLite w trybie autocommit + WAL (wielu czytelników, procesy gunicorna)"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+class DiskCache:
+    """
+    Cache w pliku SQLite.
+
+    - Wartości serializowane jako JSON
+    - TTL per wpis (domyślny z konstruktora, można nadpisać w set())
+    - LRU: po przekroczeniu max_entries usuwane są najdawniej odczytane wpisy
+    - Plik jest współdzielony przez procesy (WAL), połączenie jest per wątek
+
+    Błędy cache nigdy nie przerywają audytu - get() zwraca wtedy None, a set() nic nie robi.
+
+    Użycie:
+        cache = DiskCache('/path/cache.sqlite', ttl=3600, max_entries=500)
+        cache.set('key', {'a': 1})
+        cache.get('key')  # {'a': 1} lub None
+    """
+
+    def __init__(self, path, ttl=None, max_entries=None):
+        """
+        Args:
+            path: Ścieżka pliku SQLite (katalog tworzony automatycznie)
+            ttl: Domyślny czas życia wpisu w sekundach (None = bez wygasania)
+            max_entries: Maks. liczba wpisów (None = bez limitu)
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = open_connection(self.path)
+            self._local.connection = connection
+
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    connection.execute("""
+                        CREATE TABLE IF NOT EXISTS entries (
+                            key TEXT PRIMARY KEY,
+                            value TEXT NOT NULL,
+                            created_at REAL NOT NULL,
+                            accessed_at REAL NOT NULL,
+                            expires_at REAL
+                        )
+                    """)
+                    connection.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)')
+                    self._initialized = True
+        return connection
+
+    def get(self, key, default=None):
+        """Zwróć wartość dla key (lub default jeśli brak / wygasła)"""
+        try:
+            entry = self.get_entry(key)
+        except Exception as e:
+            print(f"[CACHE] Warning: read failed ({self.path}): {e}")
+            return default
+        return entry['value'] if entry else default
+
+    def get_entry(self, key):
+        """
+        Zwróć wpis z metadanymi i odśwież jego pozycję LRU
+
+        Returns:
+            dict: {'value', 'created_at', 'expires_at'} lub None
+        """
+        connection = self._connect()
+        now = time.time()
+        row = connection.execute(
+            'SELECT value, created_at, expires_at FROM entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, created_at, expires_at = row
+        if expires_at is not None and expires_at <= now:
+            connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+            return None
+
+        connection.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (now, key))
+        return {'value': json.loads(value), 'created_at': created_at, 'expires_at': expires_at}
+
+    def set(self, key, value, ttl=None):
+        """
+        Zapisz wartość (musi być serializowalna do JSON)
+
+        Args:
+            ttl: Czas życia w sekundach (None = domyślny TTL cache)
+        """
+        try:
+            connection = self._connect()
+            now = time.time()
+            ttl = self.ttl if ttl is None else ttl
+            expires_at = now + ttl if ttl else None
+            connection.execute(
+                'INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), now, now, expires_at)
+            )
+            self._evict(connection, now)
+        except Exception as e:
+            print(f"[CACHE] Warning: write failed ({self.path}): {e}")
+
+    def _evict(self, connection, now):
+        connection.execute('DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?', (now,))
+        if self.max_entries:
+            connection.execute("""
+                DELETE FROM entries WHERE key IN (
+                    SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def delete(self, key):
+        try:
+            self._connect().execute('DELETE FROM entries WHERE key = ?', (key,))
+        except Exception as e:
+            print(f"[CACHE] Warning: delete failed ({self.path}): {e}")
+
+    def clear(self):
+        self._connect().execute('DELETE FROM entries')
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
@@ -0,0 +1,126 @@
+# http_client.py - Współdzielona sesja HTTP (connection pooling + keep-alive) dla wszystkich modułów
+import threading
+from http.cookiejar import DefaultCookiePolicy
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
+from config import (
+    REQUEST_TIMEOUT, USER_AGENT,
+    HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_MAX_RETRIES, HTTP_RETRY_BACKOFF, HTTP_RETRY_AFTER_MAX
+)
+
+# Statusy, które ponawiamy automatycznie (429 obsługuje sam wywołujący, np. PageSpeed)
+RETRY_STATUSES = (502, 503, 504)
+
+_session = None
+_api_session = None
+_session_lock = threading.Lock()
+
+
+class CappedRetry(Retry):
+    """Retry, który respektuje Retry-After najwyżej przez HTTP_RETRY_AFTER_MAX sekund"""
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, HTTP_RETRY_AFTER_MAX)
+
+
+def _build_retry(retry_statuses=RETRY_STATUSES):
+    """
+    Wspólna polityka retry: błędy połączenia + przejściowe 5xx (tylko GET/HEAD)
+
+    Args:
+        retry_statuses: Ponawiane statusy; () = tylko błędy połączenia (API z własnym
+                        schedulerem ponowień i liczeniem kwoty, np. PageSpeed)
+    """
+    return CappedRetry(
+        total=HTTP_MAX_RETRIES,
+        connect=HTTP_MAX_RETRIES,
+        read=0,  # Nie ponawiamy read timeoutów - mnożyłoby to czas audytu
+        # status=0: bez ponowień statusów, także 429/503 z Retry-After (urllib3 ponawia je poza forcelist)
+        status=HTTP_MAX_RETRIES if retry_statuses else 0,
+        status_forcelist=retry_statuses,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        backoff_factor=HTTP_RETRY_BACKOFF,
+        respect_retry_after_header=bool(retry_statuses),
+        raise_on_status=False  # Zwróć ostatnią odpowiedź zamiast wyjątku
+    )
+
+
+def _create_session(retry_statuses=RETRY_STATUSES):
+    session = requests.Session()
+
+    # Pula połączeń per host (keep-alive) + wspólny retry
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,  # ile hostów trzymamy w cache pul
+        pool_maxsize=HTTP_POOL_MAXSIZE,  # ile połączeń na jeden host
+        max_retries=_build_retry(retry_statuses)
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        # gzip/deflate (+ br/zstd jeśli zainstalowane są odpowiednie biblioteki)
+        'Accept-Encoding': make_headers(accept_encoding=True)['accept-encoding']
+    })
+
+    # Sesja jest współdzielona między audytami różnych użytkowników -
+    # nie przechowujemy cookies pomiędzy requestami
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    return session
+
+
+def get_session():
+    """
+    Zwróć współdzieloną sesję HTTP (tworzona leniwie, raz na proces).
+
+    Tworzenie przy pierwszym użyciu (a nie przy imporcie) sprawia, że każdy
+    worker gunicorna po forku ma własną pulę połączeń.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _create_session()
+    return _session
+
+
+def get_api_session():
+    """
+    Sesja dla API z własną obsługą 429/503 (PageSpeed): bez automatycznego ponawiania statusów
+
+    Każde zapytanie przechodzi wtedy przez scheduler wywołującego (rate_limiter:
+    acquire / consume_daily / pause) - ponowienia urllib3 omijałyby liczenie kwoty.
+    """
+    global _api_session
+    if _api_session is None:
+        with _session_lock:
+            if _api_session is None:
+                _api_session = _create_session(retry_statuses=())
+    return _api_session
+
+
+def api_get(url, timeout=REQUEST_TIMEOUT, headers=None, **kwargs):
+    """GET przez get_api_session() (argumenty jak http_get)"""
+    return get_api_session().get(url, timeout=timeout, headers=headers, **kwargs)
+
+
+def http_get(url, timeout=REQUEST_TIMEOUT, headers=None, **kwargs):
+    """
+    GET przez współdzieloną sesję (keep-alive, pooling, retry, kompresja)
+
+    Args:
+        url: URL do pobrania
+        timeout: Timeout w sekundach
+        headers: Dodatkowe nagłówki (łączone z domyślnymi)
+        **kwargs: Przekazywane do requests.Session.get (params, allow_redirects, stream...)
+
+    Returns:
+        requests.Response
+    """
+    return get_session().get(url, timeout=timeout, headers=headers, **kwargs)
@@ -0,0 +1,385 @@
+# job_queue.py - Ograniczona kolejka audytów w tle (stała pula workerów + kontrola przyjęć)
+import time
+import uuid
+import threading
+from collections import deque
+from job_store import get_job_store
+from config import AUDIT_WORKERS, AUDIT_QUEUE_LIMIT, JOB_RETENTION
+
+
+class QueueFull(Exception):
+    """Kolejka osiągnęła limit - nowy audyt nie został przyjęty"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Job:
+    """
+    Pojedynczy audyt w kolejce.
+
+    Status: queued -> running -> completed | failed
+    Zdarzenia (progress, queued, complete, error) są dopisywane do listy events
+    i do JobStore (numer zdarzenia = pozycja w liście, od 1); lokalni czytelnicy
+    czekają na nowe przez wait_events().
+
+    dedupe_key: klucz audytu (tryb + URL) - jednoczesne identyczne żądania
+    dołączają do tego joba zamiast uruchamiać własny.
+    """
+
+    def __init__(self, func, params, store=None, dedupe_key=None):
+        self.id = uuid.uuid4().hex
+        self.func = func
+        self.params = params
+        self.store = store
+        self.dedupe_key = dedupe_key
+        self.status = 'queued'
+        self.events = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._condition = threading.Condition()
+        self._persist('create_job', params.get('url'), self.created_at, dedupe_key)
+
+    def _persist(self, method, *args, **kwargs):
+        """Zapis do JobStore - błąd zapisu nie przerywa audytu (działa wtedy tylko lokalny strumień)"""
+        if self.store is None:
+            return
+        try:
+            getattr(self.store, method)(self.id, *args, **kwargs)
+        except Exception as e:
+            print(f"[JOBS] Warning: job store {method} failed: {e}")
+
+    def add_event(self, event):
+        with self._condition:
+            self.events.append(event)
+            self._persist('append_event', len(self.events), event)
+            self._condition.notify_all()
+
+    def set_status(self, status, **fields):
+        """Zmień status joba (lokalnie i w JobStore)"""
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.status = status
+        self._persist('update_job', status=status, **fields)
+
+    def wait_events(self, after=0, timeout=None):
+        """
+        Zdarzenia o indeksie >= after; czeka do timeout, jeśli jeszcze ich nie ma
+
+        Returns:
+            list: nowe zdarzenia (pusta lista po timeout)
+        """
+        with self._condition:
+            if len(self.events) <= after and not self.is_finished():
+                self._condition.wait(timeout)
+            return self.events[after:]
+
+    def is_finished(self):
+        return self.status in ('completed', 'failed')
+
+    def wait(self, timeout=None):
+        """Czekaj na zakończenie joba. Returns: True jeśli zakończony"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while not self.is_finished():
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    @property
+    def progress(self):
+        """Ostatnie zdarzenie progress (percent, message) lub None"""
+        for event in reversed(self.events):
+            if event.get('type') == 'progress':
+                return event
+        return None
+
+    def to_dict(self):
+        """Status joba dla API (bez wyniku)"""
+        progress = self.progress
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'url': self.params.get('url'),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'percent': 100 if self.status == 'completed' else (progress['percent'] if progress else 0),
+            'message': progress['message'] if progress else None
+        }
+        if self.error:
+            data['error'] = self.error
+        return data
+
+
+class RemoteJob:
+    """
+    Job wykonywany przez inny worker gunicorna (odczyt z JobStore).
+
+    Interfejs jak Job (id, status, result, error, wait, to_dict) - używany,
+    gdy żądanie dołącza do audytu uruchomionego w innym procesie.
+    """
+
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, job_id, store):
+        self.id = job_id
+        self.store = store
+
+    @property
+    def status(self):
+        job = self.store.get_job(self.id)
+        if job is None:
+            return 'failed'
+        if job['status'] in ('queued', 'running') and not self.store.owner_alive(self.id):
+            return 'failed'
+        return job['status']
+
+    @property
+    def error(self):
+        job = self.store.get_job(self.id)
+        if job is None:
+            return 'Job expired'
+        if job['status'] in ('queued', 'running'):
+            return None if self.store.owner_alive(self.id) else 'Audit worker stopped'
+        return job.get('error')
+
+    @property
+    def result(self):
+        return self.store.get_result(self.id)
+
+    def is_finished(self):
+        return self.status in ('completed', 'failed')
+
+    def wait(self, timeout=None):
+        """Czekaj na zakończenie joba (odpytywanie JobStore). Returns: True jeśli zakończony"""
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.is_finished():
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(self.POLL_INTERVAL)
+        return True
+
+    def to_dict(self):
+        return self.store.get_job(self.id) or {'job_id': self.id, 'status': 'failed', 'error': 'Job expired'}
+
+
+class JobQueue:
+    """
+    Kolejka FIFO obsługiwana przez stałą liczbę wątków.
+
+    - max_workers audytów naraz (reszta czeka w kolejce)
+    - max_queued oczekujących; kolejne submit() rzucają QueueFull (HTTP 503)
+    - oczekujące joby dostają zdarzenia 'queued' z aktualną pozycją
+    - zakończone joby są trzymane przez retention sekund (status/wynik do odebrania)
+    - single-flight: submit() z dedupe_key trwającego audytu (w tym procesie lub,
+      przez JobStore, w innym workerze) zwraca istniejący job zamiast nowego
+
+    Wątki startują przy pierwszym submit() - każdy worker gunicorna ma własną pulę.
+    """
+
+    def __init__(self, max_workers=AUDIT_WORKERS, max_queued=AUDIT_QUEUE_LIMIT, retention=JOB_RETENTION,
+                 store=None):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.store = store
+        self.jobs = {}
+        self._inflight = {}  # dedupe_key -> niezakończony Job
+        self._pending = deque()
+        self._running = 0
+        self._durations = deque(maxlen=20)  # ostatnie czasy audytów (szacowanie Retry-After)
+        self._lock = threading.Lock()
+        self._work_available = threading.Condition(self._lock)
+        self._threads = []
+
+    def submit(self, func, dedupe_key=None, **params):
+        """
+        Dodaj audyt do kolejki
+
+        Args:
+            func: Callable(progress_callback, **params) -> wynik (dict)
+            dedupe_key: Klucz audytu; jeśli audyt o tym kluczu trwa, zwracany jest jego job
+                        (wszyscy klienci dostają te same zdarzenia i wynik)
+            **params: Parametry audytu (zapisywane w jobie, np. url)
+
+        Returns:
+            Job (lub RemoteJob, gdy identyczny audyt trwa w innym workerze)
+
+        Raises:
+            QueueFull: za dużo oczekujących audytów
+        """
+        with self._lock:
+            self._cleanup()
+
+            # Single-flight: dołączenie do trwającego audytu nie zajmuje miejsca w kolejce
+            if dedupe_key:
+                existing = self._find_inflight(dedupe_key)
+                if existing:
+                    print(f"[JOBS] Joined in-flight audit {existing.id} ({dedupe_key})")
+                    return existing
+
+            if len(self._pending) >= self.max_queued:
+                raise QueueFull(
+                    f"Audit queue is full ({self.max_queued} waiting). Try again later.",
+                    retry_after=self._estimate_wait(len(self._pending))
+                )
+
+            job = Job(func, params, store=self.store, dedupe_key=dedupe_key)
+            self.jobs[job.id] = job
+            if dedupe_key:
+                self._inflight[dedupe_key] = job
+            # Zdarzenie 'queued' przed udostępnieniem workerom - zawsze pierwsze w strumieniu;
+            # niesie job_id, żeby klient mógł wznowić strumień po zerwaniu połączenia
+            first_event = self._queued_event(len(self._pending) + 1)
+            first_event['job_id'] = job.id
+            job.add_event(first_event)
+            self._pending.append(job)
+            self._ensure_workers()
+            self._work_available.notify()
+
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def position(self, job):
+        """Pozycja w kolejce (1 = następny) lub 0 jeśli job już nie czeka"""
+        with self._lock:
+            try:
+                return self._pending.index(job) + 1
+            except ValueError:
+                return 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': self._running,
+                'queued': len(self._pending),
+                'max_workers': self.max_workers,
+                'max_queued': self.max_queued
+            }
+
+    # ----------------------------------------
+    # Workery
+    # ----------------------------------------
+
+    def _ensure_workers(self):
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.max_workers:
+            thread = threading.Thread(target=self._worker, name=f"audit-worker-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._work_available.wait()
+                job = self._pending.popleft()
+                self._running += 1
+                waiting = list(self._pending)
+
+            # Pozostałe joby przesunęły się w kolejce
+            for position, waiting_job in enumerate(waiting, 1):
+                waiting_job.add_event(self._queued_event(position))
+
+            self._run(job)
+
+            with self._lock:
+                self._running -= 1
+                self._durations.append(job.finished_at - job.started_at)
+                if self._inflight.get(job.dedupe_key) is job:
+                    del self._inflight[job.dedupe_key]
+
+    def _run(self, job):
+        job.set_status('running', started_at=time.time())
+
+        def progress_callback(percent, message, details=None):
+            event = {'type': 'progress', 'percent': percent, 'message': message}
+            if details:
+                event['details'] = details
+            job.add_event(event)
+
+        result = None
+        error = None
+        try:
+            result = job.func(progress_callback=progress_callback, **job.params)
+            if isinstance(result, dict) and 'error' in result:
+                error = result['error']
+        except Exception as e:
+            print(f"[JOBS] Job {job.id} failed: {e}")
+            error = str(e)
+
+        # Status przed zdarzeniem końcowym - czytelnik, który je dostanie, widzi już zakończony job
+        if error:
+            job.set_status('failed', finished_at=time.time(), error=error, result=result)
+            job.add_event({'type': 'error', 'message': error})
+        else:
+            job.set_status('completed', finished_at=time.time(), result=result)
+            job.add_event({'type': 'complete', 'results': result})
+
+    # ----------------------------------------
+    # Helpers
+    # ----------------------------------------
+
+    def _find_inflight(self, dedupe_key):
+        """Trwający job o tym kluczu: lokalny albo z innego workera (wywoływane pod lockiem)"""
+        job = self._inflight.get(dedupe_key)
+        if job and not job.is_finished():
+            return job
+
+        if self.store is not None:
+            try:
+                job_id = self.store.find_active(dedupe_key)
+            except Exception as e:
+                print(f"[JOBS] Warning: job store lookup failed: {e}")
+                job_id = None
+            if job_id:
+                return RemoteJob(job_id, self.store)
+        return None
+
+    def _queued_event(self, position):
+        return {
+            'type': 'queued',
+            'position': position,
+            'percent': 0,
+            'message': f"Waiting in queue (position {position})...",
+            'estimated_wait': self._estimate_wait(position)
+        }
+
+    def _estimate_wait(self, position):
+        """Szacowany czas oczekiwania (s) na podstawie ostatnich audytów"""
+        average = sum(self._durations) / len(self._durations) if self._durations else 60
+        return int(average * ((position + self.max_workers - 1) // self.max_workers))
+
+    def _cleanup(self):
+        """Usuń zakończone joby starsze niż retention (wywoływane pod lockiem)"""
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.is_finished() and now - job.finished_at > self.retention
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Współdzielona kolejka audytów (jedna na proces)"""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue(store=get_job_store())
+    return _job_queue
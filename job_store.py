@@ -0,0 +1,195 @@
+# job_store.py - Stan jobów i numerowane zdarzenia w SQLite (wspólne dla wszystkich workerów gunicorna)
+import os
+import json
+import time
+import threading
+from disk_cache import open_connection
+from config import CACHE_DIR, JOB_RETENTION
+
+# Typy zdarzeń kończące strumień joba
+TERMINAL_EVENTS = ('complete', 'error')
+
+
+def _process_alive(pid):
+    """Czy proces (worker gunicorna) o danym pid nadal działa"""
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        # Windows: os.kill(pid, 0) zabiłby proces; lokalnie działa jeden proces serwera
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """
+    Trwały log zdarzeń i stan jobów.
+
+    Każde zdarzenie joba dostaje kolejny numer (seq, od 1) - to id zdarzenia SSE.
+    Klient, który zgubił połączenie, wznawia strumień od Last-Event-ID,
+    również gdy trafi na inny worker niż ten, który wykonuje audyt.
+    """
+
+    def __init__(self, path=None, retention=JOB_RETENTION):
+        self.path = path or os.path.join(CACHE_DIR, 'jobs.sqlite')
+        self.retention = retention
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = open_connection(self.path)
+            self._local.connection = connection
+
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    connection.execute("""
+                        CREATE TABLE IF NOT EXISTS jobs (
+                            id TEXT PRIMARY KEY,
+                            status TEXT NOT NULL,
+                            url TEXT,
+                            dedupe_key TEXT,
+                            pid INTEGER,
+                            percent INTEGER NOT NULL DEFAULT 0,
+                            message TEXT,
+                            error TEXT,
+                            result TEXT,
+                            created_at REAL NOT NULL,
+                            started_at REAL,
+                            finished_at REAL
+                        )
+                    """)
+                    connection.execute("""
+                        CREATE TABLE IF NOT EXISTS events (
+                            job_id TEXT NOT NULL,
+                            seq INTEGER NOT NULL,
+                            data TEXT NOT NULL,
+                            PRIMARY KEY (job_id, seq)
+                        )
+                    """)
+                    connection.execute('CREATE INDEX IF NOT EXISTS jobs_dedupe_key ON jobs (dedupe_key, status)')
+                    self._initialized = True
+        return connection
+
+    def create_job(self, job_id, url, created_at, dedupe_key=None):
+        connection = self._connect()
+        self._cleanup(connection)
+        connection.execute(
+            'INSERT INTO jobs (id, status, url, dedupe_key, pid, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (job_id, 'queued', url, dedupe_key, os.getpid(), created_at)
+        )
+
+    def append_event(self, job_id, seq, event):
+        """Zapisz zdarzenie; progress aktualizuje też percent/message joba"""
+        connection = self._connect()
+        connection.execute(
+            'INSERT INTO events (job_id, seq, data) VALUES (?, ?, ?)',
+            (job_id, seq, json.dumps(event, ensure_ascii=False))
+        )
+        if event.get('type') == 'progress':
+            connection.execute(
+                'UPDATE jobs SET percent = ?, message = ? WHERE id = ?',
+                (event.get('percent', 0), event.get('message'), job_id)
+            )
+
+    def update_job(self, job_id, **fields):
+        """Aktualizuj kolumny joba (status, started_at, finished_at, error, result)"""
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'], ensure_ascii=False)
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        self._connect().execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+
+    def get_job(self, job_id):
+        """
+        Returns:
+            dict: kształt Job.to_dict() (bez wyniku) lub None
+        """
+        row = self._connect().execute(
+            'SELECT id, status, url, percent, message, error, created_at, started_at, finished_at FROM jobs WHERE id = ?',
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        job_id, status, url, percent, message, error, created_at, started_at, finished_at = row
+        data = {
+            'job_id': job_id,
+            'status': status,
+            'url': url,
+            'created_at': created_at,
+            'started_at': started_at,
+            'finished_at': finished_at,
+            'percent': 100 if status == 'completed' else percent,
+            'message': message
+        }
+        if error:
+            data['error'] = error
+        return data
+
+    def find_active(self, dedupe_key):
+        """
+        Niezakończony job o tym kluczu wykonywany przez inny, działający proces
+
+        Returns:
+            str: id joba lub None
+        """
+        rows = self._connect().execute(
+            "SELECT id, pid FROM jobs WHERE dedupe_key = ? AND status IN ('queued', 'running') ORDER BY created_at DESC",
+            (dedupe_key,)
+        ).fetchall()
+        for job_id, pid in rows:
+            # Joby własnego procesu zna kolejka; pid martwego workera = porzucony job
+            if pid != os.getpid() and _process_alive(pid):
+                return job_id
+        return None
+
+    def owner_alive(self, job_id):
+        """Czy proces wykonujący job nadal działa (False = job porzucony po awarii workera)"""
+        row = self._connect().execute('SELECT pid FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row) and _process_alive(row[0])
+
+    def get_result(self, job_id):
+        row = self._connect().execute('SELECT result FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def events(self, job_id, after=0):
+        """
+        Zdarzenia joba o numerze > after
+
+        Returns:
+            list: [(seq, event), ...] rosnąco po seq
+        """
+        rows = self._connect().execute(
+            'SELECT seq, data FROM events WHERE job_id = ? AND seq > ? ORDER BY seq',
+            (job_id, after)
+        ).fetchall()
+        return [(seq, json.loads(data)) for seq, data in rows]
+
+    def _cleanup(self, connection):
+        """Usuń joby (i ich zdarzenia) zakończone dawniej niż retention"""
+        cutoff = time.time() - self.retention
+        expired = 'SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?'
+        connection.execute(f'DELETE FROM events WHERE job_id IN ({expired})', (cutoff,))
+        connection.execute('DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?', (cutoff,))
+
+
+_job_store = None
+_job_store_lock = threading.Lock()
+
+
+def get_job_store():
+    """Współdzielony JobStore (jeden na proces, plik wspólny dla wszystkich procesów)"""
+    global _job_store
+    if _job_store is None:
+        with _job_store_lock:
+            if _job_store is None:
+                _job_store = JobStore()
+    return _job_store
@@ -0,0 +1,252 @@
+# page_document.py - Jednokrotne parsowanie HTML współdzielone przez wszystkie analyzery
+import importlib
+import hashlib
+import json
+import sys
+import os
+from functools import cached_property
+from bs4 import BeautifulSoup, NavigableString, Tag
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import HTML_PARSER
+from content_extractor import extract_main_content
+
+# Backendy BeautifulSoup -> moduł C-extension którego wymagają (None = wbudowany)
+PARSER_BACKENDS = {
+    'lxml': 'lxml',
+    'html.parser': None
+}
+
+_resolved_parser = None
+
+# Tagi pomijane przy wyciąganiu "widocznej" treści (analiza contentu)
+CONTENT_EXCLUDED_TAGS = frozenset(['script', 'style', 'nav', 'footer', 'header'])
+
+
+def get_parser_backend():
+    """
+    Zwróć nazwę backendu parsera HTML do użycia z BeautifulSoup.
+
+    Backend wybierany jest w config.HTML_PARSER. Jeśli wymagany C-extension
+    (np. lxml) nie jest zainstalowany, wracamy do wbudowanego 'html.parser'.
+    Wynik jest cache'owany na cały proces.
+    """
+    global _resolved_parser
+    if _resolved_parser is not None:
+        return _resolved_parser
+
+    backend = HTML_PARSER if HTML_PARSER in PARSER_BACKENDS else 'html.parser'
+    if HTML_PARSER not in PARSER_BACKENDS:
+        print(f"[WARN] Unknown HTML_PARSER '{HTML_PARSER}', using html.parser")
+
+    module_name = PARSER_BACKENDS[backend]
+    if module_name:
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            print(f"[WARN] {module_name} not installed - falling back to html.parser")
+            print(f"Run: pip install {module_name}")
+            backend = 'html.parser'
+
+    _resolved_parser = backend
+    return _resolved_parser
+
+
+def parse_html(html):
+    """Sparsuj HTML skonfigurowanym backendem (BeautifulSoup)"""
+    return BeautifulSoup(html or '', get_parser_backend())
+
+
+class ParsedDocument:
+    """
+    HTML strony sparsowany RAZ i współdzielony przez wszystkie analyzery.
+
+    Drzewo jest traktowane jako tylko-do-odczytu - analyzery nie mogą go
+    modyfikować (np. decompose()), bo korzystają z niego kolejne etapy.
+    Najczęściej używane elementy (title, meta, nagłówki, linki, obrazy,
+    JSON-LD, tekst) są wyliczane leniwie i cache'owane.
+    """
+
+    def __init__(self, html, url=None):
+        """
+        Args:
+            html: Surowy HTML strony
+            url: URL strony (opcjonalny, do kontekstu)
+        """
+        self.html = html or ''
+        self.url = url
+        self.soup = parse_html(self.html)
+
+        # Jeden przebieg po drzewie - tagi pogrupowane po nazwie (kolejność dokumentu)
+        self._tags = {}
+        for tag in self.soup.find_all(True):
+            self._tags.setdefault(tag.name, []).append(tag)
+
+    # ----------------------------------------
+    # Dostęp do tagów
+    # ----------------------------------------
+
+    def find_all(self, name):
+        """Wszystkie tagi o danej nazwie (kolejność dokumentu)"""
+        return self._tags.get(name, [])
+
+    def find(self, name):
+        """Pierwszy tag o danej nazwie lub None"""
+        tags = self._tags.get(name)
+        return tags[0] if tags else None
+
+    # ----------------------------------------
+    # Precomputed elementy strony
+    # ----------------------------------------
+
+    @cached_property
+    def title_tag(self):
+        return self.find('title')
+
+    @cached_property
+    def title(self):
+        """Tekst title (bez strip) lub None jeśli brak tagu"""
+        return self.title_tag.get_text() if self.title_tag else None
+
+    @cached_property
+    def lang(self):
+        """Atrybut lang z <html> lub None"""
+        html_tag = self.find('html')
+        return html_tag.get('lang') if html_tag else None
+
+    @cached_property
+    def meta(self):
+        """Meta tagi name="..." -> tag (pierwsze wystąpienie)"""
+        return self._index_meta('name')
+
+    @cached_property
+    def meta_properties(self):
+        """Meta tagi property="..." (Open Graph) -> tag (pierwsze wystąpienie)"""
+        return self._index_meta('property')
+
+    @cached_property
+    def meta_http_equiv(self):
+        """Meta tagi http-equiv="..." -> tag (pierwsze wystąpienie)"""
+        return self._index_meta('http-equiv')
+
+    def meta_content(self, name, default=''):
+        """Wartość content dla <meta name="...">"""
+        tag = self.meta.get(name)
+        return tag.get('content', default) if tag else default
+
+    @cached_property
+    def headings(self):
+        """Nagłówki h1-h6 -> lista tagów"""
+        return {f'h{level}': self.find_all(f'h{level}') for level in range(1, 7)}
+
+    @cached_property
+    def links(self):
+        """Wartości href wszystkich <a href>"""
+        return [a['href'] for a in self.find_all('a') if a.has_attr('href')]
+
+    @cached_property
+    def images(self):
+        """Obrazy jako lista dict {'src', 'alt'}"""
+        return [{'src': img.get('src'), 'alt': img.get('alt')} for img in self.find_all('img')]
+
+    @cached_property
+    def canonical(self):
+        """Pierwszy <link rel="canonical"> lub None"""
+        for link in self.find_all('link'):
+            rel = link.get('rel') or []
+            if isinstance(rel, str):
+                rel = [rel]
+            if 'canonical' in rel:
+                return link
+        return None
+
+    @cached_property
+    def json_ld(self):
+        """Surowa zawartość skryptów JSON-LD"""
+        return [
+            script.string or ''
+            for script in self.find_all('script')
+            if script.get('type') == 'application/ld+json'
+        ]
+
+    @cached_property
+    def text(self):
+        """Cały tekst dokumentu (jak soup.get_text())"""
+        return self.soup.get_text()
+
+    @cached_property
+    def content_text(self):
+        """
+        Widoczny tekst treści - bez script/style/nav/footer/header.
+        Odpowiednik decompose() + get_text(separator=' ', strip=True), bez mutowania drzewa.
+        """
+        stripped = (s.strip() for s in self._walk_strings(self.soup, CONTENT_EXCLUDED_TAGS))
+        return ' '.join(s for s in stripped if s)
+
+    @cached_property
+    def content_paragraphs(self):
+        """Teksty paragrafów <p> spoza script/style/nav/footer/header"""
+        return [
+            ''.join(self._walk_strings(p, CONTENT_EXCLUDED_TAGS))
+            for p in self.find_all('p')
+            if not any(parent.name in CONTENT_EXCLUDED_TAGS for parent in p.parents)
+        ]
+
+    @cached_property
+    def main_content(self):
+        """Bloki głównej treści bez elementów szablonu (content_extractor) - materiał do promptów AI"""
+        return extract_main_content(self)
+
+    @cached_property
+    def content_hash(self):
+        """
+        Odcisk treści strony (SHA-256): title, meta, canonical, nagłówki, tekst, linki, obrazy, JSON-LD.
+        Nie zmienia się przy rotujących nonce/tokenach w skryptach - nadaje się na klucz cache.
+        """
+        canonical = self.canonical.get('href') if self.canonical else None
+        fingerprint = {
+            'title': self.title,
+            'meta': {name: tag.get('content') for name, tag in self.meta.items()},
+            'canonical': canonical,
+            'headings': {level: [h.get_text(strip=True) for h in tags] for level, tags in self.headings.items()},
+            'text': self.content_text,
+            'links': self.links,
+            'images': self.images,
+            'json_ld': self.json_ld
+        }
+        serialized = json.dumps(fingerprint, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    # ----------------------------------------
+    # Helpers
+    # ----------------------------------------
+
+    def _index_meta(self, attribute):
+        index = {}
+        for tag in self.find_all('meta'):
+            key = tag.get(attribute)
+            if isinstance(key, str) and key not in index:
+                index[key] = tag
+        return index
+
+    def _walk_strings(self, root, skip_tags):
+        """Stringi (NavigableString/CData) pod root, z pominięciem poddrzew skip_tags"""
+        types = root.interesting_string_types or Tag.MAIN_CONTENT_STRING_TYPES
+        stack = list(reversed(root.contents))
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Tag):
+                if node.name in skip_tags:
+                    continue
+                stack.extend(reversed(node.contents))
+            elif isinstance(node, NavigableString) and type(node) in types:
+                yield node
+
+
+def ensure_document(html_or_document, url=None):
+    """
+    Zwróć ParsedDocument - parsuj tylko jeśli dostaliśmy surowy HTML.
+    Pozwala analyzerom przyjmować zarówno dokument, jak i string (kompatybilność wstecz).
+    """
+    if isinstance(html_or_document, ParsedDocument):
+        return html_or_document
+    return ParsedDocument(html_or_document, url)
@@ -0,0 +1,114 @@
+# page_store.py - Pamięć stron między audytami (ETag, Last-Modified, hash treści) dla audytów przyrostowych
+import os
+import requests
+from http_client import http_get
+from disk_cache import DiskCache
+from utils import normalize_url
+from config import REQUEST_TIMEOUT, CACHE_DIR, PAGE_STORE_TTL, PAGE_STORE_MAX_ENTRIES
+
+
+def _header(headers, name):
+    """Nagłówek bez względu na wielkość liter (headers może być zwykłym dict)"""
+    name = name.lower()
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+class PageStore:
+    """
+    Rekordy stron z poprzednich audytów, klucz: znormalizowany URL.
+
+    Rekord: {
+        'etag': str or None,
+        'last_modified': str or None,
+        'content_hash': str (ParsedDocument.content_hash),
+        ...dowolne dane wywołującego (np. page_data, summary, links)
+    }
+
+    Na tej podstawie kolejny audyt wysyła conditional GET (If-None-Match /
+    If-Modified-Since) i dla niezmienionych stron używa zapisanych wyników.
+
+    memo przechowuje wyniki etapów pipeline (Pipeline.run(memo=...)) kluczowane
+    fingerprintem ich wejść.
+    """
+
+    def __init__(self, directory=CACHE_DIR, ttl=PAGE_STORE_TTL, max_entries=PAGE_STORE_MAX_ENTRIES):
+        self.cache = DiskCache(os.path.join(directory, 'pages.sqlite'), ttl=ttl, max_entries=max_entries)
+        self.memo = DiskCache(os.path.join(directory, 'stage_outputs.sqlite'), ttl=ttl, max_entries=max_entries)
+
+    def get(self, url):
+        """Rekord strony z poprzedniego audytu lub None"""
+        return self.cache.get(normalize_url(url))
+
+    def save(self, url, headers, content_hash, **payload):
+        """
+        Zapisz stan strony po analizie
+
+        Args:
+            url: URL strony
+            headers: Nagłówki odpowiedzi (źródło ETag / Last-Modified)
+            content_hash: ParsedDocument.content_hash
+            **payload: Dodatkowe dane do ponownego użycia (page_data, summary, links...)
+        """
+        record = {
+            'etag': _header(headers, 'ETag'),
+            'last_modified': _header(headers, 'Last-Modified'),
+            'content_hash': content_hash
+        }
+        record.update(payload)
+        self.cache.set(normalize_url(url), record)
+
+    @staticmethod
+    def conditional_headers(record):
+        """Nagłówki conditional GET dla zapisanego rekordu (pusty dict jeśli brak walidatorów)"""
+        headers = {}
+        if record:
+            if record.get('etag'):
+                headers['If-None-Match'] = record['etag']
+            if record.get('last_modified'):
+                headers['If-Modified-Since'] = record['last_modified']
+        return headers
+
+
+def fetch_page(url, store, timeout=REQUEST_TIMEOUT):
+    """
+    Pobierz stronę conditional GET-em (odpowiednik utils.fetch_url dla audytów przyrostowych)
+
+    Przy 304 Not Modified body nie jest pobierane - page_data jest odtwarzane
+    z rekordu poprzedniego audytu, z nagłówkami zaktualizowanymi o te z 304
+    i aktualnym czasem odpowiedzi.
+
+    Returns:
+        dict: jak utils.fetch_url() + 'not_modified': bool
+              (page_data trzeba zapisać w store po analizie - patrz PageStore.save)
+    """
+    record = store.get(url)
+    cached_page = record.get('page_data') if record else None
+    conditional = store.conditional_headers(record) if cached_page else {}
+
+    try:
+        response = http_get(url, timeout=timeout, headers=conditional, allow_redirects=True)
+    except requests.exceptions.Timeout:
+        return {'success': False, 'error': 'Timeout'}
+    except requests.exceptions.RequestException as e:
+        return {'success': False, 'error': str(e)}
+
+    if response.status_code == 304 and cached_page:
+        page_data = dict(cached_page)
+        page_data['headers'] = {**cached_page.get('headers', {}), **dict(response.headers)}
+        page_data['elapsed'] = response.elapsed.total_seconds()
+        page_data['not_modified'] = True
+        print(f"[INCREMENTAL] 304 Not Modified: {url}")
+        return page_data
+
+    return {
+        'success': True,
+        'status_code': response.status_code,
+        'content': response.text,
+        'headers': dict(response.headers),
+        'url': response.url,
+        'elapsed': response.elapsed.total_seconds(),
+        'not_modified': False
+    }
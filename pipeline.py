@@ -0,0 +1,217 @@
+# pipeline.py - Mały silnik DAG do orkiestracji etapów audytu
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class StageFailed(Exception):
+    """Etap zakończył się porażką "biznesową" (np. AI nie wybrało stron) - bez tracebacku"""
+    pass
+
+
+class Stage:
+    """
+    Pojedynczy etap audytu.
+
+    Etap deklaruje nazwy wartości, których potrzebuje (inputs) i które produkuje
+    (outputs). Funkcja dostaje inputs jako keyword arguments. Jeśli etap ma
+    jeden output, zwraca po prostu wartość; przy kilku - dict {output: wartość}.
+
+    Etap z fingerprint może zostać pominięty, jeśli jego wejścia się nie zmieniły
+    od poprzedniego audytu - wynik jest wtedy brany z memo (patrz Pipeline.run).
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=None, label=None, weight=1, fingerprint=None):
+        """
+        Args:
+            name: Unikalna nazwa etapu
+            func: Callable(**inputs) -> wartość (lub dict dla wielu outputs)
+            inputs: Nazwy wymaganych wartości (outputs innych etapów lub wartości początkowe)
+            outputs: Nazwy produkowanych wartości (domyślnie: (name,))
+            label: Opis do progress events (domyślnie: name)
+            weight: Waga etapu w wyliczaniu procentu postępu (~ typowy czas trwania)
+            fingerprint: Optional callable(**inputs) -> str identyfikujący wejścia etapu
+                         (np. URL + hash treści); None = etap zawsze wykonywany
+        """
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs) if outputs else (name,)
+        self.label = label or name
+        self.weight = weight
+        self.fingerprint = fingerprint
+
+
+class PipelineResult:
+    """Wynik uruchomienia pipeline"""
+
+    def __init__(self):
+        self.values = {}  # nazwa outputu -> wartość
+        self.errors = {}  # nazwa etapu -> wyjątek
+        self.skipped = {}  # nazwa etapu -> powód (nieudana zależność)
+        self.timings = {}  # nazwa etapu -> czas w sekundach
+        self.reused = set()  # etapy, których wynik wzięto z memo
+
+    def ok(self, *names):
+        """Czy wszystkie podane outputy zostały wyprodukowane"""
+        return all(name in self.values for name in names)
+
+
+class Pipeline:
+    """
+    Uruchamia etapy w puli wątków, gdy tylko ich zależności są dostępne.
+
+    - Etapy bez wzajemnych zależności biegną równolegle
+    - Porażka etapu (wyjątek) pomija wszystkie etapy od niego zależne
+    - Postęp liczony jest z wag faktycznie zakończonych etapów
+    """
+
+    def __init__(self, stages, max_workers=8):
+        self.stages = list(stages)
+        self.max_workers = max_workers
+        self._producers = {}
+
+        for stage in self.stages:
+            for output in stage.outputs:
+                if output in self._producers:
+                    raise ValueError(f"Output '{output}' produced by both '{self._producers[output].name}' and '{stage.name}'")
+                self._producers[output] = stage
+
+    def _validate(self, initial):
+        """Sprawdź brakujące zależności i cykle przed startem"""
+        for stage in self.stages:
+            for name in stage.inputs:
+                if name not in self._producers and name not in initial:
+                    raise ValueError(f"Stage '{stage.name}' requires unknown input '{name}'")
+
+        # Topological sort (Kahn) - wykrywanie cykli
+        resolved = set(initial)
+        remaining = list(self.stages)
+        while remaining:
+            ready = [s for s in remaining if all(i in resolved for i in s.inputs)]
+            if not ready:
+                names = ', '.join(s.name for s in remaining)
+                raise ValueError(f"Dependency cycle between stages: {names}")
+            for stage in ready:
+                resolved.update(stage.outputs)
+                remaining.remove(stage)
+
+    def run(self, initial=None, progress_callback=None, progress_range=(0, 100), memo=None):
+        """
+        Uruchom pipeline
+
+        Args:
+            initial: dict wartości początkowych (np. {'url': ...})
+            progress_callback: Optional function(percent, message, details)
+            progress_range: (start, end) - zakres procentów raportowany przez ten pipeline
+            memo: Optional store z get(key)/set(key, value) (np. DiskCache) - wyniki etapów
+                  z fingerprint są tam zapisywane i używane ponownie przy tych samych wejściach
+
+        Returns:
+            PipelineResult
+        """
+        initial = dict(initial or {})
+        self._validate(initial)
+
+        result = PipelineResult()
+        result.values.update(initial)
+
+        total_weight = sum(stage.weight for stage in self.stages) or 1
+        done_weight = 0
+        start_percent, end_percent = progress_range
+        lock = threading.Lock()
+
+        def emit(message, details):
+            if progress_callback:
+                percent = start_percent + int((end_percent - start_percent) * done_weight / total_weight)
+                progress_callback(percent, message, details)
+
+        def memo_key(stage, kwargs):
+            if memo is None or stage.fingerprint is None:
+                return None
+            fingerprint = stage.fingerprint(**kwargs)
+            return f"{stage.name}:{fingerprint}" if fingerprint else None
+
+        def execute(stage):
+            kwargs = {name: result.values[name] for name in stage.inputs}
+            started = time.time()
+            try:
+                key = memo_key(stage, kwargs)
+                if key:
+                    cached = memo.get(key)
+                    if cached is not None:
+                        with lock:
+                            result.reused.add(stage.name)
+                        return cached
+
+                value = stage.func(**kwargs)
+                if key:
+                    memo.set(key, value)
+                return value
+            finally:
+                with lock:
+                    result.timings[stage.name] = round(time.time() - started, 3)
+
+        pending = list(self.stages)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # Pomiń etapy, których zależności się nie powiodły (tranzytywnie)
+                changed = True
+                while changed:
+                    changed = False
+                    for stage in list(pending):
+                        failed = [
+                            name for name in stage.inputs
+                            if name not in result.values and self._is_dead(self._producers[name].name, result)
+                        ]
+                        if failed:
+                            pending.remove(stage)
+                            result.skipped[stage.name] = f"missing input: {', '.join(failed)}"
+                            done_weight += stage.weight
+                            changed = True
+
+                # Uruchom etapy z kompletem zależności
+                for stage in list(pending):
+                    if all(name in result.values for name in stage.inputs):
+                        pending.remove(stage)
+                        emit(f"{stage.label}...", {'stage': stage.name, 'status': 'started'})
+                        # Etap działa w kontekście wywołującego (contextvars, np. rate_limiter.report_waits)
+                        running[executor.submit(contextvars.copy_context().run, execute, stage)] = stage
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    done_weight += stage.weight
+                    try:
+                        value = future.result()
+                        if len(stage.outputs) == 1:
+                            result.values[stage.outputs[0]] = value
+                        else:
+                            for output in stage.outputs:
+                                result.values[output] = value[output]
+                        status = 'reused' if stage.name in result.reused else 'completed'
+                    except StageFailed as e:
+                        print(f"  Warning: stage '{stage.name}' failed: {e}")
+                        result.errors[stage.name] = e
+                        status = 'failed'
+                    except Exception as e:
+                        print(f"  ERROR in stage '{stage.name}': {e}")
+                        import traceback
+                        traceback.print_exception(type(e), e, e.__traceback__)
+                        result.errors[stage.name] = e
+                        status = 'failed'
+
+                    emit(f"{stage.label}: {status} ({result.timings.get(stage.name, 0):.1f}s)",
+                         {'stage': stage.name, 'status': status, 'duration': result.timings.get(stage.name)})
+
+        return result
+
+    @staticmethod
+    def _is_dead(stage_name, result):
+        return stage_name in result.errors or stage_name in result.skipped
@@ -0,0 +1,247 @@
+# rate_limiter.py - Token bucket w SQLite (limit zapytań do API wspólny dla workerów gunicorna)
+import os
+import time
+import random
+import email.utils
+import threading
+import contextvars
+from contextlib import contextmanager
+from disk_cache import open_connection
+from config import CACHE_DIR
+
+# Kto słucha o czasie oczekiwania na limit (ustawiane per audyt - patrz report_waits)
+_wait_listener = contextvars.ContextVar('rate_limit_wait_listener', default=None)
+
+# Oczekiwania krótsze niż to nie są raportowane w postępie audytu (s)
+REPORT_WAIT_THRESHOLD = 1.0
+
+
+class RateLimitTimeout(Exception):
+    """Token nie był dostępny w max_wait sekund"""
+
+
+class RateLimiter:
+    """
+    Token bucket per nazwa (np. 'gemini:<hash klucza>'), stan w pliku SQLite.
+
+    - rate: tokeny na sekundę, capacity: maks. seria zapytań naraz
+    - stan jest wspólny dla wszystkich procesów (BEGIN IMMEDIATE = jeden zapis naraz)
+    - pause(): po 429/503 wstrzymuje kubełek dla wszystkich workerów
+
+    Błędy SQLite nie przerywają audytu - zapytanie przechodzi wtedy bez limitu.
+
+    Użycie:
+        waited = rate_limiter.acquire('gemini:abc', rate=10 / 60, capacity=3, label='Gemini')
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, 'rate_limits.sqlite')
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = open_connection(self.path)
+            self._local.connection = connection
+
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    connection.execute("""
+                        CREATE TABLE IF NOT EXISTS daily_usage (
+                            name TEXT NOT NULL,
+                            day TEXT NOT NULL,
+                            count INTEGER NOT NULL,
+                            PRIMARY KEY (name, day)
+                        )
+                    """)
+                    connection.execute("""
+                        CREATE TABLE IF NOT EXISTS buckets (
+                            name TEXT PRIMARY KEY,
+                            tokens REAL NOT NULL,
+                            updated_at REAL NOT NULL,
+                            blocked_until REAL NOT NULL DEFAULT 0
+                        )
+                    """)
+                    self._initialized = True
+        return connection
+
+    def acquire(self, bucket, rate, capacity, max_wait=None, label=None):
+        """
+        Pobierz token, czekając na jego dostępność
+
+        Args:
+            bucket: Nazwa kubełka (np. usługa + hash klucza API)
+            rate: Tokeny na sekundę
+            capacity: Pojemność kubełka (maks. seria)
+            max_wait: Maks. łączny czas oczekiwania w sekundach (None = bez limitu)
+            label: Nazwa usługi w komunikatach postępu (np. 'Gemini')
+
+        Returns:
+            float: Łączny czas oczekiwania w sekundach
+
+        Raises:
+            RateLimitTimeout: token niedostępny w max_wait sekund
+        """
+        started = time.time()
+        while True:
+            try:
+                wait = self._take(bucket, rate, capacity)
+            except Exception as e:
+                print(f"[RATE LIMIT] Warning: limiter unavailable ({self.path}): {e}")
+                return time.time() - started
+
+            if wait <= 0:
+                return time.time() - started
+
+            waited = time.time() - started
+            if max_wait is not None and waited + wait > max_wait:
+                raise RateLimitTimeout(
+                    f"{label or bucket}: rate limit wait exceeded {max_wait}s (next token in {wait:.0f}s)"
+                )
+
+            if wait >= REPORT_WAIT_THRESHOLD:
+                _notify_wait(wait, label or bucket)
+            # Krótkie drzemki - inny proces mógł w międzyczasie zmienić stan (np. pause)
+            time.sleep(min(wait, 5) + random.uniform(0, 0.05))
+
+    def _take(self, bucket, rate, capacity):
+        """Spróbuj pobrać token. Returns: 0 jeśli pobrany, inaczej ile sekund czekać"""
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            row = connection.execute(
+                'SELECT tokens, updated_at, blocked_until FROM buckets WHERE name = ?', (bucket,)
+            ).fetchone()
+            tokens, updated_at, blocked_until = row if row else (capacity, now, 0)
+
+            tokens = min(capacity, tokens + max(0, now - updated_at) * rate)
+            if now < blocked_until:
+                wait = blocked_until - now
+            elif tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+
+            connection.execute(
+                'INSERT OR REPLACE INTO buckets (name, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?)',
+                (bucket, tokens, now, blocked_until)
+            )
+            connection.execute('COMMIT')
+            return wait
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def consume_daily(self, bucket, limit):
+        """
+        Zużyj jedno zapytanie z dziennej kwoty
+
+        Doba liczona jak w Google Cloud (reset o północy czasu pacyficznego, bez DST).
+
+        Returns:
+            bool: False jeśli dzienna kwota jest wyczerpana
+        """
+        day = time.strftime('%Y-%m-%d', time.gmtime(time.time() - 8 * 3600))
+        try:
+            connection = self._connect()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = connection.execute(
+                    'SELECT count FROM daily_usage WHERE name = ? AND day = ?', (bucket, day)
+                ).fetchone()
+                count = row[0] if row else 0
+                if count >= limit:
+                    connection.execute('COMMIT')
+                    return False
+
+                connection.execute(
+                    'INSERT OR REPLACE INTO daily_usage (name, day, count) VALUES (?, ?, ?)',
+                    (bucket, day, count + 1)
+                )
+                connection.execute('DELETE FROM daily_usage WHERE day < ?', (day,))
+                connection.execute('COMMIT')
+                return True
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        except Exception as e:
+            print(f"[RATE LIMIT] Warning: daily quota unavailable ({self.path}): {e}")
+            return True
+
+    def pause(self, bucket, seconds):
+        """Wstrzymaj kubełek na seconds sekund (dla wszystkich procesów), np. po 429"""
+        try:
+            connection = self._connect()
+            now = time.time()
+            connection.execute(
+                'INSERT OR IGNORE INTO buckets (name, tokens, updated_at, blocked_until) VALUES (?, 0, ?, 0)',
+                (bucket, now)
+            )
+            connection.execute(
+                'UPDATE buckets SET blocked_until = MAX(blocked_until, ?) WHERE name = ?',
+                (now + seconds, bucket)
+            )
+        except Exception as e:
+            print(f"[RATE LIMIT] Warning: pause failed ({self.path}): {e}")
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0, retry_after=None):
+    """
+    Exponential backoff z pełnym jitterem (losowo 0..base*2^attempt, maks. cap)
+
+    Jitter rozprasza ponowienia wielu workerów, które dostały 429 w tej samej chwili.
+    retry_after (s, z nagłówka Retry-After) jest dolną granicą opóźnienia.
+    """
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def parse_retry_after(value):
+    """Nagłówek Retry-After (sekundy lub data HTTP) -> sekundy, None jeśli brak / niepoprawny"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+@contextmanager
+def report_waits(listener):
+    """
+    Zgłaszaj oczekiwanie na limit w tym kontekście (np. jako zdarzenia postępu audytu)
+
+    Args:
+        listener: function(seconds, label) - wywoływana przed każdym dłuższym oczekiwaniem
+
+    Pipeline uruchamia etapy w kontekście wywołującego, więc listener działa też w etapach.
+    """
+    token = _wait_listener.set(listener)
+    try:
+        yield
+    finally:
+        _wait_listener.reset(token)
+
+
+def _notify_wait(seconds, label):
+    listener = _wait_listener.get()
+    if listener:
+        try:
+            listener(seconds, label)
+        except Exception as e:
+            print(f"[RATE LIMIT] Warning: wait listener failed: {e}")
+
+
+# Limiter współdzielony przez moduł AI (i inne klienty API) w procesie
+rate_limiter = RateLimiter()
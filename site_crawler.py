@@ -1,69 +1,59 @@
 # site_crawler.py
 # Multi-Page Intelligent Site Crawler for SEO AIditor
 
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin, urlparse, urldefrag
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from collections import deque
+import hashlib
+import threading
 import time
 from utils import validate_url
-from config import REQUEST_TIMEOUT, USER_AGENT
-
-def crawl_homepage(url):
+from page_document import ParsedDocument, ensure_document
+from site_resources import SiteResources
+from http_client import http_get
+import async_fetcher
+from config import (
+    REQUEST_TIMEOUT, USER_AGENT, FETCH_MAX_BODY_BYTES,
+    CRAWL_MAX_PAGES, CRAWL_MAX_DEPTH, CRAWL_DELAY, CRAWL_CONCURRENCY, CRAWL_IGNORE_QUERY
+)
+
+def extract_internal_links(url, document, limit=100):
     """
-    Fetch homepage HTML and extract internal links
+    Extract internal links from an already fetched & parsed page (no extra request)
+
+    Args:
+        url: Page URL (base for relative links and internal-domain check)
+        document: ParsedDocument (or raw HTML string)
+        limit: Max number of links returned (for AI processing)
 
     Returns:
-        dict: {
-            'success': bool,
-            'html': str,
-            'links': list,
-            'error': str (if failed)
-        }
+        list: Unique absolute internal URLs (without query/fragment)
     """
-    try:
-        headers = {'User-Agent': USER_AGENT}
-        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
-
-        html = response.text
-        soup = BeautifulSoup(html, 'html.parser')
-
-        # Extract internal links
-        base_domain = urlparse(url).netloc
-        internal_links = set()
-
-        for link in soup.find_all('a', href=True):
-            href = link['href']
-            absolute_url = urljoin(url, href)
-
-            # Only internal links, no anchors, no duplicates
-            parsed = urlparse(absolute_url)
-            if parsed.netloc == base_domain:
-                # Remove fragment and query params for cleaner URLs
-                clean_url = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
-                if clean_url != url and clean_url.startswith('http'):
-                    internal_links.add(clean_url)
-
-        return {
-            'success': True,
-            'html': html,
-            'links': list(internal_links)[:100],  # Limit to 100 links for AI processing
-            'status_code': response.status_code
-        }
+    document = ensure_document(document, url)
 
-    except Exception as e:
-        return {
-            'success': False,
-            'error': str(e),
-            'html': '',
-            'links': []
-        }
+    base_domain = urlparse(url).netloc
+    internal_links = set()
+
+    for href in document.links:
+        absolute_url = urljoin(url, href)
+
+        # Only internal links, no anchors, no duplicates
+        parsed = urlparse(absolute_url)
+        if parsed.netloc == base_domain:
+            # Remove fragment and query params for cleaner URLs
+            clean_url = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+            if clean_url != url and clean_url.startswith('http'):
+                internal_links.add(clean_url)
+
+    return list(internal_links)[:limit]
 
 
 def fetch_selected_pages(urls, timeout_per_page=10):
     """
-    Fetch multiple pages in parallel using ThreadPoolExecutor
+    Fetch multiple pages in parallel
+
+    Uses the asyncio engine (async_fetcher) when aiohttp is installed,
+    otherwise falls back to a ThreadPoolExecutor over the pooled HTTP session.
 
     Args:
         urls: list of URLs to fetch
@@ -77,12 +67,14 @@ def fetch_selected_pages(urls, timeout_per_page=10):
             'error': str (if failed)
         }]
     """
+    if async_fetcher.is_available():
+        return async_fetcher.fetch_pages(urls, timeout_per_page=timeout_per_page)
+
     results = []
 
     def fetch_single_page(url):
         try:
-            headers = {'User-Agent': USER_AGENT}
-            response = requests.get(url, headers=headers, timeout=timeout_per_page)
+            response = http_get(url, timeout=timeout_per_page)
             response.raise_for_status()
 
             return {
@@ -119,75 +111,301 @@ def fetch_selected_pages(urls, timeout_per_page=10):
     return results
 
 
-def attempt_sitemap_fetch(url):
+class SeenSet:
     """
-    Try to fetch sitemap.xml to help with page discovery
+    Compact set of visited URLs for large crawls
 
-    Returns:
-        list: URLs found in sitemap (or empty list if not available)
+    Stores 8-byte blake2b digests instead of full URL strings
+    (~10x less memory at 100k URLs, collision risk negligible).
     """
-    try:
-        parsed = urlparse(url)
-        sitemap_url = f"{parsed.scheme}://{parsed.netloc}/sitemap.xml"
 
-        headers = {'User-Agent': USER_AGENT}
-        response = requests.get(sitemap_url, headers=headers, timeout=5)
+    def __init__(self):
+        self._digests = set()
+
+    @staticmethod
+    def _digest(url):
+        return hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
 
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            urls = [loc.text for loc in soup.find_all('loc')]
-            return urls[:50]  # Limit to 50 URLs
+    def add(self, url):
+        """Add URL - returns True if it was not seen before"""
+        digest = self._digest(url)
+        if digest in self._digests:
+            return False
+        self._digests.add(digest)
+        return True
 
-        return []
+    def __contains__(self, url):
+        return self._digest(url) in self._digests
 
-    except:
-        return []
+    def __len__(self):
+        return len(self._digests)
 
 
-def extract_page_metadata(html):
+def normalize_crawl_url(href, base_url, ignore_query=CRAWL_IGNORE_QUERY):
     """
-    Extract basic metadata from HTML for AI context
+    Resolve a link against base_url and normalize it for deduplication
 
     Returns:
-        dict: {
-            'title': str,
-            'meta_description': str,
-            'h1': list,
-            'word_count': int
-        }
+        str or None: Absolute http(s) URL without fragment (and query if ignore_query)
+    """
+    absolute_url, _ = urldefrag(urljoin(base_url, href))
+    parsed = urlparse(absolute_url)
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+        return None
+
+    path = parsed.path or '/'
+    query = '' if ignore_query or not parsed.query else f"?{parsed.query}"
+    return f"{parsed.scheme}://{parsed.netloc.lower()}{path}{query}"
+
+
+def _fetch_crawl_page(url, depth, not_before, timeout, page_store=None):
+    """
+    Fetch a single page for the crawler (waits for its politeness slot first)
+
+    With page_store, pages analyzed in a previous crawl are requested with a
+    conditional GET; on 304 the page is returned without body as
+    {'success': True, 'not_modified': True, 'record': <stored record>}.
     """
+    delay = not_before - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+    page = {'url': url, 'depth': depth, 'success': False, 'html': ''}
+    record = page_store.get(url) if page_store else None
+    conditional = page_store.conditional_headers(record) if record and 'summary' in record else {}
     try:
-        soup = BeautifulSoup(html, 'html.parser')
+        with http_get(url, timeout=timeout, headers=conditional, allow_redirects=True, stream=True) as response:
+            content_type = response.headers.get('Content-Type', '')
+            page.update({
+                'status_code': response.status_code,
+                'final_url': response.url,
+                'headers': dict(response.headers),
+                'elapsed': response.elapsed.total_seconds(),
+                'content_type': content_type
+            })
+
+            if response.status_code == 304 and conditional:
+                page.update({
+                    'success': True,
+                    'not_modified': True,
+                    'record': record,
+                    'final_url': record.get('final_url') or response.url
+                })
+                return page
+
+            if response.status_code >= 400:
+                page['error'] = f"HTTP {response.status_code}"
+                return page
+            if 'html' not in content_type.lower():
+                page['error'] = f"Not HTML ({content_type or 'unknown'})"
+                return page
+
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                body.extend(chunk)
+                if len(body) >= FETCH_MAX_BODY_BYTES:
+                    del body[FETCH_MAX_BODY_BYTES:]
+                    page['truncated'] = True
+                    break
+
+        encoding = response.encoding if 'charset' in content_type.lower() else 'utf-8'
+        try:
+            page['html'] = body.decode(encoding or 'utf-8', errors='replace')
+        except LookupError:
+            page['html'] = body.decode('utf-8', errors='replace')
+        page['success'] = True
 
-        # Title
-        title = soup.find('title')
-        title_text = title.get_text(strip=True) if title else ''
+    except Exception as e:
+        page['error'] = str(e)
 
-        # Meta description
-        meta_desc = soup.find('meta', attrs={'name': 'description'})
-        meta_desc_text = meta_desc.get('content', '') if meta_desc else ''
+    return page
 
-        # H1 tags
-        h1_tags = [h1.get_text(strip=True) for h1 in soup.find_all('h1')]
 
-        # Word count (approximate)
-        text = soup.get_text()
-        word_count = len(text.split())
+def _submit_async_crawl_page(fetcher, url, depth, not_before, page_store=None):
+    """
+    Async variant of _fetch_crawl_page: the request runs on the fetcher's shared event loop
 
-        return {
-            'title': title_text,
-            'meta_description': meta_desc_text,
-            'h1': h1_tags,
-            'word_count': word_count
-        }
+    Returns:
+        concurrent.futures.Future resolving to the same page dict as _fetch_crawl_page()
+    """
+    record = page_store.get(url) if page_store else None
+    conditional = page_store.conditional_headers(record) if record and 'summary' in record else {}
+
+    async def fetch():
+        fetched = await fetcher.fetch(url, headers=conditional or None, delay=not_before - time.monotonic(),
+                                      check_status=False, html_only=True)
+        return _crawl_page_from_fetch(url, depth, fetched, record, conditional)
+
+    return async_fetcher.submit(fetch())
+
+
+def _crawl_page_from_fetch(url, depth, fetched, record, conditional):
+    """Crawler page dict (as _fetch_crawl_page) from an AsyncFetcher.fetch() result"""
+    page = {'url': url, 'depth': depth, 'success': False, 'html': ''}
+    if 'status_code' not in fetched:
+        page['error'] = fetched.get('error')
+        return page
+
+    status_code = fetched['status_code']
+    content_type = fetched['content_type']
+    page.update({
+        'status_code': status_code,
+        'final_url': fetched['final_url'],
+        'headers': fetched['headers'],
+        'elapsed': fetched['elapsed'],
+        'content_type': content_type
+    })
+
+    if status_code == 304 and conditional:
+        page.update({
+            'success': True,
+            'not_modified': True,
+            'record': record,
+            'final_url': record.get('final_url') or fetched['final_url']
+        })
+        return page
+
+    if status_code >= 400:
+        page['error'] = f"HTTP {status_code}"
+        return page
+    if 'html' not in content_type.lower():
+        page['error'] = f"Not HTML ({content_type or 'unknown'})"
+        return page
+
+    page['html'] = fetched['html']
+    if fetched.get('truncated'):
+        page['truncated'] = True
+    page['success'] = True
+    return page
+
+
+def crawl_site(start_url, max_pages=CRAWL_MAX_PAGES, max_depth=CRAWL_MAX_DEPTH,
+               delay=CRAWL_DELAY, concurrency=CRAWL_CONCURRENCY, respect_robots=True,
+               timeout=REQUEST_TIMEOUT, site=None, page_store=None):
+    """
+    Breadth-first crawl of a whole site - a generator yielding pages as they arrive
+
+    Pages are NOT collected in memory: each page is yielded to the caller
+    (analyzers) as soon as it is fetched. The frontier only holds URLs that
+    will actually be fetched, and visited URLs are kept in a compact SeenSet.
+
+    Requests run on the asyncio engine (async_fetcher, one session for the whole
+    crawl) when aiohttp is installed, otherwise on a thread pool.
 
-    except:
-        return {
-            'title': '',
-            'meta_description': '',
-            'h1': [],
-            'word_count': 0
+    Args:
+        start_url: Homepage URL (crawl stays on this host and the host it redirects to)
+        max_pages: Max number of pages to fetch
+        max_depth: Max link depth from start_url (0 = only start_url)
+        delay: Politeness delay between requests to the host (seconds);
+               robots.txt Crawl-delay is honored if larger
+        concurrency: Max requests in flight
+        respect_robots: Skip URLs disallowed by robots.txt
+        timeout: Per-page timeout
+        site: SiteResources of the current audit (robots.txt already fetched is reused)
+        page_store: PageStore for incremental crawls - unchanged pages (304) are not
+                    downloaded, their links come from the previous crawl
+
+    Yields:
+        dict: {
+            'url': str, 'depth': int, 'success': bool,
+            'status_code': int, 'final_url': str, 'headers': dict, 'elapsed': float,
+            'html': str, 'document': ParsedDocument (successful HTML pages),
+            'not_modified': bool, 'record': dict (304 with page_store - no html/document),
+            'error': str (if failed)
         }
+    """
+    start_url = normalize_crawl_url(start_url, start_url)
+    host = urlparse(start_url).netloc
+
+    # Crawled hosts -> RobotsRules (None = robots.txt not checked). A homepage redirecting
+    # to another host (apex <-> www) adds that host - links are resolved against final_url
+    robots = {host: None}
+    if respect_robots:
+        robots[host] = (site or SiteResources(start_url)).robots()['rules']
+        robots_delay = robots[host].crawl_delay(USER_AGENT)
+        if robots_delay:
+            delay = max(delay, float(robots_delay))
+
+    seen = SeenSet()
+    seen.add(start_url)
+    frontier = deque([(start_url, 0)])
+    scheduled = 0
+    next_slot = time.monotonic()
+    blocked = 0
+
+    fetcher = None
+    executor = None
+    if async_fetcher.is_available():
+        # Single host - the politeness delay (not per_host) spaces the requests
+        fetcher = async_fetcher.AsyncFetcher(concurrency=concurrency, per_host=concurrency, timeout=timeout).open()
+    else:
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+    in_flight = {}
+
+    try:
+        while frontier or in_flight:
+            # Fill the request window, respecting per-host politeness delay
+            while frontier and len(in_flight) < concurrency and scheduled < max_pages:
+                url, depth = frontier.popleft()
+                not_before = max(next_slot, time.monotonic())
+                next_slot = not_before + delay
+                if fetcher:
+                    future = _submit_async_crawl_page(fetcher, url, depth, not_before, page_store)
+                else:
+                    future = executor.submit(_fetch_crawl_page, url, depth, not_before, timeout, page_store)
+                in_flight[future] = url
+                scheduled += 1
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight.pop(future)
+                page = future.result()
+
+                if page['success'] and page['depth'] == 0:
+                    final_url = normalize_crawl_url(page.get('final_url') or start_url, start_url)
+                    final_host = urlparse(final_url).netloc if final_url else host
+                    if final_host not in robots:
+                        print(f"[CRAWL] Homepage redirected to {final_host} - crawling that host too")
+                        robots[final_host] = SiteResources(final_url).robots()['rules'] if respect_robots else None
+                    if final_url:
+                        seen.add(final_url)
+
+                if page['success']:
+                    if page.get('not_modified'):
+                        hrefs = page['record'].get('links', [])
+                    else:
+                        page['document'] = ParsedDocument(page['html'], page['url'])
+                        hrefs = page['document'].links
+
+                    if page['depth'] < max_depth:
+                        base_url = page.get('final_url') or page['url']
+                        for href in hrefs:
+                            # Enough URLs queued to reach max_pages - stop growing the frontier
+                            if scheduled + len(frontier) >= max_pages:
+                                break
+                            link = normalize_crawl_url(href, base_url)
+                            if not link or urlparse(link).netloc not in robots or not seen.add(link):
+                                continue
+                            rules = robots[urlparse(link).netloc]
+                            if rules and not rules.can_fetch(link, USER_AGENT):
+                                blocked += 1
+                                continue
+                            frontier.append((link, page['depth'] + 1))
+
+                yield page
+    finally:
+        # Caller stopped early (generator closed) - drop requests still waiting for their slot
+        for future in in_flight:
+            future.cancel()
+        if fetcher:
+            fetcher.close()
+        if executor:
+            executor.shutdown(wait=True)
+
+    print(f"[CRAWL] Done: {scheduled} pages fetched, {len(seen)} URLs seen, {blocked} blocked by robots.txt")
 
 
 # Test
@@ -195,12 +413,9 @@ if __name__ == '__main__':
     test_url = "https://example.com"
 
     print(f"[TEST] Crawling {test_url}...")
-    result = crawl_homepage(test_url)
-
-    if result['success']:
-        print(f"[OK] Homepage fetched successfully")
-        print(f"  - HTML length: {len(result['html'])} chars")
-        print(f"  - Internal links found: {len(result['links'])}")
-        print(f"  - First 5 links: {result['links'][:5]}")
-    else:
-        print(f"[ERROR] Failed: {result['error']}")
+    for page in crawl_site(test_url, max_pages=5, max_depth=1):
+        if page['success']:
+            links = extract_internal_links(page['url'], page['document']) if page.get('document') else []
+            print(f"[OK] {page['url']} ({page['status_code']}, {len(page['html'])} chars, {len(links)} internal links)")
+        else:
+            print(f"[ERROR] {page['url']}: {page.get('error')}")
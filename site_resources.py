@@ -0,0 +1,271 @@
+# site_resources.py - Zasoby witryny pobierane raz na audyt (robots.txt, sitemapy, homepage)
+import re
+import threading
+from urllib.parse import urlparse, urljoin
+from utils import fetch_url
+from page_store import fetch_page
+from http_client import http_get
+from sitemap_parser import summarize_sitemap
+from config import USER_AGENT, SITEMAP_MAX_FILES, SITEMAP_QUICK_MAX_FILES
+
+# Ile URLi z sitemapy zachować w 'sample_urls' (próbka do raportu i odkrywania podstron)
+SITEMAP_SAMPLE_SIZE = 100
+
+
+class RobotsRules:
+    """
+    Parser i matcher robots.txt zgodny z RFC 9309 (tak jak interpretuje go Google):
+
+    - grupy per user-agent; wybierana jest najbardziej szczegółowa pasująca grupa,
+      grupy o tym samym user-agent są łączone, '*' tylko gdy nic innego nie pasuje
+    - wygrywa najdłuższa pasująca reguła; przy remisie Allow ma pierwszeństwo
+    - wildcardy '*' i '$' (koniec URLa)
+    - /robots.txt jest zawsze dozwolony
+
+    (urllib.robotparser stosuje pierwszą pasującą regułę i nie obsługuje wildcardów)
+    """
+
+    def __init__(self, content=''):
+        self.groups = {}  # user-agent (lowercase) -> [(allow, pattern, regex)]
+        self.crawl_delays = {}  # user-agent (lowercase) -> float
+        self.sitemaps = []
+        self._parse(content or '')
+
+    def _parse(self, content):
+        agents = []
+        in_rules = False  # czy bieżąca grupa ma już reguły (kolejny user-agent = nowa grupa)
+
+        for line in content.splitlines():
+            line = line.split('#', 1)[0].strip()
+            if ':' not in line:
+                continue
+            field, value = line.split(':', 1)
+            field = field.strip().lower()
+            value = value.strip()
+
+            if field == 'user-agent':
+                if in_rules:
+                    agents = []
+                    in_rules = False
+                agent = value.lower()
+                agents.append(agent)
+                self.groups.setdefault(agent, [])
+            elif field in ('allow', 'disallow'):
+                in_rules = True
+                if not value:
+                    continue  # Pusty Disallow = brak ograniczeń
+                rule = (field == 'allow', value, self._compile(value))
+                for agent in agents:
+                    self.groups[agent].append(rule)
+            elif field == 'crawl-delay':
+                in_rules = True
+                try:
+                    delay = float(value)
+                except ValueError:
+                    continue
+                for agent in agents:
+                    self.crawl_delays[agent] = delay
+            elif field == 'sitemap':
+                # Sitemap nie należy do grupy - nie przerywa jej
+                if value:
+                    self.sitemaps.append(value)
+
+    @staticmethod
+    def _compile(pattern):
+        anchored = pattern.endswith('$')
+        if anchored:
+            pattern = pattern[:-1]
+        regex = '.*'.join(re.escape(part) for part in pattern.split('*'))
+        return re.compile(regex + ('$' if anchored else ''))
+
+    def _group_agent(self, user_agent):
+        """Klucz grupy dla user_agent: najdłuższy token user-agent zawarty w nazwie bota, inaczej '*'"""
+        user_agent = (user_agent or '*').lower()
+        matches = [agent for agent in self.groups if agent != '*' and agent in user_agent]
+        if matches:
+            return max(matches, key=len)
+        return '*' if '*' in self.groups else None
+
+    def can_fetch(self, url, user_agent=USER_AGENT):
+        """Czy user_agent może pobrać url (pełny URL lub ścieżka)"""
+        parsed = urlparse(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        if path == '/robots.txt':
+            return True
+
+        agent = self._group_agent(user_agent)
+        if agent is None:
+            return True
+
+        best_length = -1
+        allowed = True
+        for allow, pattern, regex in self.groups[agent]:
+            if regex.match(path):
+                length = len(pattern)
+                if length > best_length or (length == best_length and allow):
+                    best_length = length
+                    allowed = allow
+        return allowed
+
+    def crawl_delay(self, user_agent=USER_AGENT):
+        """Crawl-delay dla user_agent (None jeśli brak)"""
+        agent = self._group_agent(user_agent)
+        return self.crawl_delays.get(agent) if agent else None
+
+    def blocks_all(self, user_agent='*'):
+        """Czy robots.txt blokuje stronę główną (= praktycznie całą witrynę) dla user_agent"""
+        return not self.can_fetch('/', user_agent)
+
+
+class SiteResources:
+    """
+    Zasoby witryny współdzielone przez etapy jednego audytu.
+
+    robots.txt, sitemapy (zadeklarowane w robots.txt, domyślnie /sitemap.xml)
+    i homepage są pobierane leniwie, dokładnie raz - także gdy kilka etapów
+    pipeline poprosi o nie równocześnie. Obiekt żyje tyle co audyt.
+
+    Sitemap index jest domyślnie sprawdzany tylko pobieżnie (index + pierwszy plik
+    podrzędny) - pełne podsumowanie (do SITEMAP_MAX_FILES plików) tylko z full_sitemap
+    (multi-page / crawl) lub sitemap(full=True).
+
+    Użycie:
+        site = SiteResources(url)
+        site.robots()['rules'].can_fetch(link)
+        site.sitemap()['url_count']
+    """
+
+    def __init__(self, url, page_store=None, full_sitemap=False):
+        """
+        Args:
+            url: URL audytowanej strony
+            page_store: PageStore - homepage pobierana conditional GET-em (audyt przyrostowy)
+            full_sitemap: sitemap() domyślnie pobiera wszystkie pliki sitemap index
+        """
+        parsed = urlparse(url)
+        self.url = url
+        self.page_store = page_store
+        self.full_sitemap = full_sitemap
+        self.origin = f"{parsed.scheme}://{parsed.netloc}"
+        self._values = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _once(self, name, loader):
+        """Wywołaj loader tylko raz (thread-safe); kolejni wołający czekają na wynik"""
+        with self._lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self._values:
+                self._values[name] = loader()
+            return self._values[name]
+
+    def homepage(self, page_data=None):
+        """
+        Wynik utils.fetch_url() dla strony głównej (page_store.fetch_page() w audycie przyrostowym)
+
+        Args:
+            page_data: Już pobrana strona - zostaje zapamiętana zamiast ponownego pobrania
+        """
+        def load():
+            if page_data is not None:
+                return page_data
+            if self.page_store is not None:
+                return fetch_page(self.url, self.page_store)
+            return fetch_url(self.url)
+
+        return self._once('homepage', load)
+
+    def robots(self):
+        """
+        Returns:
+            dict: {
+                'url': str,
+                'status_code': int or None,
+                'exists': bool,
+                'content': str,
+                'rules': RobotsRules (pusty = wszystko dozwolone),
+                'error': str (jeśli nie udało się pobrać)
+            }
+        """
+        return self._once('robots', self._load_robots)
+
+    def _load_robots(self):
+        robots_url = urljoin(self.origin, '/robots.txt')
+        result = {'url': robots_url, 'status_code': None, 'exists': False, 'content': ''}
+        try:
+            response = http_get(robots_url, timeout=5)
+            result['status_code'] = response.status_code
+            if response.status_code == 200:
+                result['exists'] = True
+                result['content'] = response.text
+        except Exception as e:
+            result['error'] = str(e)
+
+        result['rules'] = RobotsRules(result['content'])
+        return result
+
+    def sitemap_urls(self):
+        """Sitemapy zadeklarowane w robots.txt (bez duplikatów) lub domyślnie /sitemap.xml"""
+        declared = list(dict.fromkeys(self.robots()['rules'].sitemaps))
+        return declared or [urljoin(self.origin, '/sitemap.xml')]
+
+    def sitemap(self, full=None):
+        """
+        Zagregowane podsumowanie wszystkich sitemap witryny (sitemap_parser.summarize_sitemap)
+
+        Args:
+            full: Pobierz wszystkie pliki sitemap index (None = full_sitemap z konstruktora);
+                  False = index + pierwszy plik podrzędny każdej sitemapy (szybko, na ścieżce krytycznej audytu)
+
+        Returns:
+            dict: pola summarize_sitemap() zsumowane po sitemapach + 'sitemaps': [URL]
+                  + 'complete': bool (False = część plików sitemap index nie była pobrana)
+        """
+        full = self.full_sitemap if full is None else full
+        if full:
+            return self._once('sitemap_full', lambda: self._load_sitemap(SITEMAP_MAX_FILES))
+        if 'sitemap_full' in self._values:
+            return self._values['sitemap_full']
+        return self._once('sitemap', lambda: self._load_sitemap(SITEMAP_QUICK_MAX_FILES))
+
+    def _load_sitemap(self, files_per_sitemap):
+        sitemap_urls = self.sitemap_urls()
+        summaries = []
+        files_left = SITEMAP_MAX_FILES
+        for sitemap_url in sitemap_urls:
+            if files_left <= 0:
+                break
+            summary = summarize_sitemap(sitemap_url, max_files=min(files_left, files_per_sitemap),
+                                        sample_size=SITEMAP_SAMPLE_SIZE)
+            files_left -= summary['files']
+            summaries.append(summary)
+        quick = files_per_sitemap < SITEMAP_MAX_FILES
+
+        # Pierwsza istniejąca sitemapa określa status/błąd (pozostałe mogą być np. 404)
+        primary = next((s for s in summaries if s['valid']), None) \
+            or next((s for s in summaries if s['exists']), summaries[0])
+
+        result = dict(primary)
+        result.update({
+            'sitemaps': sitemap_urls,
+            'valid': any(s['valid'] for s in summaries),
+            'is_index': any(s['is_index'] for s in summaries),
+            'files': sum(s['files'] for s in summaries),
+            'files_skipped': sum(s['files_skipped'] for s in summaries),
+            'child_sitemaps': sum(s['child_sitemaps'] for s in summaries),
+            'url_count': sum(s['url_count'] for s in summaries),
+            'invalid_urls': sum(s['invalid_urls'] for s in summaries),
+            'oversized_files': [f for s in summaries for f in s['oversized_files']],
+            'sample_urls': [u for s in summaries for u in s['sample_urls']][:SITEMAP_SAMPLE_SIZE],
+            # Limit plików w trybie pobieżnym to nie błąd witryny - widać go w 'complete'
+            'errors': [e for s in summaries for e in s['errors'] if not (quick and e['url'] is None)]
+        })
+        result['complete'] = not result['files_skipped'] and len(summaries) == len(sitemap_urls)
+        # Błędy pobocznych sitemap (np. 404 jednej z kilku zadeklarowanych) jako errors
+        for sitemap_url, summary in zip(sitemap_urls, summaries):
+            if summary is not primary and summary.get('error'):
+                result['errors'].append({'url': sitemap_url, 'error': summary['error']})
+        return result
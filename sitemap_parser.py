@@ -0,0 +1,228 @@
+# sitemap_parser.py - Strumieniowy parser sitemap.xml (iterparse, gzip, sitemap index)
+import gzip
+import io
+import xml.etree.ElementTree as ET
+from urllib.parse import urlparse
+from http_client import http_get
+from config import SITEMAP_MAX_FILES, SITEMAP_TIMEOUT
+
+# Limity z protokołu sitemaps.org (na jeden plik)
+MAX_URLS_PER_SITEMAP = 50000
+MAX_SITEMAP_BYTES = 50 * 1024 * 1024  # 50 MB po dekompresji
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def _local_name(tag):
+    """'{namespace}url' -> 'url'"""
+    return tag.rsplit('}', 1)[-1]
+
+
+class _CountingReader(io.RawIOBase):
+    """Strumień zliczający przeczytane (zdekompresowane) bajty"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        size = len(data)
+        buffer[:size] = data
+        self.bytes_read += size
+        return size
+
+
+class SitemapError(Exception):
+    """Sitemap nie istnieje lub nie da się go pobrać"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _open_sitemap(url, timeout):
+    """
+    Otwórz sitemap jako strumień bajtów XML (gzip rozpakowywany w locie)
+
+    Returns:
+        (response, stream) - response trzeba zamknąć po przeczytaniu
+    """
+    response = http_get(url, timeout=timeout, stream=True)
+    if response.status_code != 200:
+        response.close()
+        raise SitemapError(f"HTTP {response.status_code}", response.status_code)
+
+    # Content-Encoding: gzip obsługuje urllib3; .xml.gz wykrywamy po magic bytes
+    response.raw.decode_content = True
+    response.raw.auto_close = False  # BufferedReader nie toleruje auto-zamknięcia przy EOF
+    raw = io.BufferedReader(response.raw, buffer_size=64 * 1024)
+    if raw.peek(2)[:2] == GZIP_MAGIC:
+        raw = gzip.GzipFile(fileobj=raw)
+
+    return response, _CountingReader(raw)
+
+
+def _iter_file(url, timeout, stats):
+    """
+    Parsuj jeden plik sitemap strumieniowo.
+
+    Yields:
+        ('url', {'loc', 'lastmod'}) dla <urlset>
+        ('sitemap', {'loc', 'lastmod'}) dla <sitemapindex>
+    """
+    response, stream = _open_sitemap(url, timeout)
+    file_urls = 0
+    try:
+        root = None
+        for event, elem in ET.iterparse(stream, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                    kind = _local_name(root.tag)
+                    if kind not in ('urlset', 'sitemapindex'):
+                        raise ET.ParseError(f"Unexpected root element <{kind}>")
+                    if kind == 'sitemapindex':
+                        stats['is_index'] = True
+                continue
+
+            name = _local_name(elem.tag)
+            if name not in ('url', 'sitemap') or elem is root:
+                continue
+
+            entry = {'loc': None, 'lastmod': None}
+            for child in elem:
+                child_name = _local_name(child.tag)
+                if child_name in entry:
+                    entry[child_name] = (child.text or '').strip() or None
+
+            # Zwolnij przetworzone elementy - pamięć stała niezależnie od rozmiaru pliku
+            root.clear()
+
+            if name == 'url':
+                file_urls += 1
+            yield name, entry
+    finally:
+        response.close()
+        if file_urls > MAX_URLS_PER_SITEMAP or stream.bytes_read > MAX_SITEMAP_BYTES:
+            stats['oversized_files'].append({'url': url, 'urls': file_urls, 'bytes': stream.bytes_read})
+
+
+def iter_sitemap(url, follow_index=True, max_files=SITEMAP_MAX_FILES, timeout=SITEMAP_TIMEOUT, stats=None):
+    """
+    Iteruj po wpisach <url> sitemapy (i wszystkich sitemap z sitemap index)
+
+    Args:
+        url: URL sitemap.xml (lub .xml.gz, lub sitemap index)
+        follow_index: Rekurencyjnie pobieraj sitemapy wskazane w <sitemapindex>
+        max_files: Maks. liczba pobranych plików sitemap
+        timeout: Timeout per plik
+        stats: Opcjonalny dict uzupełniany statystykami (files, files_skipped, child_sitemaps,
+               is_index, errors, oversized_files)
+
+    Yields:
+        dict: {'loc': str, 'lastmod': str or None, 'sitemap': URL pliku}
+
+    Raises:
+        SitemapError: główna sitemapa nie istnieje / nie da się jej pobrać
+        xml.etree.ElementTree.ParseError: główna sitemapa nie jest poprawnym XML
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault('files', 0)
+    stats.setdefault('child_sitemaps', 0)
+    stats.setdefault('is_index', False)
+    stats.setdefault('errors', [])
+    stats.setdefault('oversized_files', [])
+
+    queue = [url]
+    seen = {url}
+
+    while queue and stats['files'] < max_files:
+        sitemap_url = queue.pop(0)
+        stats['files'] += 1
+        try:
+            for kind, entry in _iter_file(sitemap_url, timeout, stats):
+                if kind == 'url':
+                    entry['sitemap'] = sitemap_url
+                    yield entry
+                elif entry['loc'] and entry['loc'] not in seen:
+                    # Wpis <sitemap> z sitemap index - liczony także gdy nie będzie pobrany
+                    seen.add(entry['loc'])
+                    stats['child_sitemaps'] += 1
+                    if follow_index:
+                        queue.append(entry['loc'])
+        except Exception as e:
+            # Błąd głównego pliku propagujemy, błędy plików podrzędnych tylko raportujemy
+            if sitemap_url == url:
+                raise
+            stats['errors'].append({'url': sitemap_url, 'error': str(e)})
+
+    stats['files_skipped'] = len(queue)
+    if queue:
+        stats['errors'].append({'url': None, 'error': f"Sitemap file limit reached ({max_files}), {len(queue)} not fetched"})
+
+
+def summarize_sitemap(url, follow_index=True, max_files=SITEMAP_MAX_FILES, timeout=SITEMAP_TIMEOUT, sample_size=0):
+    """
+    Policz i zwaliduj URLe sitemapy w stałej pamięci (bez trzymania listy URLi)
+
+    Args:
+        sample_size: Ile pierwszych poprawnych URLi zachować w 'sample_urls'
+                     (np. do odkrywania podstron - bez ponownego pobierania sitemapy)
+
+    Returns:
+        dict: {
+            'exists': bool,
+            'status_code': int or None,
+            'valid': bool (poprawny XML głównego pliku),
+            'is_index': bool,
+            'files': int,
+            'files_skipped': int (pliki z sitemap index pominięte przez max_files),
+            'child_sitemaps': int (unikalne wpisy <sitemap> zadeklarowane w sitemap index),
+            'url_count': int,
+            'invalid_urls': int (brak <loc> lub nie-absolutny http(s) URL),
+            'oversized_files': [{'url', 'urls', 'bytes'}],
+            'sample_urls': [pierwsze sample_size URLi],
+            'errors': [...],
+            'error': str (jeśli nie istnieje / niepoprawny)
+        }
+    """
+    stats = {}
+    summary = {
+        'exists': False,
+        'status_code': None,
+        'valid': False,
+        'url_count': 0,
+        'invalid_urls': 0,
+        'sample_urls': []
+    }
+
+    try:
+        for entry in iter_sitemap(url, follow_index=follow_index, max_files=max_files, timeout=timeout, stats=stats):
+            summary['url_count'] += 1
+            loc = entry['loc']
+            if not loc or urlparse(loc).scheme not in ('http', 'https') or not urlparse(loc).netloc:
+                summary['invalid_urls'] += 1
+            elif len(summary['sample_urls']) < sample_size:
+                summary['sample_urls'].append(loc)
+        summary.update({'exists': True, 'status_code': 200, 'valid': True})
+    except SitemapError as e:
+        summary.update({'status_code': e.status_code, 'error': str(e)})
+    except ET.ParseError as e:
+        summary.update({'exists': True, 'status_code': 200, 'error': f"Invalid XML: {e}"})
+    except Exception as e:
+        summary['error'] = str(e)
+
+    summary.update({
+        'is_index': stats.get('is_index', False),
+        'files': stats.get('files', 0),
+        'files_skipped': stats.get('files_skipped', 0),
+        'child_sitemaps': stats.get('child_sitemaps', 0),
+        'oversized_files': stats.get('oversized_files', []),
+        'errors': stats.get('errors', [])
+    })
+    return summary
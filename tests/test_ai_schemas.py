@@ -0,0 +1,124 @@
+# tests/test_ai_schemas.py - Lokalna walidacja odpowiedzi AI względem schematów (validate_response)
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_schemas import (
+    ACTION_PLAN_SCHEMA, CONTENT_ANALYSIS_SCHEMA, HOLISTIC_ANALYSIS_SCHEMA, SITE_STRUCTURE_SCHEMA,
+    schema_subset, validate_response
+)
+
+
+def test_valid_response_passes_unchanged():
+    response = {
+        'site_type': 'blog',
+        'site_type_confidence': 80,
+        'site_characteristics': {'primary_purpose': 'news'},
+        'selected_pages': [{'url': 'https://example.com/a', 'page_type': 'blog_post'}]
+    }
+
+    value, errors = validate_response(response, SITE_STRUCTURE_SCHEMA)
+
+    assert value == response
+    assert errors == []
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('85', 85),
+    ('85%', 85),
+    ('7/10', 7),
+    (150, 100),
+    (-3, 0),
+    (72.6, 73),
+])
+def test_scores_coerced_and_clamped(raw, expected):
+    value, errors = validate_response({'site_type_confidence': raw}, SITE_STRUCTURE_SCHEMA)
+    assert value['site_type_confidence'] == expected
+    assert errors == []
+
+
+def test_enum_case_normalized_and_unknown_value_dropped():
+    value, errors = validate_response({'site_type': ' E-Commerce'}, SITE_STRUCTURE_SCHEMA)
+    assert value == {'site_type': 'e-commerce'}
+    assert errors == []
+
+    value, errors = validate_response({'site_type': 'marketplace'}, SITE_STRUCTURE_SCHEMA)
+    assert value == {}
+    assert len(errors) == 1 and errors[0].startswith('site_type:')
+
+
+def test_invalid_list_items_skipped_and_reported():
+    response = {'selected_pages': [
+        {'url': 'https://example.com/a'},
+        {'page_type': 'product'},  # brak wymaganego url
+        'https://example.com/b',
+        {'url': 'https://example.com/c', 'page_type': 'PRODUCT'}
+    ]}
+
+    value, errors = validate_response(response, SITE_STRUCTURE_SCHEMA)
+
+    assert value['selected_pages'] == [
+        {'url': 'https://example.com/a'},
+        {'url': 'https://example.com/c', 'page_type': 'product'}
+    ]
+    assert errors == [
+        'selected_pages[1]: missing url (item skipped)',
+        'selected_pages[2]: expected object (item skipped)'
+    ]
+
+
+def test_wrong_types_dropped_and_unknown_fields_kept():
+    value, errors = validate_response(
+        {'site_type_confidence': True, 'site_characteristics': 'blog', 'extra': [1]},
+        SITE_STRUCTURE_SCHEMA
+    )
+    assert value == {'extra': [1]}
+    assert sorted(errors) == ['site_characteristics: expected object', 'site_type_confidence: expected number']
+
+
+def test_non_object_response():
+    assert validate_response(['a'], SITE_STRUCTURE_SCHEMA) == ({}, ['$: expected object'])
+    assert validate_response(None, SITE_STRUCTURE_SCHEMA) == ({}, ['$: expected object'])
+
+
+def test_string_coercions():
+    schema = {'type': 'OBJECT', 'properties': {
+        'tags': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+        'name': {'type': 'STRING'},
+        'flag': {'type': 'BOOLEAN'}
+    }}
+
+    value, errors = validate_response({'tags': 'all pages', 'name': 42, 'flag': 'TRUE'}, schema)
+
+    assert value == {'tags': ['all pages'], 'name': '42', 'flag': True}
+    assert errors == []
+    assert validate_response({'flag': 'yes'}, schema) == ({}, ['flag: expected boolean'])
+
+
+def test_schema_subset_requires_only_selected_fields():
+    subset = schema_subset(SITE_STRUCTURE_SCHEMA, ['selected_pages', 'not_in_schema'])
+
+    assert list(subset['properties']) == ['selected_pages']
+    assert subset['required'] == ['selected_pages']
+    assert subset['properties']['selected_pages'] is SITE_STRUCTURE_SCHEMA['properties']['selected_pages']
+
+
+@pytest.mark.parametrize('schema', [
+    CONTENT_ANALYSIS_SCHEMA, SITE_STRUCTURE_SCHEMA, HOLISTIC_ANALYSIS_SCHEMA, ACTION_PLAN_SCHEMA
+])
+def test_stage_schemas_are_well_formed(schema):
+    def walk(node):
+        assert node['type'] in ('OBJECT', 'ARRAY', 'STRING', 'INTEGER', 'NUMBER', 'BOOLEAN')
+        if node['type'] == 'OBJECT':
+            assert set(node.get('required', [])) <= set(node['properties'])
+            assert node['property_ordering'] == list(node['properties'])
+            for child in node['properties'].values():
+                walk(child)
+        elif node['type'] == 'ARRAY':
+            walk(node['items'])
+
+    walk(schema)
+    assert validate_response({}, schema) == ({}, [])
@@ -0,0 +1,103 @@
+# tests/test_job_stream.py - Strumień SSE i wynik joba, gdy zapis do JobStore się nie udaje
+import json
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from job_queue import JobQueue
+
+
+class FailingStore:
+    """JobStore, którego zapisy zawsze się nie udają (np. zablokowana / pełna baza SQLite)"""
+
+    def _fail(self, *args, **kwargs):
+        raise OSError('database is locked')
+
+    create_job = append_event = update_job = _fail
+
+    def events(self, job_id, after=0):
+        return []
+
+    def get_job(self, job_id):
+        return None
+
+    def find_active(self, dedupe_key):
+        return None
+
+
+def _events(chunks):
+    return [json.loads(chunk.split('data: ', 1)[1]) for chunk in chunks if 'data: ' in chunk]
+
+
+def test_stream_falls_back_to_local_events_when_store_writes_fail(monkeypatch):
+    store = FailingStore()
+    queue = JobQueue(max_workers=1, max_queued=5, store=store)
+    release = threading.Event()
+
+    def audit(progress_callback, url):
+        progress_callback(50, 'Halfway')
+        release.wait(5)
+        return {'url': url, 'final_score': 90}
+
+    monkeypatch.setattr(app, 'get_job_store', lambda: store)
+    monkeypatch.setattr(app, 'get_job_queue', lambda: queue)
+
+    job = queue.submit(audit, url='https://example.com/')
+    stream = app._stream_job_events(job.id)
+
+    # Zdarzenia pojawiają się przed końcem audytu (bez zawieszenia na pustym JobStore)
+    first = _events([next(stream), next(stream)])
+    assert [event['type'] for event in first] == ['queued', 'progress']
+
+    release.set()
+    rest = _events(list(stream))
+    assert rest[-1]['type'] == 'complete'
+    assert rest[-1]['results']['final_score'] == 90
+
+
+def test_stream_resumes_from_last_event_id_without_store(monkeypatch):
+    store = FailingStore()
+    queue = JobQueue(max_workers=1, max_queued=5, store=store)
+
+    def audit(progress_callback, url):
+        progress_callback(50, 'Halfway')
+        return {'url': url}
+
+    monkeypatch.setattr(app, 'get_job_store', lambda: store)
+    monkeypatch.setattr(app, 'get_job_queue', lambda: queue)
+
+    job = queue.submit(audit, url='https://example.com/')
+    assert job.wait(5)
+
+    chunks = list(app._stream_job_events(job.id, last_event_id=1))
+    assert [chunk.split('\n', 1)[0] for chunk in chunks if chunk.startswith('id:')] == ['id: 2', 'id: 3']
+    assert _events(chunks)[-1]['type'] == 'complete'
+
+
+def _run_job(monkeypatch, audit):
+    store = FailingStore()
+    queue = JobQueue(max_workers=1, max_queued=5, store=store)
+    monkeypatch.setattr(app, 'get_job_store', lambda: store)
+    monkeypatch.setattr(app, 'get_job_queue', lambda: queue)
+    job = queue.submit(audit, url='https://example.com/')
+    assert job.wait(5)
+    return job
+
+
+def test_result_endpoint_falls_back_to_local_job_when_store_writes_fail(monkeypatch):
+    job = _run_job(monkeypatch, lambda progress_callback, url: {'url': url, 'final_score': 90})
+
+    response = app.app.test_client().get(f'/api/jobs/{job.id}/result')
+    assert response.status_code == 200
+    assert response.get_json() == {'url': 'https://example.com/', 'final_score': 90}
+
+
+def test_result_endpoint_returns_local_error_result_when_store_writes_fail(monkeypatch):
+    job = _run_job(monkeypatch, lambda progress_callback, url: {'error': 'Cannot fetch page', 'details': 'timeout'})
+
+    response = app.app.test_client().get(f'/api/jobs/{job.id}/result')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Cannot fetch page'
@@ -0,0 +1,82 @@
+# tests/test_partial_json.py - Tolerancyjne i przyrostowe dekodowanie odpowiedzi AI (JSON ucięty / w markdown)
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_engine import IncrementalJSONParser, parse_partial_json
+
+
+def test_complete_json_in_markdown_with_trailing_comma():
+    result = parse_partial_json('Oto wynik:\n```json\n{"a": 1, "b": [1, 2,],}\n```\nKoniec.')
+
+    assert result.value == {'a': 1, 'b': [1, 2]}
+    assert result.complete is True
+    assert result.incomplete == set()
+
+
+def test_control_characters_in_strings_tolerated():
+    result = parse_partial_json('{"a": "line\nbreak\ttab"}')
+    assert result.value == {'a': 'line\nbreak\ttab'}
+    assert result.complete is True
+
+
+def test_truncated_list_keeps_complete_elements():
+    result = parse_partial_json('{"summary": "ok", "recommendations": [{"t": 1}, {"t": 2}, {"t": "ha')
+
+    assert result.value == {'summary': 'ok', 'recommendations': [{'t': 1}, {'t': 2}]}
+    assert result.complete is False
+    assert result.incomplete == {'recommendations'}
+    assert result.missing_fields(['summary', 'recommendations', 'score']) == ['recommendations', 'score']
+
+
+@pytest.mark.parametrize('text, value, incomplete', [
+    ('{"a": true, "b": 12', {'a': True}, {'b'}),  # liczba do końca tekstu mogła zostać ucięta
+    ('{"a": true, "b": nul', {'a': True}, {'b'}),
+    ('{"a": "x", "b": {"k": "v", "n": [1', {'a': 'x', 'b': {'k': 'v', 'n': []}}, {'b'}),
+    ('{"a": "x", "b"', {'a': 'x'}, set()),
+])
+def test_truncated_scalars_and_nested_values(text, value, incomplete):
+    result = parse_partial_json(text)
+    assert result.value == value
+    assert result.complete is False
+    assert result.incomplete == incomplete
+
+
+def test_top_level_list_and_no_json():
+    result = parse_partial_json('[1, 2, {"x"')
+    assert (result.value, result.complete) == ([1, 2], False)
+
+    for text in ('', None, 'no json here'):
+        result = parse_partial_json(text)
+        assert (result.value, result.complete) == (None, False)
+        assert result.missing_fields(['a']) == ['a']
+
+
+def test_incremental_parser_emits_sections_as_they_complete():
+    parser = IncrementalJSONParser()
+
+    chunks = ['Sure! ```json\n{"a": {"x": "}\\"", "y": [1, ', '2]}', ', "b": [1, 2', '], "c": 3}', ', "d": 4']
+    emitted = [parser.feed(chunk) for chunk in chunks]
+
+    # Nawiasy i cudzysłowy wewnątrz stringów nie zamykają sekcji
+    assert emitted == [[], [], [('a', {'x': '}"', 'y': [1, 2]})], [('b', [1, 2]), ('c', 3)], []]
+    assert parser.sections == {'a': {'x': '}"', 'y': [1, 2]}, 'b': [1, 2], 'c': 3}
+
+
+def test_incremental_parser_byte_by_byte_matches_full_decode():
+    text = '{"score": 87, "issues": [{"title": "a, b"}, {"title": "[c]"}], "summary": "done"}'
+    parser = IncrementalJSONParser()
+
+    sections = [section for char in text for section in parser.feed(char)]
+
+    assert [key for key, _ in sections] == ['score', 'issues', 'summary']
+    assert parser.sections == parse_partial_json(text).value
+
+
+def test_incremental_parser_skips_invalid_member():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"a": oops, "b": 2}') == [('b', 2)]
+    assert parser.sections == {'b': 2}
@@ -0,0 +1,119 @@
+# tests/test_pipeline.py - Pipeline DAG: kolejność zależności, pomijanie po porażce, memo/fingerprint
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import Pipeline, Stage, StageFailed
+
+
+class DictMemo:
+    """Minimalny memo store (interfejs DiskCache: get/set)"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+
+def build(calls):
+    def fetch(url):
+        calls.append('fetch')
+        return f"<html>{url}</html>"
+
+    def analyze(html):
+        calls.append('analyze')
+        return {'length': len(html)}
+
+    return Pipeline([
+        Stage('fetch', fetch, inputs=['url'], outputs=['html']),
+        Stage('analyze', analyze, inputs=['html'], fingerprint=lambda html: str(len(html))),
+    ])
+
+
+def test_memo_reuses_stage_with_same_fingerprint():
+    memo = DictMemo()
+    calls = []
+
+    first = build(calls).run({'url': 'a'}, memo=memo)
+    second = build(calls).run({'url': 'b'}, memo=memo)  # inny URL, ten sam fingerprint (długość)
+
+    assert first.values['analyze'] == second.values['analyze'] == {'length': 14}
+    assert calls == ['fetch', 'analyze', 'fetch']
+    assert first.reused == set()
+    assert second.reused == {'analyze'}
+    assert list(memo.data) == ['analyze:14']
+
+
+def test_memo_misses_on_changed_fingerprint():
+    memo = DictMemo()
+    calls = []
+
+    build(calls).run({'url': 'a'}, memo=memo)
+    result = build(calls).run({'url': 'abc'}, memo=memo)
+
+    assert calls == ['fetch', 'analyze', 'fetch', 'analyze']
+    assert result.reused == set()
+    assert result.values['analyze'] == {'length': 16}
+
+
+def test_no_memo_or_empty_fingerprint_always_runs():
+    calls = []
+    build(calls).run({'url': 'a'})
+    build(calls).run({'url': 'a'})
+    assert calls.count('analyze') == 2
+
+    memo = DictMemo()
+    runs = []
+    pipeline = Pipeline([Stage('s', lambda: runs.append(1) or 'v', fingerprint=lambda: '')])
+    pipeline.run(memo=memo)
+    pipeline.run(memo=memo)
+    assert len(runs) == 2
+    assert memo.data == {}
+
+
+def test_reused_stage_reported_in_progress():
+    memo = DictMemo()
+    build([]).run({'url': 'a'}, memo=memo)
+
+    events = []
+    build([]).run({'url': 'a'}, memo=memo, progress_callback=lambda p, m, d: events.append(d))
+
+    statuses = {d['stage']: d['status'] for d in events if d['status'] != 'started'}
+    assert statuses == {'fetch': 'completed', 'analyze': 'reused'}
+
+
+def test_failure_skips_dependents_but_not_siblings():
+    def broken(url):
+        raise StageFailed('no pages')
+
+    result = Pipeline([
+        Stage('broken', broken, inputs=['url']),
+        Stage('after', lambda broken: broken, inputs=['broken']),
+        Stage('after_after', lambda after: after, inputs=['after']),
+        Stage('sibling', lambda url: url.upper(), inputs=['url']),
+    ]).run({'url': 'x'})
+
+    assert isinstance(result.errors['broken'], StageFailed)
+    assert set(result.skipped) == {'after', 'after_after'}
+    assert result.values['sibling'] == 'X'
+    assert not result.ok('after')
+
+
+def test_multiple_outputs_and_validation():
+    result = Pipeline([
+        Stage('split', lambda: {'a': 1, 'b': 2}, outputs=['a', 'b']),
+        Stage('sum', lambda a, b: a + b, inputs=['a', 'b']),
+    ]).run()
+    assert result.values['sum'] == 3
+
+    with pytest.raises(ValueError, match='unknown input'):
+        Pipeline([Stage('s', lambda missing: None, inputs=['missing'])]).run()
+    with pytest.raises(ValueError, match='cycle'):
+        Pipeline([Stage('a', lambda b: b, inputs=['b']), Stage('b', lambda a: a, inputs=['a'])]).run()
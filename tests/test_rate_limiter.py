@@ -0,0 +1,139 @@
+# tests/test_rate_limiter.py - Token bucket (SQLite), pause po 429, backoff i nagłówek Retry-After
+import email.utils
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rate_limiter
+from rate_limiter import RateLimiter, RateLimitTimeout, backoff_delay, parse_retry_after, report_waits
+
+
+class FakeTime:
+    """Zegar sterowany testem: sleep() przesuwa time() zamiast czekać"""
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def strftime(self, fmt, value):
+        return time.strftime(fmt, value)
+
+    def gmtime(self, seconds):
+        return time.gmtime(seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(rate_limiter, 'time', fake)
+    return fake
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    return RateLimiter(str(tmp_path / 'rate_limits.sqlite'))
+
+
+def test_burst_up_to_capacity_then_waits_for_refill(clock, limiter):
+    for _ in range(3):
+        assert limiter.acquire('api', rate=1, capacity=3) == 0
+
+    waited = limiter.acquire('api', rate=1, capacity=3)
+
+    assert 1 <= waited < 1.1
+    assert clock.sleeps and clock.sleeps[0] == pytest.approx(1, abs=0.06)
+
+
+def test_tokens_refill_over_time_up_to_capacity(clock, limiter):
+    for _ in range(2):
+        limiter.acquire('api', rate=0.5, capacity=2)
+
+    clock.now += 60  # dużo więcej niż potrzeba - kubełek nie przekracza capacity
+    assert limiter.acquire('api', rate=0.5, capacity=2) == 0
+    assert limiter.acquire('api', rate=0.5, capacity=2) == 0
+    assert limiter.acquire('api', rate=0.5, capacity=2) >= 2
+
+
+def test_buckets_are_independent(clock, limiter):
+    assert limiter.acquire('a', rate=0.1, capacity=1) == 0
+    assert limiter.acquire('b', rate=0.1, capacity=1) == 0
+    assert clock.sleeps == []
+
+
+def test_state_shared_between_instances(clock, tmp_path):
+    path = str(tmp_path / 'shared.sqlite')
+    RateLimiter(path).acquire('api', rate=0.1, capacity=1)
+
+    with pytest.raises(RateLimitTimeout):
+        RateLimiter(path).acquire('api', rate=0.1, capacity=1, max_wait=1)
+
+
+def test_pause_blocks_bucket(clock, limiter):
+    limiter.pause('api', 30)
+
+    waited = limiter.acquire('api', rate=10, capacity=5)
+
+    assert waited >= 30
+
+
+def test_max_wait_raises_timeout(clock, limiter):
+    limiter.acquire('api', rate=1 / 60, capacity=1)
+
+    with pytest.raises(RateLimitTimeout, match='Gemini'):
+        limiter.acquire('api', rate=1 / 60, capacity=1, max_wait=10, label='Gemini')
+    assert clock.sleeps == []
+
+
+def test_long_waits_reported_to_listener(clock, limiter):
+    limiter.acquire('api', rate=0.2, capacity=1)
+    waits = []
+
+    with report_waits(lambda seconds, label: waits.append((round(seconds), label))):
+        limiter.acquire('api', rate=0.2, capacity=1, label='PageSpeed')
+    limiter.acquire('api', rate=0.2, capacity=1)  # poza kontekstem - bez raportu
+
+    assert waits == [(5, 'PageSpeed')]
+
+
+def test_consume_daily_quota(clock, limiter):
+    assert [limiter.consume_daily('psi', 2) for _ in range(3)] == [True, True, False]
+
+    clock.now += 24 * 3600
+    assert limiter.consume_daily('psi', 2) is True
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('120', 120.0),
+    ('1.5', 1.5),
+    ('-5', 0.0),
+    ('', None),
+    (None, None),
+    ('soon', None),
+])
+def test_parse_retry_after_seconds(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    future = email.utils.formatdate(time.time() + 90, usegmt=True)
+    past = email.utils.formatdate(time.time() - 90, usegmt=True)
+
+    assert parse_retry_after(future) == pytest.approx(90, abs=2)
+    assert parse_retry_after(past) == 0.0
+
+
+def test_backoff_delay_is_capped_and_honours_retry_after():
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt, base=1, cap=8) <= 8
+    assert backoff_delay(0, base=1, cap=8, retry_after=30) == 30
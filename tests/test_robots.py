@@ -0,0 +1,105 @@
+# tests/test_robots.py - Matcher robots.txt (RFC 9309): najdłuższa reguła, wildcardy, remisy, grupy
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from site_resources import RobotsRules
+
+
+@pytest.mark.parametrize('path, allowed', [
+    ('/shop/', False),
+    ('/shop/cart', False),
+    ('/shop/public/', True),  # dłuższy Allow wygrywa z krótszym Disallow
+    ('/shop/public/private/x', False),  # ...i przegrywa z jeszcze dłuższym Disallow
+    ('/other', True),
+])
+def test_longest_match_wins(path, allowed):
+    rules = RobotsRules(
+        'User-agent: *\n'
+        'Disallow: /shop/\n'
+        'Allow: /shop/public/\n'
+        'Disallow: /shop/public/private/\n'
+    )
+    assert rules.can_fetch(path) is allowed
+
+
+def test_rule_order_does_not_matter():
+    rules = RobotsRules('User-agent: *\nAllow: /a/b\nDisallow: /a\n')
+    assert rules.can_fetch('/a/b/c') is True
+    assert rules.can_fetch('/a/c') is False
+
+
+def test_allow_wins_tie_of_equal_length():
+    rules = RobotsRules('User-agent: *\nDisallow: /page\nAllow: /page\n')
+    assert rules.can_fetch('/page') is True
+
+    rules = RobotsRules('User-agent: *\nAllow: /p*\nDisallow: /pa\n')
+    assert rules.can_fetch('/pa') is True
+
+
+@pytest.mark.parametrize('path, allowed', [
+    ('/file.pdf', False),
+    ('/dir/file.pdf', False),
+    ('/file.pdf?download=1', True),  # '$' kotwiczy koniec URLa (z query)
+    ('/file.pdfx', True),
+    ('/search?q=seo', False),
+    ('/private/a/secret/b', False),
+    ('/private/a/public', True),
+])
+def test_wildcards_and_end_anchor(path, allowed):
+    rules = RobotsRules(
+        'User-agent: *\n'
+        'Disallow: /*.pdf$\n'
+        'Disallow: /*?q=\n'
+        'Disallow: /private/*/secret\n'
+    )
+    assert rules.can_fetch('https://example.com' + path) is allowed
+
+
+def test_regex_characters_in_pattern_are_literal():
+    rules = RobotsRules('User-agent: *\nDisallow: /a.b\n')
+    assert rules.can_fetch('/a.b') is False
+    assert rules.can_fetch('/axb') is True
+
+
+def test_most_specific_group_and_merged_groups():
+    rules = RobotsRules(
+        'User-agent: *\n'
+        'Disallow: /\n'
+        '\n'
+        'User-agent: Googlebot\n'
+        'Disallow: /nogoogle\n'
+        '\n'
+        'User-agent: googlebot\n'
+        'Disallow: /also\n'
+        'Crawl-delay: 2\n'
+    )
+    # Grupa Googlebot zastępuje '*', dwie grupy Googlebot są łączone
+    assert rules.can_fetch('/page', 'Mozilla/5.0 (compatible; Googlebot/2.1)') is True
+    assert rules.can_fetch('/nogoogle', 'Googlebot') is False
+    assert rules.can_fetch('/also', 'Googlebot') is False
+    assert rules.crawl_delay('Googlebot') == 2.0
+    assert rules.can_fetch('/page', 'Bingbot') is False
+    assert rules.blocks_all('Bingbot') is True
+
+
+def test_shared_group_and_sitemaps():
+    rules = RobotsRules(
+        'User-agent: a-bot\n'
+        'User-agent: b-bot\n'
+        'Sitemap: https://example.com/sitemap.xml\n'
+        'Disallow: /x\n'
+    )
+    assert rules.can_fetch('/x', 'a-bot') is False
+    assert rules.can_fetch('/x', 'b-bot') is False
+    assert rules.can_fetch('/x', 'c-bot') is True  # brak grupy '*' = wszystko dozwolone
+    assert rules.sitemaps == ['https://example.com/sitemap.xml']
+
+
+def test_robots_txt_always_allowed_and_empty_disallow():
+    assert RobotsRules('User-agent: *\nDisallow: /\n').can_fetch('/robots.txt') is True
+    assert RobotsRules('User-agent: *\nDisallow:\n').can_fetch('/anything') is True
+    assert RobotsRules('').can_fetch('/anything') is True
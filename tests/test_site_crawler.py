@@ -0,0 +1,61 @@
+# tests/test_site_crawler.py - Crawl strony, której homepage przekierowuje na inny host
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import async_fetcher
+import site_crawler
+
+PAGES = {
+    '/': '<html><body><a href="/a">A</a> <a href="/b">B</a></body></html>',
+    '/a': '<html><body><a href="/b">B</a></body></html>',
+    '/b': '<html><body>B</body></html>'
+}
+
+
+class RedirectingSite(BaseHTTPRequestHandler):
+    """127.0.0.1 przekierowuje wszystko na localhost (jak apex -> www); localhost serwuje strony"""
+
+    def do_GET(self):
+        host = self.headers.get('Host', '')
+        if host.startswith('127.0.0.1'):
+            self.send_response(301)
+            self.send_header('Location', f"http://localhost:{self.server.server_port}{self.path}")
+            self.end_headers()
+            return
+        body = PAGES.get(self.path)
+        self.send_response(200 if body else 404)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.end_headers()
+        self.wfile.write((body or 'not found').encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RedirectingSite)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+
+
+@pytest.mark.parametrize('use_async', [True, False])
+def test_crawl_follows_homepage_redirect_to_other_host(server, monkeypatch, use_async):
+    if use_async and not async_fetcher.is_available():
+        pytest.skip('aiohttp not installed')
+    monkeypatch.setattr(async_fetcher, 'is_available', lambda: use_async)
+
+    start_url = f"http://127.0.0.1:{server.server_port}/"
+    pages = list(site_crawler.crawl_site(start_url, max_pages=10, delay=0))
+
+    fetched = sorted(page['final_url'] for page in pages if page['success'])
+    base = f"http://localhost:{server.server_port}"
+    assert fetched == [f"{base}/", f"{base}/a", f"{base}/b"]
@@ -0,0 +1,157 @@
+# tests/test_sitemap_parser.py - Strumieniowy parser sitemap: gzip, rekurencja po sitemap index, limity
+import gzip
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sitemap_parser
+from sitemap_parser import SitemapError, iter_sitemap, summarize_sitemap
+
+NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def urlset(*locs):
+    entries = ''.join(f'<url><loc>{loc}</loc><lastmod>2024-01-01</lastmod></url>' for loc in locs)
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{NS}">{entries}</urlset>'.encode('utf-8')
+
+
+def sitemapindex(*locs):
+    entries = ''.join(f'<sitemap><loc>{loc}</loc></sitemap>' for loc in locs)
+    return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="{NS}">{entries}</sitemapindex>'.encode('utf-8')
+
+
+class SitemapSite(BaseHTTPRequestHandler):
+    """Serwuje self.server.files: path -> bytes (brak = 404)"""
+
+    def do_GET(self):
+        body = self.server.files.get(self.path)
+        self.send_response(200 if body is not None else 404)
+        self.send_header('Content-Type', 'application/xml')
+        self.end_headers()
+        self.wfile.write(body if body is not None else b'not found')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), SitemapSite)
+    httpd.files = {}
+    httpd.base = f"http://127.0.0.1:{httpd.server_port}"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+
+
+def test_plain_urlset(server):
+    server.files['/sitemap.xml'] = urlset('https://example.com/', 'https://example.com/a')
+
+    entries = list(iter_sitemap(f"{server.base}/sitemap.xml"))
+
+    assert [e['loc'] for e in entries] == ['https://example.com/', 'https://example.com/a']
+    assert entries[0]['lastmod'] == '2024-01-01'
+    assert entries[0]['sitemap'] == f"{server.base}/sitemap.xml"
+
+
+def test_gzip_detected_by_magic_bytes(server):
+    server.files['/sitemap.xml.gz'] = gzip.compress(urlset('https://example.com/gz'))
+
+    summary = summarize_sitemap(f"{server.base}/sitemap.xml.gz", sample_size=5)
+
+    assert summary['valid'] is True
+    assert summary['url_count'] == 1
+    assert summary['sample_urls'] == ['https://example.com/gz']
+
+
+def test_index_recursion_and_child_count(server):
+    base = server.base
+    server.files.update({
+        '/sitemap.xml': sitemapindex(f"{base}/a.xml", f"{base}/nested.xml", f"{base}/a.xml"),
+        '/nested.xml': sitemapindex(f"{base}/b.xml.gz"),
+        '/a.xml': urlset('https://example.com/a1', 'https://example.com/a2'),
+        '/b.xml.gz': gzip.compress(urlset('https://example.com/b1')),
+    })
+
+    summary = summarize_sitemap(f"{base}/sitemap.xml")
+
+    assert summary['is_index'] is True
+    assert summary['url_count'] == 3
+    assert summary['files'] == 4  # index + a + nested + b (duplikat a.xml pobrany raz)
+    assert summary['child_sitemaps'] == 3
+    assert summary['files_skipped'] == 0
+    assert summary['errors'] == []
+
+
+def test_index_respects_file_limit(server):
+    base = server.base
+    server.files.update({
+        '/sitemap.xml': sitemapindex(f"{base}/a.xml", f"{base}/b.xml", f"{base}/c.xml"),
+        '/a.xml': urlset('https://example.com/a'),
+        '/b.xml': urlset('https://example.com/b'),
+        '/c.xml': urlset('https://example.com/c'),
+    })
+
+    summary = summarize_sitemap(f"{base}/sitemap.xml", max_files=2)
+
+    assert summary['files'] == 2
+    assert summary['files_skipped'] == 2
+    assert summary['child_sitemaps'] == 3
+    assert summary['url_count'] == 1
+    assert any(e['url'] is None for e in summary['errors'])
+
+
+def test_broken_child_is_reported_not_raised(server):
+    base = server.base
+    server.files.update({
+        '/sitemap.xml': sitemapindex(f"{base}/ok.xml", f"{base}/missing.xml"),
+        '/ok.xml': urlset('https://example.com/ok'),
+    })
+
+    summary = summarize_sitemap(f"{base}/sitemap.xml")
+
+    assert summary['valid'] is True
+    assert summary['url_count'] == 1
+    assert summary['errors'] == [{'url': f"{base}/missing.xml", 'error': 'HTTP 404'}]
+
+
+def test_missing_and_invalid_root(server):
+    with pytest.raises(SitemapError) as error:
+        list(iter_sitemap(f"{server.base}/sitemap.xml"))
+    assert error.value.status_code == 404
+
+    missing = summarize_sitemap(f"{server.base}/sitemap.xml")
+    assert (missing['exists'], missing['status_code']) == (False, 404)
+
+    server.files['/sitemap.xml'] = b'<html><body>not a sitemap</body></html>'
+    invalid = summarize_sitemap(f"{server.base}/sitemap.xml")
+    assert (invalid['exists'], invalid['valid']) == (True, False)
+    assert 'Invalid XML' in invalid['error']
+
+
+def test_invalid_urls_counted(server):
+    server.files['/sitemap.xml'] = urlset('https://example.com/ok', '/relative', 'ftp://example.com/x')
+
+    summary = summarize_sitemap(f"{server.base}/sitemap.xml", sample_size=10)
+
+    assert summary['url_count'] == 3
+    assert summary['invalid_urls'] == 2
+    assert summary['sample_urls'] == ['https://example.com/ok']
+
+
+def test_oversized_file_flagged(server, monkeypatch):
+    monkeypatch.setattr(sitemap_parser, 'MAX_URLS_PER_SITEMAP', 2)
+    server.files['/sitemap.xml'] = urlset(*(f'https://example.com/{i}' for i in range(3)))
+
+    summary = summarize_sitemap(f"{server.base}/sitemap.xml")
+
+    assert summary['url_count'] == 3
+    assert len(summary['oversized_files']) == 1
+    assert summary['oversized_files'][0]['url'] == f"{server.base}/sitemap.xml"
+    assert summary['oversized_files'][0]['urls'] == 3
@@ -2,7 +2,8 @@
 import requests
 import validators
 from urllib.parse import urlparse, urljoin
-from config import REQUEST_TIMEOUT, USER_AGENT
+from config import REQUEST_TIMEOUT
+from http_client import http_get
 
 def validate_url(url):
     """Walidacja i normalizacja URL"""
@@ -13,6 +14,13 @@ def validate_url(url):
         return url
     return None
 
+def normalize_url(url):
+    """Kanoniczna postać URL do porównań/kluczy cache (małe litery hosta, bez fragmentu, '/' dla pustej ścieżki)"""
+    parsed = urlparse(url)
+    path = parsed.path or '/'
+    query = f"?{parsed.query}" if parsed.query else ''
+    return f"{parsed.scheme.lower()}://{parsed.netloc.lower()}{path}{query}"
+
 def get_domain(url):
     """Wyciągnij domenę z URL"""
     parsed = urlparse(url)
@@ -21,8 +29,7 @@ def get_domain(url):
 def fetch_url(url, timeout=REQUEST_TIMEOUT):
     """Pobierz URL z error handling"""
     try:
-        headers = {'User-Agent': USER_AGENT}
-        response = requests.get(url, timeout=timeout, headers=headers, allow_redirects=True)
+        response = http_get(url, timeout=timeout, allow_redirects=True)
         return {
             'success': True,
             'status_code': response.status_code,